@@ -0,0 +1,155 @@
+# Adaptive question selection for the "Take Test" page.
+#
+# Instead of walking through every approved question, the adaptive mode asks
+# whichever unanswered question is expected to tell us the most about the
+# decisions the results page reports:
+#
+#   - the four MBTI preferences of calculate_mbti_analysis (I/E, N/S, T/F and
+#     J/P); like the results page, J/P asks whether the top detailed function
+#     is a judging (T/F) or a perceiving (N/S) one, so it compares the best
+#     judging function against the best perceiving one
+#   - the primary function of calculate_cognitive_profile: the top letter
+#     against the runner-up, and the attitude (e/i) of the top letter; the
+#     secondary function follows from N/S or T/F and the primary attitude
+#
+# Each decision compares two counts a and b. Its confidence is the posterior
+# probability that the leading side really leads, using a Beta(a+1, b+1)
+# posterior with a normal approximation. The test stops once every decision
+# is at least `confidence_threshold` sure (after `min_questions`), or when the
+# bank or `max_questions` runs out.
+#
+# A question's information gain is the expected drop in the summed binary
+# entropy of all decisions, averaged over its four answers. Answer
+# probabilities come from a simple model: A vs. B in proportion to how well
+# each option's functions match the scores so far, with "Both" and "Neither"
+# at their (smoothed) observed rates for this test taker.
+
+import math
+
+import numpy as np
+
+from scoring import (
+    ANSWER_BOTH, ANSWER_NONE, ATTITUDE_INDEX, DETAILED_FUNCTIONS, EXTRAVERTED_COLUMN, INTROVERTED_COLUMN,
+    PRIMARY_COLUMNS, SCORE_INDEX, SCORE_KEYS, compile_questions, encode_answers, score_answer_matrix,
+)
+
+# Columns of a combined state row: the score columns followed by the attitudes
+I_COLUMN = len(SCORE_KEYS) + ATTITUDE_INDEX['i']
+E_COLUMN = len(SCORE_KEYS) + ATTITUDE_INDEX['e']
+
+# Fixed decisions as (positive columns, negative columns)
+FIXED_DECISIONS = [
+    ([I_COLUMN], [E_COLUMN]),
+    ([SCORE_INDEX['N']], [SCORE_INDEX['S']]),
+    ([SCORE_INDEX['T']], [SCORE_INDEX['F']]),
+]
+JUDGING_COLUMNS = [SCORE_INDEX[f] for f in DETAILED_FUNCTIONS if f[0] in "TF"]
+PERCEIVING_COLUMNS = [SCORE_INDEX[f] for f in DETAILED_FUNCTIONS if f[0] in "NS"]
+
+DEFAULT_CONFIDENCE_THRESHOLD = 0.9
+DEFAULT_MIN_QUESTIONS = 8
+
+def _erf(x):
+    # Abramowitz & Stegun 7.1.26, absolute error below 1.5e-7; whole arrays at
+    # once instead of a math.erf call per element
+    x = np.asarray(x, dtype=np.float64)
+    t = 1 / (1 + 0.3275911 * np.abs(x))
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    return np.sign(x) * (1 - poly * np.exp(-x * x))
+
+def decision_confidence(positive, negative):
+    # P(the side with more counts really leads) under a Beta(a+1, b+1)
+    # posterior, via the normal approximation
+    mean = (positive + 1) / (positive + negative + 2)
+    sd = np.sqrt(mean * (1 - mean) / (positive + negative + 3))
+    z = np.abs(mean - 0.5) / sd
+    return 0.5 * (1 + _erf(z / math.sqrt(2)))
+
+def binary_entropy(p):
+    p = np.clip(p, 1e-12, 1 - 1e-12)
+    return -(p * np.log2(p) + (1 - p) * np.log2(1 - p))
+
+def decision_confidences(states):
+    # states: (n, 14) combined rows -> (n, 6) confidences, one per decision
+    states = np.asarray(states, dtype=np.float64)
+    rows = np.arange(len(states))
+    confidences = [
+        decision_confidence(states[:, positive].sum(axis=1), states[:, negative].sum(axis=1))
+        for positive, negative in FIXED_DECISIONS
+    ]
+    confidences.append(decision_confidence(states[:, JUDGING_COLUMNS].max(axis=1), states[:, PERCEIVING_COLUMNS].max(axis=1)))
+
+    # Primary letter: the top letter against the runner-up
+    letter_scores = states[:, PRIMARY_COLUMNS]
+    ranked = np.argsort(-letter_scores, axis=1, kind='stable')
+    top = PRIMARY_COLUMNS[ranked[:, 0]]
+    runner_up = PRIMARY_COLUMNS[ranked[:, 1]]
+    confidences.append(decision_confidence(states[rows, top], states[rows, runner_up]))
+
+    # Primary attitude: the top letter's extraverted vs. introverted function
+    confidences.append(decision_confidence(states[rows, EXTRAVERTED_COLUMN[top]], states[rows, INTROVERTED_COLUMN[top]]))
+    return np.stack(confidences, axis=1)
+
+class AdaptiveSelector:
+    def __init__(self, questions, confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD,
+                 min_questions=DEFAULT_MIN_QUESTIONS, max_questions=None):
+        self.compiled = compile_questions(questions)
+        self.question_count = len(questions)
+        self.confidence_threshold = confidence_threshold
+        self.min_questions = min(min_questions, self.question_count)
+        self.max_questions = min(max_questions or self.question_count, self.question_count)
+        # Per question, the state change for answering A, B, Both or Neither
+        a_rows = np.hstack([self.compiled.a_scores, self.compiled.a_attitudes])
+        b_rows = np.hstack([self.compiled.b_scores, self.compiled.b_attitudes])
+        self.answer_deltas = np.stack([a_rows, b_rows, a_rows + b_rows, np.zeros_like(a_rows)], axis=1)
+
+    def state(self, user_answers):
+        score_rows, attitude_rows = score_answer_matrix(self.compiled, encode_answers(user_answers, self.question_count))
+        return np.hstack([score_rows[0], attitude_rows[0]]).astype(np.float64)
+
+    def confidence(self, user_answers):
+        # The weakest decision's confidence; the test is only as sure as that
+        return float(decision_confidences(self.state(user_answers)[None, :]).min())
+
+    def should_stop(self, user_answers, confidence=None):
+        # confidence: self.confidence(user_answers), if the caller already has it
+        answered = len(user_answers)
+        if answered >= self.max_questions:
+            return True
+        if answered < self.min_questions:
+            return False
+        if confidence is None:
+            confidence = self.confidence(user_answers)
+        return confidence >= self.confidence_threshold
+
+    def answer_probabilities(self, state, user_answers):
+        # (n_questions, 4) probabilities of answering A, B, Both, Neither
+        codes = encode_answers(user_answers, self.question_count)[list(user_answers)] if user_answers else np.array([])
+        answered = len(codes)
+        p_both = (np.count_nonzero(codes == ANSWER_BOTH) + 1) / (answered + 4)
+        p_neither = (np.count_nonzero(codes == ANSWER_NONE) + 1) / (answered + 4)
+        # Options whose functions already score well are more likely to be picked
+        affinity_a = 1 + self.compiled.a_scores @ state[:len(SCORE_KEYS)]
+        affinity_b = 1 + self.compiled.b_scores @ state[:len(SCORE_KEYS)]
+        share_a = affinity_a / (affinity_a + affinity_b)
+        rest = 1 - p_both - p_neither
+        return np.stack([rest * share_a, rest * (1 - share_a),
+                         np.full(self.question_count, p_both), np.full(self.question_count, p_neither)], axis=1)
+
+    def information_gain(self, user_answers):
+        # Expected entropy reduction for every question, (n_questions,)
+        state = self.state(user_answers)
+        current = binary_entropy(decision_confidences(state[None, :])).sum()
+        outcomes = state[None, None, :] + self.answer_deltas
+        entropies = binary_entropy(decision_confidences(outcomes.reshape(-1, outcomes.shape[-1]))).sum(axis=1)
+        expected = (self.answer_probabilities(state, user_answers) * entropies.reshape(self.question_count, 4)).sum(axis=1)
+        return current - expected
+
+    def next_question(self, user_answers, asked):
+        # Index of the most informative question not asked yet, or None
+        if len(asked) >= self.max_questions:
+            return None
+        gain = self.information_gain(user_answers)
+        gain[list(asked)] = -np.inf
+        best = int(np.argmax(gain))
+        return None if np.isneginf(gain[best]) else best
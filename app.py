@@ -1,264 +1,927 @@
 
 import streamlit as st
-from supabase import create_client, Client
+from supabase import create_client
+import hashlib
+import io
 import os
 import random
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+
+import jwt
+
+import metrics
+import question_io
+from repository import EDIT_QUESTION_COLUMNS, SupabaseRepository
+from write_behind import CoalescingWriter, WriteBehindQueue
+
+# Spans recorded during this script run, for the moderator debug panel
+rerun_trace = metrics.start_trace()
+
+# Get the data backend and its credentials from st.secrets. DATA_BACKEND =
+# "sqlite" runs against a local database (SQLITE_PATH, in-memory by default)
+# instead of Supabase, for load testing and profiling.
+data_backend = st.secrets.get("DATA_BACKEND", "supabase")
+sqlite_path = st.secrets.get("SQLITE_PATH", ":memory:")
+supabase_url = st.secrets.get("supabaseurl")
+supabase_key = st.secrets.get("SUPABASE_ANON_KEY")
+
+
+# --- Data Access ---
+# Streamlit re-executes this script on every rerun, so repositories are
+# created once and reused. Anonymous reads share one repository per process.
+# Signing in changes what a repository acts as, so a signed-in session gets
+# its own, created once at sign-in and kept in session state.
+@st.cache_resource
+def get_sqlite_database(path):
+    from sqlite_repository import SQLiteDatabase
+    return SQLiteDatabase(path)
+
+def create_repository(api_key=None, service=False):
+    # Every backend call is timed and counted (see metrics.py)
+    if data_backend == "sqlite":
+        from sqlite_repository import SQLiteRepository
+        return metrics.InstrumentedRepository(SQLiteRepository(get_sqlite_database(sqlite_path), service=service))
+    return metrics.InstrumentedRepository(SupabaseRepository(create_client(supabase_url, api_key or supabase_key)))
+
+@st.cache_resource
+def get_shared_repository(backend, location):
+    # The arguments only key the cache
+    return create_repository()
+
+@st.cache_resource
+def get_service_repository(backend, location):
+    # Background writers act for many users at once, so they need the service
+    # role key when it is configured
+    if backend == "sqlite":
+        return create_repository(service=True)
+    service_key = st.secrets.get("SUPABASE_SERVICE_ROLE_KEY")
+    return create_repository(service_key) if service_key else None
+
+def get_session_repository():
+    if st.session_state.get('repository') is None:
+        st.session_state.repository = create_repository()
+    return st.session_state.repository
+
+backend_location = sqlite_path if data_backend == "sqlite" else supabase_url
 
-def calculate_mbti_analysis(scores, attitude_scores):
-    analysis = {}
-    mbti_type = ""
-    total_strength = 0
-    preference_count = 0
-
-    def get_strength_label(strength_val):
-        if strength_val > 0.75:
-            return "Strong"
-        elif strength_val > 0.60:
-            return "Moderate"
-        else:
-            return "Weak"
-
-    # I/E
-    i_score = attitude_scores.get('i', 0)
-    e_score = attitude_scores.get('e', 0)
-    total_ie = i_score + e_score
-    if total_ie > 0:
-        i_percent = i_score / total_ie
-        e_percent = e_score / total_ie
-        preference = 'I' if i_percent > e_percent else 'E'
-        strength = abs(i_percent - e_percent)
-        analysis['I/E'] = {
-            'positive': 'Introversion',
-            'negative': 'Extraversion',
-            'opposite': 'E',
-            'percentage': i_percent,
-            'preference': preference,
-            'strength': f"{strength:.0%}",
-            'strength_label': get_strength_label(max(i_percent, e_percent))
-        }
-        mbti_type += preference
-        total_strength += max(i_percent, e_percent)
-        preference_count += 1
-
-    # N/S
-    n_score = scores.get('N', 0)
-    s_score = scores.get('S', 0)
-    total_ns = n_score + s_score
-    if total_ns > 0:
-        n_percent = n_score / total_ns
-        s_percent = s_score / total_ns
-        preference = 'N' if n_percent > s_percent else 'S'
-        strength = abs(n_percent - s_percent)
-        analysis['N/S'] = {
-            'positive': 'Intuition',
-            'negative': 'Sensing',
-            'opposite': 'S',
-            'percentage': n_percent,
-            'preference': preference,
-            'strength': f"{strength:.0%}",
-            'strength_label': get_strength_label(max(n_percent, s_percent))
-        }
-        mbti_type += preference
-        total_strength += max(n_percent, s_percent)
-        preference_count += 1
-
-    # T/F
-    t_score = scores.get('T', 0)
-    f_score = scores.get('F', 0)
-    total_tf = t_score + f_score
-    if total_tf > 0:
-        t_percent = t_score / total_tf
-        f_percent = f_score / total_tf
-        preference = 'T' if t_percent > f_percent else 'F'
-        strength = abs(t_percent - f_percent)
-        analysis['T/F'] = {
-            'positive': 'Thinking',
-            'negative': 'Feeling',
-            'opposite': 'F',
-            'percentage': t_percent,
-            'preference': preference,
-            'strength': f"{strength:.0%}",
-            'strength_label': get_strength_label(max(t_percent, f_percent))
-        }
-        mbti_type += preference
-        total_strength += max(t_percent, f_percent)
-        preference_count += 1
-
-    # J/P
-    # Determine the dominant function from all detailed functions
-    all_functions = {
-        'Te': scores.get('Te', 0), 'Ti': scores.get('Ti', 0),
-        'Fe': scores.get('Fe', 0), 'Fi': scores.get('Fi', 0),
-        'Ne': scores.get('Ne', 0), 'Ni': scores.get('Ni', 0),
-        'Se': scores.get('Se', 0), 'Si': scores.get('Si', 0)
-    }
-    
-    # Find the function with the highest score
-    # In case of a tie, the first one encountered will be chosen, which is an acceptable simplification
-    dominant_function = max(all_functions, key=all_functions.get)
-
-    # Determine J/P based on the dominant function's type (Rational/Judging vs. Irrational/Perceiving)
-    # Rational/Judging functions: T and F
-    # Irrational/Perceiving functions: N and S
-    if dominant_function[0] in ['T', 'F']:
-        preference = 'J'
-    else: # N or S
-        preference = 'P'
-
-    # Calculate a 'strength' for J/P based on the dominance of that function type
-    judging_score = scores.get('T', 0) + scores.get('F', 0)
-    perceiving_score = scores.get('N', 0) + scores.get('S', 0)
-    total_jp = judging_score + perceiving_score
-
-    if total_jp > 0:
-        j_percent = judging_score / total_jp
-        p_percent = perceiving_score / total_jp
-        jp_strength = abs(j_percent - p_percent)
-        percentage = j_percent
-    else:
-        jp_strength = 0
-        percentage = 0.5 # Default to neutral if no scores
-
-    analysis['J/P'] = {
-        'positive': 'Judging',
-        'negative': 'Perceiving',
-        'opposite': 'P' if preference == 'J' else 'J',
-        'percentage': percentage,
-        'preference': preference,
-        'strength': f"{jp_strength:.0%}",
-        'strength_label': get_strength_label(max(j_percent, p_percent))
-    }
-    mbti_type += preference
-    total_strength += max(j_percent, p_percent)
-    preference_count += 1
-
-    # Overall strength
-    overall_strength_value = total_strength / preference_count if preference_count > 0 else 0
-    analysis['overall_strength'] = get_strength_label(overall_strength_value)
-    analysis['mbti_type'] = mbti_type
-
-    return analysis
-
-def calculate_cognitive_profile(scores):
-    profile = {}
-    
-    # Detailed function scores
-    detailed_scores = {
-        'Te': scores.get('Te', 0), 'Ti': scores.get('Ti', 0),
-        'Fe': scores.get('Fe', 0), 'Fi': scores.get('Fi', 0),
-        'Ne': scores.get('Ne', 0), 'Ni': scores.get('Ni', 0),
-        'Se': scores.get('Se', 0), 'Si': scores.get('Si', 0)
-    }
-
-    # Primary function letter scores
-    primary_scores = {
-        'T': scores.get('T', 0),
-        'F': scores.get('F', 0),
-        'N': scores.get('N', 0),
-        'S': scores.get('S', 0)
-    }
-
-    if not any(primary_scores.values()):
-        return {"error": "Not enough data for cognitive profile."}
-
-    # 1. Determine Primary Function
-    primary_letter = max(primary_scores, key=primary_scores.get)
-    
-    # Determine if it's introverted or extroverted
-    func1 = f"{primary_letter}e"
-    func2 = f"{primary_letter}i"
-    
-    # Handle cases where one of the detailed functions might not be in the scores
-    score1 = detailed_scores.get(func1, 0)
-    score2 = detailed_scores.get(func2, 0)
-
-    primary_function = func1 if score1 >= score2 else func2
-    primary_attitude = primary_function[1]
-
-    # 2. Determine Secondary Function
-    secondary_letter = ''
-    if primary_letter in ['T', 'F']: # Judging
-        secondary_letter = 'N' if primary_scores.get('N', 0) >= primary_scores.get('S', 0) else 'S'
-    else: # Perceiving
-        secondary_letter = 'T' if primary_scores.get('T', 0) >= primary_scores.get('F', 0) else 'F'
-        
-    secondary_attitude = 'e' if primary_attitude == 'i' else 'i'
-    secondary_function = f"{secondary_letter}{secondary_attitude}"
-
-    # 3. Determine Inferior Function
-    inferior_map = {
-        'Ti': 'Fe', 'Te': 'Fi', 'Fi': 'Te', 'Fe': 'Ti',
-        'Ni': 'Se', 'Ne': 'Si', 'Si': 'Ne', 'Se': 'Ni'
-    }
-    inferior_function = inferior_map.get(primary_function)
-
-    # 4. Determine Strength
-    def get_strength_label(score, total):
-        if total == 0:
-            return "Weak"
-        strength_val = score / total
-        if strength_val > 0.75:
-            return "Strong"
-        elif strength_val > 0.60:
-            return "Moderate"
-        else:
-            return "Weak"
-
-    # Strength for Primary
-    primary_total = primary_scores.get(primary_letter, 0)
-    primary_specific_score = detailed_scores.get(primary_function, 0)
-    
-    # To calculate strength, we need a consistent denominator.
-    # Let's use the sum of the two detailed functions of that type.
-    primary_pair_total = detailed_scores.get(func1, 0) + detailed_scores.get(func2, 0)
-    primary_strength = get_strength_label(primary_specific_score, primary_pair_total)
-
-    # Strength for Secondary
-    sec_func1 = f"{secondary_letter}e"
-    sec_func2 = f"{secondary_letter}i"
-    secondary_specific_score = detailed_scores.get(secondary_function, 0)
-    secondary_pair_total = detailed_scores.get(sec_func1, 0) + detailed_scores.get(sec_func2, 0)
-    secondary_strength = get_strength_label(secondary_specific_score, secondary_pair_total)
-
-    # Strength for Inferior
-    inf_func1 = f"{inferior_function[0]}e"
-    inf_func2 = f"{inferior_function[0]}i"
-    inferior_specific_score = detailed_scores.get(inferior_function, 0)
-    inferior_pair_total = detailed_scores.get(inf_func1, 0) + detailed_scores.get(inf_func2, 0)
-    inferior_strength = get_strength_label(inferior_specific_score, inferior_pair_total)
-
-
-    profile = {
-        "primary": {"function": primary_function, "strength": primary_strength},
-        "secondary": {"function": secondary_function, "strength": secondary_strength},
-        "inferior": {"function": inferior_function, "strength": inferior_strength},
-        "profile_string": f"{primary_function}-{secondary_function}-{inferior_function}"
-    }
-
-    return profile
-
-# Get Supabase credentials from st.secrets
-supabase_url = st.secrets["supabaseurl"]
-supabase_key = st.secrets["SUPABASE_ANON_KEY"]
-
-
-# Initialize Supabase client
 # Handle potential errors during initialization
 try:
-    if supabase_url and supabase_key:
-        supabase: Client = create_client(supabase_url, supabase_key)
+    if data_backend == "sqlite" or (supabase_url and supabase_key):
+        shared_repository = get_shared_repository(data_backend, backend_location)
+        # Signed-in sessions use their own repository
+        repository = get_session_repository() if st.session_state.get('session') else shared_repository
         client_initialized = True
     else:
         client_initialized = False
 except Exception as e:
     client_initialized = False
-    st.error(f"Failed to initialize Supabase client: {e}")
+    st.error(f"Failed to initialize the data backend: {e}")
+
+
+# --- Instrumentation ---
+# Set METRICS_PORT to serve the Prometheus metrics at :<port>/metrics
+@st.cache_resource
+def start_metrics_exporter(port):
+    return metrics.start_http_exporter(port)
+
+if st.secrets.get("METRICS_PORT"):
+    start_metrics_exporter(int(st.secrets["METRICS_PORT"]))
+
+def render_debug_panel(container, trace):
+    backend_spans = [s for s in trace.spans if s['kind'] == "backend"]
+    with container:
+        st.caption(f"This rerun: {trace.elapsed() * 1000:.0f} ms, {len(backend_spans)} backend calls "
+                   f"({sum(s['ms'] for s in backend_spans):.0f} ms)")
+        st.dataframe(trace.spans, hide_index=True, column_order=["kind", "name", "ms", "rows", "bytes", "error"])
+        st.download_button("Download metrics", metrics.registry.render_prometheus(),
+                           file_name="metrics.txt", mime="text/plain")
+
+def finish_rerun():
+    # Records the page and rerun spans and fills the debug panel. Runs at the
+    # end of the script, or from stop_page() when a page stops early.
+    metrics.record("render", f"page:{page}", time.perf_counter() - page_started)
+    metrics.record("app", "rerun", rerun_trace.elapsed())
+    if debug_panel is not None:
+        render_debug_panel(debug_panel, rerun_trace)
+
+def stop_page():
+    finish_rerun()
+    st.stop()
+
+
+# --- Question Set Cache ---
+# The approved question set is shared by every session in this process.
+# Entries expire after QUESTION_CACHE_TTL seconds, and any write to the
+# questions table bumps the version key so new test takers get fresh data
+# right away instead of waiting for the TTL.
+QUESTION_CACHE_TTL = 300  # seconds
+
+@st.cache_resource
+def get_question_set_version():
+    # A single mutable counter per process, shared across sessions
+    return {"version": 0, "lock": threading.Lock()}
+
+def bump_question_set_version():
+    state = get_question_set_version()
+    with state["lock"]:
+        state["version"] += 1
+    fetch_approved_questions.clear()
+
+@st.cache_data(ttl=QUESTION_CACHE_TTL, show_spinner=False)
+def fetch_approved_questions(version):
+    # `version` is only part of the cache key; bumping it forces a refetch
+    return get_shared_repository(data_backend, backend_location).approved_questions()
+
+@st.cache_resource
+def warm_up_question_cache():
+    # Runs once per process: pre-load the approved question set in the
+    # background so the first test taker doesn't pay for the fetch
+    def load():
+        try:
+            fetch_approved_questions(get_question_set_version()["version"])
+        except Exception as e:
+            print(f"Question cache warm-up failed: {e}")
+    thread = threading.Thread(target=load, name="question-cache-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+if client_initialized:
+    warm_up_question_cache()
+
+
+# --- Result Persistence ---
+# Finished tests are written to the results table by a process-wide
+# write-behind queue, so "Finish Test" never waits on the database.
+@st.cache_resource
+def get_results_queue():
+    writer = get_service_repository(data_backend, backend_location)
+    attribute_users = writer is not None
+    if writer is None:
+        # Row level security only lets the anon key insert unattributed rows
+        print("results-writer: SUPABASE_SERVICE_ROLE_KEY not set, results are stored without user ids")
+        writer = get_shared_repository(data_backend, backend_location)
+
+    def insert_results(rows):
+        if not attribute_users:
+            rows = [{**row, "user_id": None} for row in rows]
+        writer.insert_results(rows)
+    return WriteBehindQueue(insert_results, name="results-writer")
+
+def save_test_result(questions, user_answers, record):
+    from scoring import calculate_mbti_analysis, calculate_cognitive_profile, answers_by_question_id
+    mbti_analysis = calculate_mbti_analysis(record)
+    cognitive_profile = calculate_cognitive_profile(record)
+    get_results_queue().submit({
+        "user_id": current_user.id if current_user else None,
+        # The process-local questions_version can't identify the set across restarts
+        "question_set": question_set_fingerprint(questions),
+        "answers": answers_by_question_id(questions, user_answers),
+        "scores": record.scores_dict(),
+        "attitude_scores": record.attitudes_dict(),
+        "mbti_type": mbti_analysis.get('mbti_type'),
+        "profile_string": cognitive_profile.get('profile_string'),
+        "mbti_analysis": mbti_analysis,
+        "cognitive_profile": cognitive_profile,
+    })
+
+
+# --- Population Statistics ---
+# Type counts are maintained by a trigger on the results table, so the page
+# reads a few dozen counter rows instead of scanning every result. They are
+# cached briefly per process; new results show up within the TTL.
+POPULATION_CACHE_TTL = 60  # seconds
+POPULATION_CATEGORIES = {"mbti_type": "MBTI type", "profile_string": "Cognitive profile"}
+POPULATION_CHART_LIMIT = 20  # Profiles are numerous; the chart shows the most common ones
+
+@st.cache_data(ttl=POPULATION_CACHE_TTL, show_spinner=False)
+def fetch_type_distribution():
+    # {category: [(value, count, share)] most common first}
+    rows = get_shared_repository(data_backend, backend_location).result_type_counts()
+    distribution = {}
+    for category in POPULATION_CATEGORIES:
+        counts = sorted(((row['value'], row['count']) for row in rows if row['category'] == category),
+                        key=lambda item: (-item[1], item[0]))
+        total = sum(count for _, count in counts)
+        distribution[category] = [(value, count, count / total) for value, count in counts]
+    return distribution
+
+def type_share(category, value):
+    # Share of all test takers with this type, or None if unknown
+    try:
+        shares = fetch_type_distribution()[category]
+    except Exception:
+        return None
+    return next((share for v, _, share in shares if v == value), None)
+
+
+# --- Population Percentiles ---
+# Percentiles come from the histogram sketches built offline by
+# score_sketches.py. One copy is shared by every session, so a lookup is a
+# couple of list reads.
+SKETCH_CACHE_TTL = 600  # seconds
+
+@st.cache_resource(ttl=SKETCH_CACHE_TTL, show_spinner=False)
+def fetch_score_sketches():
+    from score_sketches import load_sketches
+    return load_sketches(get_shared_repository(data_backend, backend_location))[0]
+
+def percentile_label(percentile):
+    # 1st to 99th; nobody is above or below everyone
+    n = min(99, max(1, round(percentile)))
+    suffix = "th" if 10 <= n % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+    return f"{n}{suffix}"
+
+def score_percentiles(scores, mbti_analysis):
+    # {function or dichotomy: percentile}, leaving out metrics with no sketch data
+    try:
+        sketches = fetch_score_sketches()
+    except Exception as e:
+        print(f"Score sketches unavailable: {e}")
+        return {}
+    values = {**scores, **{name: data['percentage'] for name, data in mbti_analysis.items() if '/' in name}}
+    percentiles = {}
+    for metric, value in values.items():
+        sketch = sketches.get(metric)
+        percentile = sketch.percentile(value) if sketch else None
+        if percentile is not None:
+            percentiles[metric] = percentile
+    return percentiles
+
+
+# --- Test Checkpoints ---
+# In-progress tests are checkpointed so a reload or dropped connection can
+# resume them. The test's id travels in the URL (?test=...) and is the only
+# key to its checkpoint: the backend stores it hashed. The checkpoint
+# is one character per question plus a fingerprint of the question set, so
+# resuming only needs the approved set already in the shared cache.
+# Checkpoints go through a process-wide CoalescingWriter: each test is
+# written at most once per CHECKPOINT_INTERVAL however fast it is answered,
+# and the tests due in an interval share batched upserts. A click only
+# queues a copy of the answers; the writer thread encodes the rows.
+CHECKPOINT_INTERVAL = 3.0  # seconds
+CHECKPOINT_BATCH_SIZE = 100  # the most save_test_sessions accepts per call
+
+@st.cache_resource
+def get_checkpoint_writer():
+    writer = get_service_repository(data_backend, backend_location) or get_shared_repository(data_backend, backend_location)
+    def save_checkpoints(checkpoints):
+        writer.save_test_sessions([checkpoint_row(checkpoint) for checkpoint in checkpoints])
+    return CoalescingWriter(save_checkpoints, interval=CHECKPOINT_INTERVAL, batch_size=CHECKPOINT_BATCH_SIZE,
+                            name="test-checkpoints")
+
+def question_set_fingerprint(questions):
+    return hashlib.sha1(",".join(str(q['id']) for q in questions).encode()).hexdigest()[:16]
+
+def answer_code(answer):
+    # Radio label -> the answer codes of scoring.py, as one character
+    if answer.startswith("A:"):
+        return "1"
+    if answer.startswith("B:"):
+        return "2"
+    return "3" if answer == "Both" else "0"
+
+def encode_progress(questions, user_answers):
+    # {question index: radio label} -> "1.03..." ('.' = not answered yet)
+    codes = ["."] * len(questions)
+    for i, answer in user_answers.items():
+        codes[i] = answer_code(answer)
+    return "".join(codes)
+
+def decode_progress(questions, answers):
+    labels = {"0": "Neither", "3": "Both"}
+    user_answers = {}
+    for i, code in enumerate(answers):
+        if code in ("1", "2"):
+            user_answers[i] = f"A: {questions[i]['a_answer']}" if code == "1" else f"B: {questions[i]['b_answer']}"
+        elif code in labels:
+            user_answers[i] = labels[code]
+    return user_answers
+
+def checkpoint_test(questions, finished=False):
+    # Queues the test's current state, replacing any checkpoint still pending
+    session_id = st.session_state.get('test_session_id')
+    if session_id is None:
+        return
+    adaptive = bool(st.session_state.get('adaptive_mode'))
+    get_checkpoint_writer().submit(session_id, {
+        "id": session_id,
+        "questions": questions,
+        "question_set": st.session_state.question_set_fingerprint,
+        "user_answers": dict(st.session_state.user_answers),
+        # Bank order is implied; only adaptive mode needs the asked order
+        "question_order": list(st.session_state.question_order) if adaptive else None,
+        "position": st.session_state.current_question_index,
+        "adaptive": adaptive,
+        "finished": finished,
+    })
+
+def checkpoint_row(checkpoint):
+    # The test_sessions row for a queued checkpoint
+    question_order = checkpoint["question_order"]
+    return {
+        "id": checkpoint["id"],
+        "question_set": checkpoint["question_set"],
+        "answers": encode_progress(checkpoint["questions"], checkpoint["user_answers"]),
+        "question_order": ",".join(map(str, question_order)) if question_order else None,
+        "position": checkpoint["position"],
+        "adaptive": checkpoint["adaptive"],
+        "finished": checkpoint["finished"],
+    }
 
+def start_test_session(questions):
+    # Called whenever a fresh question order is set up; a retake in the same
+    # session gets a new id
+    if st.session_state.get('test_session_id') is None:
+        st.session_state.test_session_id = secrets.token_urlsafe(16)
+    st.session_state.question_set_fingerprint = question_set_fingerprint(questions)
+    st.query_params["test"] = st.session_state.test_session_id
+
+def end_test_session():
+    st.session_state.test_session_id = None
+    st.query_params.pop("test", None)
+
+def resume_test_session():
+    # After a reload the session state is empty but the URL still names the
+    # test. Returns a message when the checkpoint can't be used.
+    session_id = st.query_params.get("test")
+    if not session_id or 'current_question_index' in st.session_state:
+        return None
+    try:
+        pending = get_checkpoint_writer().pending(session_id)
+        checkpoint = checkpoint_row(pending) if pending else repository.test_session(session_id)
+        question_set_version = get_question_set_version()["version"]
+        questions = fetch_approved_questions(question_set_version)
+    except Exception as e:
+        return f"Could not restore your test: {e}"
+    if not checkpoint or checkpoint['finished']:
+        st.query_params.pop("test", None)
+        return None
+    if checkpoint['question_set'] != question_set_fingerprint(questions):
+        st.query_params.pop("test", None)
+        return "The questions have changed since you started, so the test starts over."
+
+    st.session_state.questions = questions
+    st.session_state.questions_version = question_set_version
+    st.session_state.question_set_fingerprint = checkpoint['question_set']
+    st.session_state.user_answers = decode_progress(questions, checkpoint['answers'])
+    st.session_state.adaptive_mode = checkpoint['adaptive']
+    st.session_state.question_order = (
+        [int(i) for i in checkpoint['question_order'].split(",")] if checkpoint['question_order']
+        else list(range(len(questions)))
+    )
+    st.session_state.current_question_index = min(checkpoint['position'], len(st.session_state.question_order) - 1)
+    st.session_state.test_session_id = session_id
+    return None
+
+
+# --- Test Runner ---
+# The question card is a fragment: answering a question and moving between
+# questions only reruns the card, not authentication, the sidebar and page
+# dispatch. Answers stay in session state (and in a debounced checkpoint)
+# until "Finish Test", which is the only step that reruns the whole app.
+# Checkpoints are queued from the answer and navigation callbacks, not on
+# every card run. The "question_card" span times the card's own work.
+def reset_test_progress():
+    st.session_state.current_question_index = 0
+    st.session_state.user_answers = {}
+    st.session_state.question_order = None
+
+# The selector only reads the compiled question set, so one per question set
+# is shared by every session. The set is keyed on its fingerprint as well as
+# the version: the version only counts this process's own edits, and the
+# approved set also changes through other processes and the cache TTL.
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_adaptive_selector(_questions, fingerprint, version):
+    from adaptive import AdaptiveSelector
+    return AdaptiveSelector(_questions)
+
+def on_answer_change(questions, question_index):
+    st.session_state.user_answers[question_index] = st.session_state[f"question_{question_index}"]
+    checkpoint_test(questions)
+
+def on_previous_question(questions):
+    st.session_state.current_question_index -= 1
+    checkpoint_test(questions)
+
+def on_next_question(questions, selector):
+    # question_order holds the question indices in the order they are asked;
+    # adaptive mode appends the next pick only when moving past the last one
+    question_order = st.session_state.question_order
+    if selector is not None and st.session_state.current_question_index == len(question_order) - 1:
+        question_order.append(selector.next_question(st.session_state.user_answers, question_order))
+    st.session_state.current_question_index += 1
+    checkpoint_test(questions)
+
+@st.fragment
+def render_question_card(questions, selector=None):
+    with metrics.span("render", "question_card"):
+        question_card(questions, selector)
+
+def question_card(questions, selector=None):
+    total_questions = len(questions)
+    question_order = st.session_state.question_order
+    position = st.session_state.current_question_index
+    current_index = question_order[position]
+    current_question = questions[current_index]
+
+    # Adaptive progress depends on this question's answer, so it is filled in below
+    progress = st.empty()
+    if selector is None:
+        progress.progress((position + 1) / total_questions, text=f"Question {position + 1} of {total_questions}")
+
+    st.subheader(f"Question {position + 1}")
+    st.write(current_question['question'])
+
+    # Display options, preselecting the stored answer when coming back to a question
+    options = [
+        f"A: {current_question['a_answer']}",
+        f"B: {current_question['b_answer']}",
+        "Neither",
+        "Both"
+    ]
+    previous_answer = st.session_state.user_answers.get(current_index)
+    selected_option = st.radio(
+        "Choose an option:",
+        options,
+        index=options.index(previous_answer) if previous_answer in options else 0,
+        key=f"question_{current_index}",
+        on_change=on_answer_change, args=(questions, current_index),
+    )
+
+    # Store selected answer; a question left at the preselected option counts too
+    st.session_state.user_answers[current_index] = selected_option
+
+    at_last = position == len(question_order) - 1
+    if selector is not None:
+        confidence = selector.confidence(st.session_state.user_answers)
+        progress_percentage = min(max((confidence - 0.5) / (selector.confidence_threshold - 0.5), 0.0), 1.0)
+        progress.progress(progress_percentage, text=f"Question {position + 1} · {confidence:.0%} confident "
+                                                    f"(finishes at {selector.confidence_threshold:.0%})")
+        # Past the last asked question there is nothing left to ask once
+        # the result is confident enough or the bank is used up
+        finished = at_last and (selector.should_stop(st.session_state.user_answers, confidence)
+                                or len(question_order) == total_questions)
+    else:
+        finished = at_last
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.button("Previous", disabled=(position == 0), on_click=on_previous_question, args=(questions,))
+    with col2:
+        if finished:
+            if st.button("Finish Test"):
+                # --- Results Calculation ---
+                from scoring import score_test
+                with metrics.span("compute", "score_test"):
+                    record = score_test(questions, st.session_state.user_answers)
+                    save_test_result(questions, st.session_state.user_answers, record)
+                checkpoint_test(questions, finished=True)
+                end_test_session()
+
+                # Set state to show results; the results view needs a full rerun
+                st.session_state.test_finished = True
+                st.session_state.final_record = record
+                st.rerun()
+        else:
+            st.button("Next", on_click=on_next_question, args=(questions, selector))
+
+# --- Voting ---
+# A vote is a single `cast_vote` RPC that records the vote and updates the
+# counter in one transaction, rejects duplicates and returns the new counts.
+def cast_vote(question_id, vote_type):
+    result = repository.cast_vote(question_id, vote_type)
+    st.session_state.cast_votes[question_id] = {
+        'upvotes': result['upvotes'],
+        'downvotes': result['downvotes'],
+        # A rejected duplicate still means this user has voted
+        'vote_type': vote_type if result['accepted'] else result.get('existing_vote_type', vote_type),
+        'error': None,
+    }
+
+def on_vote_click(question_id, vote_type, counts):
+    try:
+        cast_vote(question_id, vote_type)
+    except Exception as e:
+        st.session_state.cast_votes[question_id] = {**counts, 'vote_type': None, 'error': f"Error casting vote: {e}"}
+
+@st.fragment
+def render_vote_controls(q, existing_vote):
+    # Clicking a vote button only reruns this fragment, so the counts update
+    # in place without refetching the Question Bank
+    cast = st.session_state.cast_votes.get(q['id'])
+    counts = {'upvotes': q.get('upvotes', 0), 'downvotes': q.get('downvotes', 0)}
+    vote_type = existing_vote
+    if cast:
+        counts = {'upvotes': cast['upvotes'], 'downvotes': cast['downvotes']}
+        vote_type = cast['vote_type'] or existing_vote
+        if cast['error']:
+            st.error(cast['error'])
+
+    col1, col2, col3 = st.columns([1, 1, 5])
+    vote_disabled = not current_user or vote_type is not None
+    vote_help = "You must be logged in to vote, and can only vote once."
+    with col1:
+        st.button(f"👍 ({counts['upvotes']})", key=f"up_{q['id']}", disabled=vote_disabled, help=vote_help,
+                  on_click=on_vote_click, args=(q['id'], 'up', counts))
+    with col2:
+        st.button(f"👎 ({counts['downvotes']})", key=f"down_{q['id']}", disabled=vote_disabled, help=vote_help,
+                  on_click=on_vote_click, args=(q['id'], 'down', counts))
+
+    if vote_type is not None and current_user:
+        st.caption("You have already voted on this question.")
+
+
+# --- Question Bank Pagination ---
+# The bank is paged with a keyset cursor of (order column value, id) taken
+# from the last row of the previous page, so every page is an index range
+# scan of `page_size` rows no matter how deep the user pages.
+QUESTION_BANK_PAGE_SIZES = [10, 25, 50, 100]
+
+def fetch_question_bank_page(statuses, order_by, descending, page_size, cursor=None):
+    # Fetch one extra row to know whether there is a next page
+    rows = repository.question_bank_page(statuses, order_by, descending, page_size + 1, cursor)
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = (rows[-1][order_by], rows[-1]['id'])
+    return rows, next_cursor
+
+def search_question_bank_page(query, statuses, page_size, offset=0):
+    # Ranked search results instead of the ordered listing; these pages are
+    # offset-paged since relevance has no stable keyset
+    rows = repository.search_questions(query, statuses, page_size + 1, offset)
+    next_cursor = offset + page_size if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
+
+def with_question_body(q):
+    # Adds the expander body columns, fetched the first time the expander is
+    # opened and kept for the page; search results already include them
+    if 'a_answer' in q:
+        return q
+    details = st.session_state.bank_details
+    if q['id'] not in details:
+        details[q['id']] = repository.question_details([q['id']]).get(q['id'], {})
+    return {**details[q['id']], **q}
+
+
+# --- Question Bank Comments ---
+# Comments are fetched only for opened expanders, newest first, a page at a
+# time. Commenter roles come from a process-wide user -> role cache instead
+# of a join per comment; roles rarely change, so entries live for
+# ROLE_CACHE_TTL seconds.
+COMMENTS_PAGE_SIZE = 10
+ROLE_CACHE_TTL = 600  # seconds
+
+@st.cache_resource
+def get_role_cache():
+    # {user_id: (role, expires_at)}, shared across sessions
+    return {"roles": {}, "lock": threading.Lock()}
+
+def fetch_user_roles(user_ids):
+    cache = get_role_cache()
+    now = time.monotonic()
+    with cache["lock"]:
+        roles = {user_id: entry[0] for user_id, entry in cache["roles"].items()
+                 if user_id in user_ids and entry[1] > now}
+    missing = [user_id for user_id in set(user_ids) if user_id and user_id not in roles]
+    if missing:
+        fetched = get_shared_repository(data_backend, backend_location).user_roles(missing)
+        with cache["lock"]:
+            for user_id in missing:
+                # Users without a profile are cached too, as None
+                cache["roles"][user_id] = (fetched.get(user_id), now + ROLE_CACHE_TTL)
+                roles[user_id] = fetched.get(user_id)
+    return roles
+
+def load_comments_page(question_id):
+    # Appends the next page of a question's comments to session state; also
+    # the "Show older comments" callback, so errors are kept for display
+    loaded = st.session_state.bank_comments.setdefault(
+        question_id, {"comments": [], "cursor": None, "more": True, "error": None})
+    try:
+        rows = repository.question_comments(question_id, COMMENTS_PAGE_SIZE + 1, loaded["cursor"])
+    except Exception as e:
+        loaded["error"] = f"Error fetching comments: {e}"
+        return
+    loaded["error"] = None
+    loaded["more"] = len(rows) > COMMENTS_PAGE_SIZE
+    rows = rows[:COMMENTS_PAGE_SIZE]
+    if rows:
+        loaded["cursor"] = (rows[-1]['created_at'], rows[-1]['id'])
+    loaded["comments"].extend(rows)
+
+def render_comments(question_id, comment_count):
+    if question_id not in st.session_state.bank_comments:
+        load_comments_page(question_id)
+    loaded = st.session_state.bank_comments[question_id]
+    if loaded["error"]:
+        st.error(loaded["error"])
+    if not loaded["comments"]:
+        st.write("No comments yet.")
+        return
 
+    try:
+        roles = fetch_user_roles({comment['user_id'] for comment in loaded["comments"]})
+    except Exception as e:
+        print(f"Commenter roles unavailable: {e}")
+        roles = {}
+    for comment in loaded["comments"]:
+        commenter_role = (roles.get(comment['user_id']) or "user").capitalize()
+        st.markdown(f"**{commenter_role}** ({comment['created_at']}):")
+        st.markdown(f"> {comment['comment_text']}")
+    if loaded["more"]:
+        shown = len(loaded["comments"])
+        st.button(f"Show older comments ({shown} of {max(comment_count, shown)} shown)",
+                  key=f"more_comments_{question_id}", on_click=load_comments_page, args=(question_id,))
+
+@st.fragment
+def render_bank_question(q, existing_vote):
+    # Opening or closing the expander only reruns this fragment; the body and
+    # its comments are fetched the first time it is open
+    comment_count = q.get('comment_count', 0)
+    expander = st.expander(
+        f"{q['question']} ({q['status'].capitalize()}) | 👍 {q.get('upvotes', 0)} 👎 {q.get('downvotes', 0)} 💬 {comment_count}",
+        key=f"bank_question_{q['id']}", on_change="rerun",
+    )
+    if not expander.open:
+        return
+    with expander:
+        try:
+            q = with_question_body(q)
+        except Exception as e:
+            st.error(f"Error fetching question details: {e}")
+        st.write(f"**Dimension:** {q.get('question_dimension', 'N/A')}")
+        st.write(f"**A:** {q.get('a_answer', 'N/A')} ({q.get('a_function', 'N/A')})")
+        st.write(f"**B:** {q.get('b_answer', 'N/A')} ({q.get('b_function', 'N/A')})")
+        if q.get('additional_info'):
+            st.info(f"**Additional Info:** {q['additional_info']}")
+
+        # --- Voting Section ---
+        render_vote_controls(q, existing_vote)
+
+        # --- Comments Section ---
+        st.markdown("---")
+        st.subheader(f"Comments ({comment_count})")
+        render_comments(q['id'], comment_count)
+
+        # Show comment form ONLY to logged-in users
+        if current_user:
+            with st.form(key=f"comment_form_{q['id']}", clear_on_submit=True):
+                comment_text = st.text_area("Write a comment...", key=f"comment_text_{q['id']}")
+                submit_comment = st.form_submit_button("Post Comment")
+                if submit_comment and comment_text:
+                    try:
+                        repository.add_comment(q['id'], current_user.id, comment_text)
+                        st.success("Comment posted!")
+                        # Refetch the count and the newest comments
+                        st.session_state.bank_comments.pop(q['id'], None)
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"Error posting comment: {e}")
+        # Show message to guests
+        else:
+            st.info("Log in to vote or post a comment.")
+
+
+# --- Edit Questions Sync ---
+# The moderator table keeps a per-session snapshot: rows by id, plus the ids
+# of each page already fetched. Every run first pulls only what changed since
+# the last sync (`updated_at` watermark, and tombstones for deletes) and
+# applies it in place; pages are re-queried only when someone else changed
+# something. The moderator's own updates and deletes are applied directly.
+# Re-read this much before the watermark, so rows committed late by a
+# transaction that started before the last sync are not missed
+SYNC_OVERLAP = timedelta(seconds=5)
+# More changes than this since the last sync and the snapshot is rebuilt
+SYNC_MAX_CHANGES = 500
+# Cached page listings kept per snapshot
+SNAPSHOT_MAX_PAGES = 50
+
+def new_edit_snapshot():
+    return {"rows": {}, "pages": {}, "watermark": None, "deleted_watermark": None}
+
+def overlap_watermark(watermark):
+    return (datetime.fromisoformat(watermark) - SYNC_OVERLAP).isoformat()
+
+EPOCH = "1970-01-01T00:00:00+00:00"
+
+def sync_edit_snapshot(snapshot):
+    if snapshot["watermark"] is None:
+        # Fresh snapshot: start the watermarks at the server's latest change
+        snapshot["watermark"] = repository.latest_question_change() or EPOCH
+        snapshot["deleted_watermark"] = repository.latest_question_deletion() or EPOCH
+        return snapshot
+
+    changed = repository.questions_changed_since(overlap_watermark(snapshot["watermark"]), SYNC_MAX_CHANGES + 1)
+    deleted = repository.question_deletions_since(overlap_watermark(snapshot["deleted_watermark"]), SYNC_MAX_CHANGES + 1)
+    if len(changed) > SYNC_MAX_CHANGES or len(deleted) > SYNC_MAX_CHANGES:
+        return sync_edit_snapshot(new_edit_snapshot())
+
+    rows = snapshot["rows"]
+    stale = False
+    for row in changed:
+        # The overlap re-reads rows already applied; only real changes count
+        if rows.get(row['id']) != row:
+            rows[row['id']] = row
+            stale = True
+        snapshot["watermark"] = max(snapshot["watermark"], row['updated_at'], key=datetime.fromisoformat)
+    for tombstone in deleted:
+        if rows.pop(tombstone['question_id'], None) is not None:
+            stale = True
+        snapshot["deleted_watermark"] = max(snapshot["deleted_watermark"], tombstone['deleted_at'], key=datetime.fromisoformat)
+
+    if stale:
+        # Changed rows may have moved in or out of a filtered page
+        snapshot["pages"].clear()
+    return snapshot
+
+def fetch_edit_page(snapshot, search, statuses, page_size, cursor=None):
+    # One page of the moderator table in id-descending order, keyset-paged on
+    # id. With search text the page is ranked by relevance instead and the
+    # cursor is a row offset; the total isn't counted then. Only the first
+    # page is counted; later pages reuse its total.
+    # Returns (rows, next_cursor, total matching rows).
+    search = search.strip()
+    key = (search, tuple(sorted(statuses)), page_size, cursor)
+    if key not in snapshot["pages"]:
+        if search:
+            offset = cursor or 0
+            rows = [{column: row.get(column) for column in EDIT_COLUMN_NAMES}
+                    for row in repository.search_questions(search, statuses, page_size + 1, offset)]
+            total = None
+            next_cursor = offset + page_size if len(rows) > page_size else None
+        else:
+            rows, total = repository.edit_questions_page(statuses, page_size + 1, cursor)
+            first_page = snapshot["pages"].get(key[:3] + (None,))
+            if total is None and first_page is not None:
+                total = first_page[2]
+            next_cursor = rows[page_size - 1]['id'] if len(rows) > page_size else None
+        page_rows = rows[:page_size]
+
+        if len(snapshot["pages"]) >= SNAPSHOT_MAX_PAGES:
+            snapshot["pages"].clear()
+        snapshot["rows"].update((row['id'], row) for row in page_rows)
+        snapshot["pages"][key] = ([row['id'] for row in page_rows], next_cursor, total)
+
+    page_ids, next_cursor, total = snapshot["pages"][key]
+    return [snapshot["rows"][i] for i in page_ids if i in snapshot["rows"]], next_cursor, total
+
+# Search results are whole question rows; the snapshot holds only these
+EDIT_COLUMN_NAMES = [column.strip() for column in EDIT_QUESTION_COLUMNS.split(",")]
+
+def apply_local_update(snapshot, row):
+    # Stored like a synced row, so the next sync's overlap doesn't see a change
+    row = {column: row.get(column) for column in EDIT_COLUMN_NAMES}
+    previous = snapshot["rows"].get(row['id'])
+    status_changed = previous is None or previous.get('status') != row['status']
+    snapshot["rows"][row['id']] = row
+    snapshot["watermark"] = max(snapshot["watermark"], row['updated_at'], key=datetime.fromisoformat)
+
+    for key, (page_ids, next_cursor, total) in list(snapshot["pages"].items()):
+        statuses = key[1]
+        if not statuses or not status_changed:
+            continue
+        if row['status'] not in statuses and row['id'] in page_ids:
+            # Moved out of this status filter
+            page_ids.remove(row['id'])
+            snapshot["pages"][key] = (page_ids, next_cursor, total - 1 if total else total)
+        elif row['status'] in statuses and row['id'] not in page_ids:
+            # Moved into it; where it lands is up to the server
+            del snapshot["pages"][key]
+
+def apply_local_delete(snapshot, question_id):
+    snapshot["rows"].pop(question_id, None)
+    for key, (page_ids, next_cursor, total) in snapshot["pages"].items():
+        if question_id in page_ids:
+            page_ids.remove(question_id)
+            snapshot["pages"][key] = (page_ids, next_cursor, total - 1 if total else total)
+
+
+# --- Near-Duplicate Detection ---
+# Submissions and the question being edited are checked against a MinHash LSH
+# index of the whole bank (near_duplicates.py), which compares a question
+# against a handful of candidates instead of every row. The index is built
+# once per process and kept current the same way as the edit snapshot: at most
+# every DUPLICATE_SYNC_INTERVAL seconds the rows changed and deleted since the
+# last sync are applied to it, and this process's own writes right away.
+DUPLICATE_SYNC_INTERVAL = 30  # seconds
+
+@st.cache_resource
+def get_synced_duplicate_index(backend, location):
+    from near_duplicates import SyncedDuplicateIndex
+    # Syncs need every question and the deletion tombstones: the service role
+    # reads both, the anon key relies on the anon policy on question_deletions
+    source = get_service_repository(backend, location) or get_shared_repository(backend, location)
+    return SyncedDuplicateIndex(source, DUPLICATE_SYNC_INTERVAL)
+
+def get_duplicate_index():
+    return get_synced_duplicate_index(data_backend, backend_location).current()
+
+def index_question_write(row=None, deleted_id=None):
+    # Applies this process's own insert, update or delete to a built index
+    index = get_synced_duplicate_index(data_backend, backend_location).index
+    if index is None:
+        return
+    if row is not None:
+        index.add(row)
+    if deleted_id is not None:
+        index.remove(deleted_id)
+
+def find_similar_questions(row, exclude=None):
+    # [(question row, estimated similarity)] for the closest existing questions
+    from near_duplicates import question_text
+    with metrics.span("render", "duplicate_check"):
+        return get_duplicate_index().matches(question_text(row), exclude=exclude)
+
+def render_similar_questions(matches):
+    for match, score in matches:
+        st.markdown(f"- **{score:.0%} similar** · #{match['id']} ({match['status']}): {match['question']}  \n"
+                    f"  A: {match['a_answer']} · B: {match['b_answer']}")
+
+def submit_question(row):
+    inserted = repository.insert_question(row)
+    if inserted:
+        index_question_write(inserted)
+    bump_question_set_version()
+
+def keep_editing_submission():
+    # Puts the held submission back into the form fields
+    row = st.session_state.pop('pending_submission')["row"]
+    for key in ["a_answer", "b_answer", "a_function", "b_function", "question_dimension", "question_type", "additional_info"]:
+        st.session_state[key] = row[key]
+    st.session_state.question_text = row["question"]
+
+
+# --- Question Statistics ---
+# Response statistics are computed offline by item_analysis.py, so they only
+# change when the job runs.
+QUESTION_STATS_TTL = 300  # seconds
+QUESTION_STATS_COLUMNS = {
+    "responses": st.column_config.NumberColumn("Responses"),
+    "a_rate": st.column_config.NumberColumn("A", format="percent", help="Share of responses choosing A"),
+    "b_rate": st.column_config.NumberColumn("B", format="percent", help="Share of responses choosing B"),
+    "both_rate": st.column_config.NumberColumn("Both", format="percent"),
+    "neither_rate": st.column_config.NumberColumn("Neither", format="percent"),
+    "a_item_total_r": st.column_config.NumberColumn(
+        "A item-total r", format="%.2f", help="Correlation of choosing A with the score of A's function"),
+    "b_item_total_r": st.column_config.NumberColumn(
+        "B item-total r", format="%.2f", help="Correlation of choosing B with the score of B's function"),
+}
+
+@st.cache_data(ttl=QUESTION_STATS_TTL, show_spinner=False)
+def fetch_question_stats(question_ids):
+    # {question id: derived statistics} for one page of the moderator table
+    from item_analysis import derived_stats
+    return {row['question_id']: derived_stats(row) for row in repository.question_stats(list(question_ids))}
+
+
+# --- Bulk Import and Export ---
+# Parsing, validation and batching live in question_io.py, shared with the
+# command-line tool.
+EXPORT_FORMATS = {"csv": "text/csv", "jsonl": "application/jsonl"}
+
+def export_question_file(file_format):
+    # Passed to st.download_button as a callable, so the bank is only read
+    # (page by page) when the moderator actually clicks the button
+    def build():
+        out = io.StringIO()
+        question_io.export_questions(repository, out, file_format)
+        return out.getvalue()
+    return build
+
+def render_bulk_import():
+    uploaded = st.file_uploader("Import questions from a .csv or .jsonl file", type=["csv", "jsonl"], key="bulk_import_file")
+    if uploaded is None:
+        return
+    rows, errors = question_io.parse_import(uploaded, question_io.file_format_for(uploaded.name))
+    if errors:
+        st.error(f"{len(errors)} problems found in {uploaded.name}; nothing will be imported until they are fixed.")
+        shown = errors[:question_io.MAX_REPORTED_ERRORS]
+        st.dataframe([{"line": line_number, "problem": message} for line_number, message in shown])
+        return
+    updates = sum(1 for row in rows if "id" in row)
+    st.caption(f"{len(rows)} valid questions: {len(rows) - updates} new, {updates} updating existing ids.")
+    if st.button(f"Import {len(rows)} questions", type="primary", disabled=not rows):
+        progress = st.progress(0.0, text="Importing...")
+        try:
+            written = question_io.import_questions(
+                repository, rows, submitted_by=current_user.id,
+                on_progress=lambda done, total: progress.progress(done / total, text=f"Imported {done} of {total}"),
+            )
+        except Exception as e:
+            st.error(f"Import stopped after an error: {e}")
+        else:
+            st.success(f"Imported {written} questions.")
+        finally:
+            # Earlier batches may have been written even if a later one failed
+            bump_question_set_version()
 
 def sign_up(email, password):
     try:
-        response = supabase.auth.sign_up({"email": email, "password": password})
+        response = get_session_repository().sign_up(email, password)
         if response.user:
             st.success("Sign up successful! Please check your email to confirm your account. You can now log in.")
             st.session_state.user = response.user
@@ -270,7 +933,7 @@ def sign_up(email, password):
 
 def sign_in(email, password):
     try:
-        response = supabase.auth.sign_in_with_password({"email": email, "password": password})
+        response = get_session_repository().sign_in(email, password)
         # The session object contains user, access_token, etc.
         st.session_state.session = response.session
         st.success("Logged in successfully!")
@@ -279,42 +942,90 @@ def sign_in(email, password):
 
 def sign_out():
     try:
-        supabase.auth.sign_out()
+        get_session_repository().sign_out()
     except Exception as e:
         st.error(f"Error during sign out: {e}")
     finally:
+        st.session_state.repository = None
         # Always clear the session state as a fallback
         st.session_state.session = None
         st.session_state.user = None
         st.session_state.user_role = None
+        st.session_state.auth_cache = None
+        st.session_state.pop('edit_snapshot', None)
         st.success("Logged out successfully!")
 
+# --- Identity Cache ---
+# Seconds before expiry at which a cached identity is revalidated
+AUTH_EXPIRY_LEEWAY = 30
+
+def decode_access_token(access_token):
+    # Verify the signature locally when the project's JWT secret is configured.
+    # Without it the claims are only decoded; the backend still checks the
+    # signature on every data call made with the token.
+    jwt_secret = st.secrets.get("SUPABASE_JWT_SECRET")
+    if jwt_secret:
+        # Expiry is checked by the caller so expired tokens can still be refreshed
+        return jwt.decode(access_token, jwt_secret, algorithms=["HS256"], audience="authenticated", options={"verify_exp": False})
+    return jwt.decode(access_token, options={"verify_signature": False})
+
+def auth_cache_valid(cached, access_token):
+    return (
+        cached is not None
+        and cached['access_token'] == access_token
+        and time.time() < cached['expires_at'] - AUTH_EXPIRY_LEEWAY
+    )
+
+def fetch_user_role(user_id):
+    role = repository.user_role(user_id)
+    if role is not None:
+        return role
+    # This handles cases where a user exists in auth but not profiles
+    repository.create_profile(user_id, "user")
+    return 'user'
+
+def resolve_identity(session, cached=None):
+    claims = decode_access_token(session.access_token)
+    if cached and claims.get('sub') == cached['user'].id and time.time() < claims['exp'] - AUTH_EXPIRY_LEEWAY:
+        # A new, still valid token for the same user (e.g. refreshed elsewhere):
+        # keep the cached user and role, just re-key the cache
+        repository.use_token(session.access_token)
+        return {**cached, 'access_token': session.access_token, 'expires_at': claims['exp']}
+
+    # Validates the token with the backend, refreshing it if it has expired
+    auth_response = repository.set_session(session.access_token, session.refresh_token)
+    if auth_response.session is None:
+        raise ValueError("Session could not be refreshed")
+    st.session_state.session = auth_response.session
+    user = auth_response.user or auth_response.session.user
+    return {
+        'access_token': auth_response.session.access_token,
+        'expires_at': decode_access_token(auth_response.session.access_token)['exp'],
+        'user': user,
+        'role': fetch_user_role(user.id),
+    }
+
 # --- Main App Layout --- #
 st.title("Jungian Cognitive Function Test")
 
 
 
 # --- Authentication & Session Management ---
-# On every script run, re-authenticate the Supabase client if a session exists in state.
+# The resolved user and role are cached per session, keyed by access token,
+# until shortly before the token expires. Reruns with a cached identity only
+# attach the token to the repository and make no auth or profile calls.
 if 'session' in st.session_state and st.session_state.session:
     try:
-        # Use the stored session to re-authenticate the client
-        supabase.auth.set_session(
-            st.session_state.session.access_token, 
-            st.session_state.session.refresh_token
-        )
-        # After setting the session, get the user details
-        user_response = supabase.auth.get_user()
-        st.session_state.user = user_response.user
-        
-        # Fetch user role from profiles table
-        profile_response = supabase.table("profiles").select("role").eq("id", st.session_state.user.id).execute()
-        if profile_response.data:
-            st.session_state.user_role = profile_response.data[0]['role']
-        else:
-            # This handles cases where a user exists in auth but not profiles
-            st.session_state.user_role = 'user'
-            supabase.table("profiles").insert({"id": st.session_state.user.id, "role": "user"}).execute()
+        with metrics.span("render", "auth"):
+            access_token = st.session_state.session.access_token
+            cached = st.session_state.get('auth_cache')
+            if not auth_cache_valid(cached, access_token):
+                cached = resolve_identity(st.session_state.session, cached)
+                st.session_state.auth_cache = cached
+            else:
+                repository.use_token(access_token)
+        st.session_state.user = cached['user']
+        st.session_state.user_role = cached['role']
 
     except Exception as e:
         # This can happen if the token is expired or invalid
@@ -322,6 +1033,9 @@ if 'session' in st.session_state and st.session_state.session:
         st.session_state.user = None
         st.session_state.session = None
         st.session_state.user_role = None
+        st.session_state.auth_cache = None
+        st.session_state.repository = None
+        repository = shared_repository
         print(f"Error setting session: {e}")
 
 # Initialize variables for the rest of the app
@@ -329,11 +1043,12 @@ current_user = st.session_state.get('user')
 current_role = st.session_state.get('user_role')
 
 # --- Sidebar ---
+sidebar_started = time.perf_counter()
 st.sidebar.title("Navigation")
 
-# Initialize page state if it doesn't exist
+# Initialize page state if it doesn't exist; a reload mid-test goes back to it
 if 'page' not in st.session_state:
-    st.session_state.page = "Home"
+    st.session_state.page = "Take Test" if "test" in st.query_params else "Home"
 
 # --- Navigation Buttons ---
 # A function to set the page, for cleaner button code
@@ -347,6 +1062,8 @@ if st.sidebar.button("Take Test", use_container_width=True):
     set_page("Take Test")
 if st.sidebar.button("Question Bank", use_container_width=True):
     set_page("Question Bank")
+if st.sidebar.button("Population Stats", use_container_width=True):
+    set_page("Population Stats")
 
 # Conditional Moderator Tools button
 if current_user:
@@ -381,7 +1098,14 @@ else:
                 sign_up(email, password)
                 st.rerun()
 
+# Moderators can show where this rerun's time went
+debug_panel = None
+if current_role == 'moderator' and st.sidebar.toggle("Show rerun breakdown", key="debug_panel"):
+    debug_panel = st.sidebar.container()
+metrics.record("render", "sidebar", time.perf_counter() - sidebar_started)
+
 page = st.session_state.page
+page_started = time.perf_counter()
 
 if page == "Home":
     st.header("Open-source community driven Jung cognitive type test")
@@ -407,164 +1131,46 @@ elif page == "Take Test":
     # Check if a test was just finished
     if st.session_state.get('test_finished'):
         st.subheader("Your Test Results")
-        
-        scores = st.session_state.get('final_scores', {})
-        attitude_scores = st.session_state.get('attitude_scores', {})
-
-        # --- Attitude Chart ---
-        st.write("#### Attitude: Introversion (i) vs. Extraversion (e)")
-        attitude_data = {'Introversion (i)': attitude_scores.get('i', 0), 'Extraversion (e)': attitude_scores.get('e', 0)}
-        if any(attitude_data.values()):
-            import pandas as pd
-            import altair as alt
-
-            attitude_df = pd.DataFrame(list(attitude_data.items()), columns=['Attitude', 'Score'])
 
-            attitude_chart = alt.Chart(attitude_df).mark_bar().encode(
-                x='Score:Q',
-                y='Attitude:N',
-                color=alt.Color('Attitude:N', scale=alt.Scale(range=['#ff7f0e', '#1f77b4']))
-            ).properties(
-                title='Attitude Balance'
-            )
-            st.altair_chart(attitude_chart, use_container_width=True)
-        else:
-            st.write("No attitude scores were recorded.")
-        
-        # --- Chart 1: Ranked Single-Letter Functions ---
-        st.write("#### Ranked Primary Functions")
-        primary_functions = {key: val for key, val in scores.items() if len(key) == 1}
+        # The scoring library is only loaded on the results view
+        from scoring import SCORE_KEYS, calculate_mbti_analysis, calculate_cognitive_profile
+        from charts import results_chart
         
-        if primary_functions:
-            import pandas as pd
-            import altair as alt
-
-            ranked_df = pd.DataFrame(
-                list(primary_functions.items()), 
-                columns=['Function', 'Score']
-            ).sort_values('Score', ascending=False)
-
-            # Map single letters to full names for the chart
-            function_map = {
-                'N': 'Intuition (N)',
-                'S': 'Sensing (S)',
-                'T': 'Thinking (T)',
-                'F': 'Feeling (F)'
-            }
-            ranked_df['Function'] = ranked_df['Function'].map(function_map)
-
-            bar = alt.Chart(ranked_df).mark_bar().encode(
-                x=alt.X('Score', type='quantitative'),
-                y=alt.Y('Function', type='nominal', sort='-x')
-            )
-            
-            text = bar.mark_text(
-                align='left',
-                baseline='middle',
-                dx=3  # Nudges text to right so it doesn't overlap
-            ).encode(
-                text='Score:Q'
-            )
-
-            chart = (bar + text).properties(title='Primary Function Scores')
-            st.altair_chart(chart, use_container_width=True)
-        else:
+        # Scores are kept as a compact ScoreRecord; dicts are only built for display
+        record = st.session_state.final_record
+        scores = record.scores_dict()
+        attitude_scores = record.attitudes_dict()
+
+        # --- Score Charts ---
+        # Attitude, ranked primary functions and both dichotomy views in one
+        # memoized Vega-Lite spec
+        if not any(attitude_scores.get(key, 0) for key in ('i', 'e')):
+            st.write("No attitude scores were recorded.")
+        if not any(len(key) == 1 for key in scores):
             st.write("No primary function scores were recorded.")
-
-        # --- Chart 2: Function Dichotomies (Diverging Bar Chart) ---
-        st.write("#### Function Dichotomies - Relative")
-        dichotomy_pairs = [('Te', 'Ti', 'Thinking'), ('Fe', 'Fi', 'Feeling'), ('Ne', 'Ni', 'Intuition'), ('Se', 'Si', 'Sensing')]
-        
-        chart_data = []
-        for func1, func2, name in dichotomy_pairs:
-            score1 = scores.get(func1, 0)
-            score2 = scores.get(func2, 0)
-            chart_data.append({'pair': name, 'function': func1, 'score': score1, 'abs_score': score1})
-            chart_data.append({'pair': name, 'function': func2, 'score': -score2, 'abs_score': score2})
-
-        if chart_data:
-            import pandas as pd
-            import altair as alt
-
-            df = pd.DataFrame(chart_data)
-            y_axis_order = ['Thinking', 'Feeling', 'Intuition', 'Sensing']
-
-            bar = alt.Chart(df).mark_bar().encode(
-                x='score:Q',
-                y=alt.Y('pair:N', sort=y_axis_order),
-                color=alt.Color('function:N',
-                                scale=alt.Scale(
-                                    domain=['Fe', 'Fi', 'Ne', 'Ni', 'Se', 'Si', 'Te', 'Ti'],
-                                    range=['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f']
-                                ))
-            )
-
-            text = alt.Chart(df).mark_text(
-                align='left',
-                baseline='middle',
-                dx=3
-            ).encode(
-                x='score:Q',
-                y=alt.Y('pair:N', sort=y_axis_order),
-                text='function:N'
-            )
-
-            chart = (bar + text).properties(title='Function Pair Balances')
-            st.altair_chart(chart, use_container_width=True)
-        else:
-            st.write("No detailed function scores were recorded.")
-
-        # --- Chart 3: Blended Function Dichotomies ---
-        st.write("#### Function dichotomies - Weighed")
-        
-        blended_chart_data = []
-        for func1, func2, name in dichotomy_pairs:
-            parent_func = func1[0]
-            
-            score1 = scores.get(func1, 0) * scores.get(parent_func, 0)
-            score2 = scores.get(func2, 0) * scores.get(parent_func, 0)
-            
-            blended_chart_data.append({'pair': name, 'function': func1, 'score': score1, 'abs_score': score1})
-            blended_chart_data.append({'pair': name, 'function': func2, 'score': -score2, 'abs_score': score2})
-
-        if blended_chart_data:
-            import pandas as pd
-            import altair as alt
-
-            df_blended = pd.DataFrame(blended_chart_data)
-            y_axis_order = ['Thinking', 'Feeling', 'Intuition', 'Sensing']
-
-            bar = alt.Chart(df_blended).mark_bar().encode(
-                x='score:Q',
-                y=alt.Y('pair:N', sort=y_axis_order),
-                color=alt.Color('function:N',
-                                scale=alt.Scale(
-                                    domain=['Fe', 'Fi', 'Ne', 'Ni', 'Se', 'Si', 'Te', 'Ti'],
-                                    range=['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f']
-                                ))
-            )
-
-            text = alt.Chart(df_blended).mark_text(
-                align='left',
-                baseline='middle',
-                dx=3
-            ).encode(
-                x='score:Q',
-                y=alt.Y('pair:N', sort=y_axis_order),
-                text='function:N'
-            )
-
-            blended_chart = (bar + text).properties(title='Blended Function Pair Balances (Weighted by Primary Function)')
-            st.altair_chart(blended_chart, use_container_width=True)
-        else:
-            st.write("No blended function scores could be calculated.")
-
+        with metrics.span("render", "results_chart"):
+            st.vega_lite_chart(results_chart(scores, attitude_scores))
+
+        mbti_analysis = calculate_mbti_analysis(record)
+        with metrics.span("compute", "score_percentiles"):
+            percentiles = score_percentiles(scores, mbti_analysis)
+
+        # --- Population Comparison ---
+        if percentiles:
+            st.write("#### How You Compare")
+            st.dataframe([
+                {"Function": key, "Score": scores.get(key, 0), "Percentile": percentile_label(percentiles[key])}
+                for key in SCORE_KEYS if key in percentiles
+            ], hide_index=True)
+            st.caption("Percentile: the share of all test takers who scored lower (ties count half).")
 
         # --- MBTI Preference Analysis ---
         st.write("#### MBTI Preference Analysis")
-        mbti_analysis = calculate_mbti_analysis(scores, attitude_scores)
         
         st.subheader(f"Your Type: {mbti_analysis.get('mbti_type', '----')}")
+        mbti_share = type_share("mbti_type", mbti_analysis.get('mbti_type'))
+        if mbti_share is not None:
+            st.caption(f"{mbti_share:.1%} of test takers share this type.")
         st.write(f"**Overall Strength:** {mbti_analysis.get('overall_strength', 'Unknown')}")
         st.divider()
 
@@ -573,15 +1179,20 @@ elif page == "Take Test":
             st.write(f"**{data['positive']} ({letter.split('/')[0]}) vs. {data['negative']} ({letter.split('/')[1]})**")
             st.progress(data['percentage'])
             st.write(f"{data['strength']} preference for **{data['preference']}** ({data.get('strength_label', 'Weak')})")
+            if letter in percentiles:
+                st.caption(f"{data['positive']} share in the {percentile_label(percentiles[letter])} percentile of test takers")
 
 
         # --- Cognitive Function Profile ---
         st.write("#### Cognitive Function Profile")
-        cognitive_profile = calculate_cognitive_profile(scores)
+        cognitive_profile = calculate_cognitive_profile(record)
         if "error" in cognitive_profile:
             st.warning(cognitive_profile["error"])
         else:
             st.subheader(f"Your Profile: {cognitive_profile.get('profile_string', '----')}")
+            profile_share = type_share("profile_string", cognitive_profile.get('profile_string'))
+            if profile_share is not None:
+                st.caption(f"{profile_share:.1%} of test takers share this profile.")
             st.write(f"**Primary Function:** {cognitive_profile['primary']['function']} ({cognitive_profile['primary']['strength']})")
             st.write(f"**Secondary Function:** {cognitive_profile['secondary']['function']} ({cognitive_profile['secondary']['strength']})")
             st.write(f"**Inferior Function:** {cognitive_profile['inferior']['function']} ({cognitive_profile['inferior']['strength']})")
@@ -589,20 +1200,27 @@ elif page == "Take Test":
         if st.button("Take Test Again"):
             # Clear the results and test state to start over
             st.session_state.test_finished = False
-            st.session_state.final_scores = {}
-            st.session_state.current_question_index = 0
-            st.session_state.user_answers = {}
+            st.session_state.final_record = None
+            reset_test_progress()
+            # Pick up the latest approved set (served from the shared cache)
+            st.session_state.pop('questions', None)
             st.rerun()
         
     else:
         # --- Test taking logic starts here ---
+        resume_message = resume_test_session()
+        if resume_message:
+            st.info(resume_message)
+        st.toggle("Adaptive mode", key="adaptive_mode", on_change=reset_test_progress,
+                  help="Ask the most informative questions first and stop once the result is clear.")
+
         if 'questions' not in st.session_state or 'current_question_index' not in st.session_state:
             try:
-                # Fetch approved questions
-                response = supabase.table("questions").select("*").eq("status", "approved").execute()
-                st.session_state.questions = response.data
-                st.session_state.current_question_index = 0
-                st.session_state.user_answers = {} # To store user's answers
+                # Fetch approved questions from the shared cache
+                question_set_version = get_question_set_version()["version"]
+                st.session_state.questions = fetch_approved_questions(question_set_version)
+                st.session_state.questions_version = question_set_version
+                reset_test_progress()
             except Exception as e:
                 st.error(f"Error fetching questions: {e}")
                 st.session_state.questions = []
@@ -613,84 +1231,19 @@ elif page == "Take Test":
             st.info("No approved questions available yet. Please check back later.")
         else:
             total_questions = len(questions)
-            current_index = st.session_state.current_question_index
-            current_question = questions[current_index]
-
-            # Progress Bar
-            progress_percentage = (current_index + 1) / total_questions
-            st.progress(progress_percentage, text=f"Question {current_index + 1} of {total_questions}")
-
-            st.subheader(f"Question {current_index + 1}")
-            st.write(current_question['question'])
-
-            # Display options
-            selected_option = st.radio(
-                "Choose an option:",
-                [
-                    f"A: {current_question['a_answer']}",
-                    f"B: {current_question['b_answer']}",
-                    "Neither",
-                    "Both"
-                ],
-                key=f"question_{current_index}"
-            )
-
-            # Store selected answer
-            st.session_state.user_answers[current_index] = selected_option
-
-            col1, col2 = st.columns(2)
-            with col1:
-                if st.button("Previous", disabled=(current_index == 0)):
-                    st.session_state.current_question_index -= 1
-                    st.rerun()
-            with col2:
-                if st.button("Next", disabled=(current_index == total_questions - 1)):
-                    st.session_state.current_question_index += 1
-                    st.rerun()
-                elif current_index == total_questions - 1 and st.button("Finish Test"):
-                    # --- Results Calculation ---
-                    scores = {
-                        "Fe": 0, "Fi": 0, "Ne": 0, "Ni": 0,
-                        "Se": 0, "Si": 0, "Te": 0, "Ti": 0,
-                        "F": 0, "T": 0, "N": 0, "S": 0
-                    }
-                    attitude_scores = {"i": 0, "e": 0}
-                    
-                    for i, answer in st.session_state.user_answers.items():
-                        q = st.session_state.questions[i]
-                        functions_to_score = []
-
-                        if answer == "Both":
-                            functions_to_score.append(q['a_function'])
-                            functions_to_score.append(q['b_function'])
-                        elif answer.startswith("A:"):
-                            functions_to_score.append(q['a_function'])
-                        elif answer.startswith("B:"):
-                            functions_to_score.append(q['b_function'])
-
-                        # Process the scoring
-                        for func in functions_to_score:
-                            if not func: continue # Skip if function is empty string or None
-
-                            # Score the specific function (e.g., Fe, Ni, or F, N)
-                            if func in scores:
-                                scores[func] += 1
-                            
-                            # If it's a detailed function (Fe, Ni), score the general one too (F, N)
-                            if len(func) > 1 and func[0] in scores:
-                                scores[func[0]] += 1
-                            
-                            # Score attitude (i vs e) for within_functions questions
-                            if q.get('question_dimension') == 'within_functions' and len(func) > 1:
-                                attitude = func[1]
-                                if attitude in attitude_scores:
-                                    attitude_scores[attitude] += 1
-
-                    # Set state to show results
-                    st.session_state.test_finished = True
-                    st.session_state.final_scores = scores
-                    st.session_state.attitude_scores = attitude_scores
-                    st.rerun()
+            adaptive = st.session_state.get('adaptive_mode', False)
+            selector = None
+            if adaptive:
+                selector = get_adaptive_selector(
+                    questions, question_set_fingerprint(questions), st.session_state.questions_version)
+
+            # Ask in bank order, or start from the most informative question
+            if st.session_state.get('question_order') is None:
+                st.session_state.question_order = (
+                    [selector.next_question({}, [])] if adaptive else list(range(total_questions))
+                )
+                start_test_session(questions)
+            render_question_card(questions, selector)
 
 elif page == "Submit Question":
     st.header("Submit a New Question")
@@ -710,51 +1263,136 @@ elif page == "Submit Question":
 
             if submitted:
                 if client_initialized:
+                    new_question = {
+                        "question": question_text,
+                        "status": "draft", # All submissions are drafts
+                        "a_function": a_function,
+                        "b_function": b_function,
+                        "a_answer": a_answer,
+                        "b_answer": b_answer,
+                        "question_dimension": question_dimension,
+                        "question_type": question_type,
+                        "additional_info": additional_info,
+                        "submitted_by": current_user.id # Track who submitted it
+                    }
                     try:
-                        response = supabase.table("questions").insert({
-                            "question": question_text,
-                            "status": "draft", # All submissions are drafts
-                            "a_function": a_function,
-                            "b_function": b_function,
-                            "a_answer": a_answer,
-                            "b_answer": b_answer,
-                            "question_dimension": question_dimension,
-                            "question_type": question_type,
-                            "additional_info": additional_info,
-                            "submitted_by": current_user.id # Track who submitted it
-                        }).execute()
+                        matches = find_similar_questions(new_question)
+                    except Exception as e:
+                        st.warning(f"Could not check for similar questions: {e}")
+                        matches = []
+                    if matches:
+                        # Held back until the submitter has seen the matches
+                        st.session_state.pending_submission = {"row": new_question, "matches": matches}
+                    else:
+                        try:
+                            submit_question(new_question)
+                            st.success("Question submitted successfully for review!")
+                        except Exception as e:
+                            st.error(f"Error submitting question: {e}")
+                else:
+                    st.error("Data backend not initialized. Cannot submit question.")
+
+        pending_submission = st.session_state.get('pending_submission')
+        if pending_submission:
+            st.warning("Your question looks very similar to questions already in the bank:")
+            render_similar_questions(pending_submission["matches"])
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("Submit anyway"):
+                    try:
+                        submit_question(pending_submission["row"])
+                        del st.session_state.pending_submission
                         st.success("Question submitted successfully for review!")
                     except Exception as e:
                         st.error(f"Error submitting question: {e}")
-                else:
-                    st.error("Supabase client not initialized. Cannot submit question.")
+            with col2:
+                st.button("Edit my question", on_click=keep_editing_submission)
     else:
         st.warning("Please log in to submit a question.")
 
 elif page == "Edit Questions":
     st.header("Edit Questions")
     if current_role == 'moderator': # PROTECTED: Moderators only
+        if 'edit_snapshot' not in st.session_state:
+            st.session_state.edit_snapshot = new_edit_snapshot()
         try:
-            # Fetch all questions for editing
-            response = supabase.table("questions").select("*").order("id", desc=True).execute()
-            questions = response.data
+            # Pull only the rows changed since the last run into the local snapshot
+            snapshot = st.session_state.edit_snapshot = sync_edit_snapshot(st.session_state.edit_snapshot)
+        except Exception as e:
+            st.error(f"Error syncing questions: {e}")
+            snapshot = st.session_state.edit_snapshot
+
+        with st.expander("Bulk import and export"):
+            render_bulk_import()
+            st.divider()
+            col1, col2 = st.columns(2)
+            for column, file_format in zip([col1, col2], EXPORT_FORMATS):
+                with column:
+                    st.download_button(
+                        f"Export all questions (.{file_format})", data=export_question_file(file_format),
+                        file_name=f"questions.{file_format}", mime=EXPORT_FORMATS[file_format], on_click="ignore",
+                    )
+
+        # --- Search and Paging UI ---
+        col1, col2, col3 = st.columns([3, 2, 1])
+        with col1:
+            search = st.text_input("Search questions and answers", key="edit_search")
+        with col2:
+            edit_statuses = st.multiselect("Filter by Status", options=['approved', 'pending', 'rejected', 'retired', 'draft'], key="edit_statuses")
+        with col3:
+            edit_page_size = st.selectbox("Per page", options=QUESTION_BANK_PAGE_SIZES, index=1, key="edit_page_size")
+
+        # Start again from the first page whenever the search, filter or page size changes
+        edit_query_key = (search, tuple(sorted(edit_statuses)), edit_page_size)
+        if st.session_state.get('edit_query_key') != edit_query_key:
+            st.session_state.edit_query_key = edit_query_key
+            st.session_state.edit_cursors = [None]
+
+        try:
+            questions, next_cursor, total = fetch_edit_page(
+                snapshot, search, edit_statuses, edit_page_size, st.session_state.edit_cursors[-1]
+            )
         except Exception as e:
             st.error(f"Error fetching questions: {e}")
-            questions = []
+            questions, next_cursor, total = [], None, 0
 
         if not questions:
             st.info("No questions found to edit.")
-            st.stop()
-
-        # Display Questions in a DataFrame for context
-        import pandas as pd
-        df = pd.DataFrame(questions)
-        display_columns = [
-            'id', 'question', 'status', 'upvotes', 'downvotes', 'question_dimension',
-            'a_answer', 'a_function', 'b_answer', 'b_function',
-        ]
-        display_columns = [col for col in display_columns if col in df.columns]
-        st.dataframe(df[display_columns])
+            stop_page()
+
+        # Display this page in a DataFrame for context (pandas is only loaded here)
+        with metrics.span("render", "edit_table"):
+            import pandas as pd
+            df = pd.DataFrame(questions)
+            display_columns = [
+                'id', 'question', 'status', 'upvotes', 'downvotes', 'question_dimension',
+                'a_answer', 'a_function', 'b_answer', 'b_function',
+            ]
+            display_columns = [col for col in display_columns if col in df.columns]
+            try:
+                question_stats = fetch_question_stats(tuple(q['id'] for q in questions))
+            except Exception as e:
+                st.warning(f"Question statistics unavailable: {e}")
+                question_stats = {}
+            # Click a column header to sort this page by it
+            stats_df = pd.DataFrame([question_stats.get(q['id'], {}) for q in questions], columns=list(QUESTION_STATS_COLUMNS))
+            st.dataframe(pd.concat([df[display_columns], stats_df], axis=1), column_config=QUESTION_STATS_COLUMNS)
+
+        edit_page_number = len(st.session_state.edit_cursors)
+        col1, col2, col3 = st.columns([1, 1, 3])
+        with col1:
+            if st.button("Previous page", disabled=(edit_page_number == 1)):
+                st.session_state.edit_cursors.pop()
+                st.rerun()
+        with col2:
+            if st.button("Next page", disabled=(next_cursor is None)):
+                st.session_state.edit_cursors.append(next_cursor)
+                st.rerun()
+        with col3:
+            if search.strip():
+                st.caption(f"Page {edit_page_number} · best matches first")
+            else:
+                st.caption(f"Page {edit_page_number} · {total if total is not None else '?'} matching questions")
 
         st.divider()
 
@@ -768,6 +1406,15 @@ elif page == "Edit Questions":
 
         if selected_id:
             selected_question = questions_dict[selected_id]
+            try:
+                similar_questions = find_similar_questions(selected_question, exclude=selected_id)
+            except Exception as e:
+                st.warning(f"Could not check for similar questions: {e}")
+                similar_questions = []
+            if similar_questions:
+                with st.expander(f"Possible duplicates ({len(similar_questions)})"):
+                    render_similar_questions(similar_questions)
+
             with st.form(key=f"edit_form_{selected_id}"):
                 st.write(f"Editing Question ID: {selected_question['id']}")
 
@@ -805,7 +1452,11 @@ elif page == "Edit Questions":
                             "additional_info": additional_info
                         }
                         
-                        supabase.table("questions").update(update_data).eq("id", selected_id).execute()
+                        updated_row = repository.update_question(selected_id, update_data)
+                        if updated_row:
+                            apply_local_update(snapshot, updated_row)
+                            index_question_write(updated_row)
+                        bump_question_set_version()
                         st.success(f"Successfully updated Question ID: {selected_id}")
                         st.rerun()
                     except Exception as e:
@@ -815,7 +1466,10 @@ elif page == "Edit Questions":
                     # Add a confirmation step to prevent accidental deletion
                     if st.checkbox(f"Confirm deletion of question {selected_id}", key=f"delete_confirm_{selected_id}"):
                         try:
-                            supabase.table("questions").delete().eq("id", selected_id).execute()
+                            repository.delete_question(selected_id)
+                            apply_local_delete(snapshot, selected_id)
+                            index_question_write(deleted_id=selected_id)
+                            bump_question_set_version()
                             st.success(f"Successfully deleted Question ID: {selected_id}")
                             st.rerun()
                         except Exception as e:
@@ -828,6 +1482,32 @@ elif page == "Edit Questions":
         st.info("Only moderators can edit questions.")
 
 
+elif page == "Population Stats":
+    st.header("Population Statistics")
+    try:
+        distribution = fetch_type_distribution()
+    except Exception as e:
+        st.error(f"Error fetching population statistics: {e}")
+        distribution = {}
+
+    if not any(distribution.values()):
+        st.info("No test results have been recorded yet.")
+    else:
+        from charts import distribution_chart
+        total_results = sum(count for _, count, _ in distribution["mbti_type"])
+        st.caption(f"Based on {total_results} completed tests · updated every {POPULATION_CACHE_TTL} seconds")
+        for category, label in POPULATION_CATEGORIES.items():
+            shares = distribution[category]
+            if not shares:
+                continue
+            st.subheader(label)
+            with metrics.span("render", f"population_{category}"):
+                st.vega_lite_chart(distribution_chart(shares[:POPULATION_CHART_LIMIT], f"{label} distribution", label))
+                if len(shares) > POPULATION_CHART_LIMIT:
+                    with st.expander(f"Show all {len(shares)}"):
+                        st.dataframe([{label: value, "Test takers": count, "Share": f"{share:.1%}"}
+                                      for value, count, share in shares])
+
 elif page == "Question Bank":
     st.header("Question Bank")
     st.write("Here you can view, vote, and comment on questions.")
@@ -853,132 +1533,79 @@ elif page == "Question Bank":
             default=['approved', 'pending'] # Default to most common view
         )
 
-    try:
-        # Base query
-        query = supabase.table("questions").select("*, comments(*, profiles(role))")
+    bank_search = st.text_input("Search questions and answers", key="bank_search").strip()
+    if bank_search:
+        st.caption("Showing the best matches first; the order setting applies when the search is empty.")
 
-        # Apply filters
-        if selected_statuses:
-            query = query.in_("status", selected_statuses)
-        else:
-            # If nothing is selected, show nothing, as it's less confusing than showing all.
-            st.info("Select at least one status to see questions.")
-            st.stop()
+    # --- Pagination UI ---
+    page_size = st.selectbox("Questions per page", options=QUESTION_BANK_PAGE_SIZES, index=1)
 
-        # Apply ordering
-        query = query.order(order_by, desc=(not order_asc))
-        
-        response = query.execute()
-        questions = response.data
+    if not selected_statuses:
+        # If nothing is selected, show nothing, as it's less confusing than showing all.
+        st.info("Select at least one status to see questions.")
+        stop_page()
+
+    # Start again from the first page whenever the search, filter, order or page size changes
+    bank_query_key = (bank_search, order_by, order_asc, tuple(sorted(selected_statuses)), page_size)
+    if st.session_state.get('bank_query_key') != bank_query_key:
+        st.session_state.bank_query_key = bank_query_key
+        st.session_state.bank_cursors = [None]
+
+    try:
+        if bank_search:
+            questions, next_cursor = search_question_bank_page(
+                bank_search, selected_statuses, page_size, st.session_state.bank_cursors[-1] or 0
+            )
+        else:
+            questions, next_cursor = fetch_question_bank_page(
+                selected_statuses, order_by, not order_asc, page_size, st.session_state.bank_cursors[-1]
+            )
     except Exception as e:
         st.error(f"Error fetching questions: {e}")
-        questions = []
+        questions, next_cursor = [], None
 
     if not questions:
         st.info("No questions match your current filter settings.")
-        st.stop()
+        stop_page()
+
+    page_ids = [q['id'] for q in questions]
 
-    # Fetch all votes by the current user to disable voting buttons
+    # Fetch the current user's votes on this page to disable voting buttons
     user_votes = {}
     if current_user:
         try:
-            vote_response = supabase.table("votes").select("question_id, vote_type").eq("user_id", current_user.id).execute()
-            # Create a dictionary for quick lookup: {question_id: vote_type}
-            user_votes = {v['question_id']: v['vote_type'] for v in vote_response.data}
+            # A dictionary for quick lookup: {question_id: vote_type}
+            user_votes = repository.user_votes(current_user.id, page_ids)
         except Exception as e:
             st.error(f"Error fetching your votes: {e}")
 
-    # Initialize session state for voted questions to prevent re-voting
-    if 'voted_on' not in st.session_state:
-        st.session_state.voted_on = {}
-
-    for q in questions:
-        # Use an expander for each question to keep the UI clean
-        with st.expander(f"{q['question']} ({q['status'].capitalize()}) | 👍 {q.get('upvotes', 0)} 👎 {q.get('downvotes', 0)}", expanded=False):
-            st.write(f"**Dimension:** {q.get('question_dimension', 'N/A')}")
-            st.write(f"**A:** {q.get('a_answer', 'N/A')} ({q.get('a_function', 'N/A')})")
-            st.write(f"**B:** {q.get('b_answer', 'N/A')} ({q.get('b_function', 'N/A')})")
-            if q.get('additional_info'):
-                st.info(f"**Additional Info:** {q['additional_info']}")
-
-            # --- Voting Section ---
-            col1, col2, col3 = st.columns([1, 1, 5])
-            
-            # Check if the user has already voted on this question
-            has_voted = q['id'] in user_votes
-            vote_disabled = not current_user or has_voted
-
-            with col1:
-                if st.button(f"👍 ({q.get('upvotes', 0)})", key=f"up_{q['id']}", disabled=vote_disabled, help="You must be logged in to vote, and can only vote once."):
-                    try:
-                        # Increment the upvote count in the questions table
-                        supabase.rpc('increment_upvotes', {'question_id_to_update': q['id']}).execute()
-                        # Record the vote in the votes table
-                        supabase.table('votes').insert({
-                            'user_id': current_user.id,
-                            'question_id': q['id'],
-                            'vote_type': 'up'
-                        }).execute()
-                        # Update local state to disable button immediately
-                        user_votes[q['id']] = 'up'
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"Error upvoting: {e}")
-            with col2:
-                if st.button(f"👎 ({q.get('downvotes', 0)})", key=f"down_{q['id']}", disabled=vote_disabled, help="You must be logged in to vote, and can only vote once."):
-                    try:
-                        # Increment the downvote count in the questions table
-                        supabase.rpc('increment_downvotes', {'question_id_to_update': q['id']}).execute()
-                        # Record the vote in the votes table
-                        supabase.table('votes').insert({
-                            'user_id': current_user.id,
-                            'question_id': q['id'],
-                            'vote_type': 'down'
-                        }).execute()
-                        # Update local state to disable button immediately
-                        user_votes[q['id']] = 'down'
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"Error downvoting: {e}")
-            
-            if has_voted and current_user:
-                st.caption(f"You have already voted on this question.")
-
-
-            # --- Comments Section ---
-            st.markdown("---")
-            st.subheader("Comments")
-            comments = sorted(q.get('comments', []), key=lambda c: c['created_at'], reverse=True)
-            if comments:
-                for comment in comments:
-                    commenter_role = "User"
-                    if comment.get('profiles') and comment['profiles'].get('role'):
-                        commenter_role = comment['profiles']['role'].capitalize()
-                    st.markdown(f"**{commenter_role}** ({comment['created_at']}):")
-                    st.markdown(f"> {comment['comment_text']}")
-            else:
-                st.write("No comments yet.")
-
-            # Show comment form ONLY to logged-in users
-            if current_user:
-                with st.form(key=f"comment_form_{q['id']}", clear_on_submit=True):
-                    comment_text = st.text_area("Write a comment...", key=f"comment_text_{q['id']}")
-                    submit_comment = st.form_submit_button("Post Comment")
-                    if submit_comment and comment_text:
-                        try:
-                            supabase.table("comments").insert({
-                                "question_id": q['id'],
-                                "user_id": current_user.id,
-                                "comment_text": comment_text
-                            }).execute()
-                            st.success("Comment posted!")
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"Error posting comment: {e}")
-            # Show message to guests
-            else:
-                st.info("Log in to vote or post a comment.")
+    # Votes cast during fragment reruns; this full run already has fresh counts
+    st.session_state.cast_votes = {}
 
+    # Bodies and comments loaded so far on this page; moving to another page drops them
+    bank_comments_key = (bank_query_key, st.session_state.bank_cursors[-1])
+    if st.session_state.get('bank_comments_key') != bank_comments_key:
+        st.session_state.bank_comments_key = bank_comments_key
+        st.session_state.bank_comments = {}
+        st.session_state.bank_details = {}
 
+    expanders_started = time.perf_counter()
+    for q in questions:
+        render_bank_question(q, user_votes.get(q['id']))
+    metrics.record("render", "question_bank_expanders", time.perf_counter() - expanders_started)
 
+    # --- Page Navigation ---
+    page_number = len(st.session_state.bank_cursors)
+    col1, col2, col3 = st.columns([1, 1, 3])
+    with col1:
+        if st.button("Previous page", disabled=(page_number == 1)):
+            st.session_state.bank_cursors.pop()
+            st.rerun()
+    with col2:
+        if st.button("Next page", disabled=(next_cursor is None)):
+            st.session_state.bank_cursors.append(next_cursor)
+            st.rerun()
+    with col3:
+        st.caption(f"Page {page_number}")
 
+finish_rerun()
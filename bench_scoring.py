@@ -0,0 +1,193 @@
+# Benchmarks for the scoring engine in scoring.py.
+#
+# Usage:
+#   python bench_scoring.py [--quick] [--record] [--compare] [--tolerance 0.25]
+#
+# Covers question-set compilation, single-test latency on the interactive
+# "Finish Test" path (score_test + both analysis functions), and batch
+# throughput of the vectorized path, over several question-bank sizes. Only
+# scoring.py is imported, so no Streamlit or Supabase setup is needed.
+#
+# --record appends the run to bench_results.jsonl, tagged with the current
+# git commit. --compare checks this run against the most recent recorded run
+# from a different commit and exits with status 1 if any benchmark got slower
+# by more than --tolerance (a fraction, 0.25 = 25%).
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import scoring
+
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_results.jsonl")
+
+FUNCTIONS = ["Fe", "Fi", "Ne", "Ni", "Se", "Si", "Te", "Ti"]
+LETTERS = ["F", "T", "N", "S"]
+ANSWER_LABELS = ["A: option a", "B: option b", "Neither", "Both"]
+
+# --- Synthetic data ---
+def make_questions(count, seed=0):
+    # Mostly detailed functions, with the occasional bare letter or blank
+    # option, like the real bank
+    rng = random.Random(seed)
+    def pick_function():
+        roll = rng.random()
+        if roll < 0.9:
+            return rng.choice(FUNCTIONS)
+        if roll < 0.97:
+            return rng.choice(LETTERS)
+        return ""
+    return [
+        {
+            "id": i + 1,
+            "a_function": pick_function(),
+            "b_function": pick_function(),
+            "question_dimension": rng.choice(["between_functions", "within_functions"]),
+        }
+        for i in range(count)
+    ]
+
+def make_user_answers(question_count, rng):
+    return {i: rng.choice(ANSWER_LABELS) for i in range(question_count)}
+
+def make_answer_matrix(test_count, question_count, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 4, size=(test_count, question_count), dtype=np.int8)
+
+# --- Timing ---
+def time_call(func, repeat, number=1):
+    # Seconds per call for each repeat
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - started) / number)
+    return timings
+
+def summarize(timings):
+    return {"median_s": statistics.median(timings), "min_s": min(timings)}
+
+def run_benchmarks(quick):
+    bank_sizes = [50, 500] if quick else [50, 500, 5000]
+    batch_size = 2000 if quick else 20000
+    repeat = 5 if quick else 15
+    results = {}
+    rng = random.Random(1)
+
+    for bank_size in bank_sizes:
+        questions = make_questions(bank_size)
+
+        results[f"compile/{bank_size}q"] = summarize(time_call(lambda: scoring.compile_questions(questions), repeat))
+
+        user_answers = make_user_answers(bank_size, rng)
+        def single_test():
+            record = scoring.score_test(questions, user_answers)
+            scoring.calculate_mbti_analysis(record)
+            scoring.calculate_cognitive_profile(record)
+        results[f"single_test/{bank_size}q"] = summarize(time_call(single_test, repeat, number=10))
+
+        compiled = scoring.compile_questions(questions)
+        answers = make_answer_matrix(batch_size, bank_size)
+        def batch_arrays():
+            score_rows, attitude_rows = scoring.score_answer_matrix(compiled, answers)
+            scoring.mbti_arrays(score_rows, attitude_rows)
+            scoring.cognitive_arrays(score_rows)
+        summary = summarize(time_call(batch_arrays, repeat))
+        summary["tests_per_s"] = batch_size / summary["median_s"]
+        results[f"batch_arrays/{bank_size}q/{batch_size}t"] = summary
+
+        score_rows, attitude_rows = scoring.score_answer_matrix(compiled, answers)
+        def batch_dicts():
+            scoring.calculate_mbti_analysis(score_rows, attitude_rows)
+            scoring.calculate_cognitive_profile(score_rows)
+        summary = summarize(time_call(batch_dicts, max(3, repeat // 3)))
+        summary["tests_per_s"] = batch_size / summary["median_s"]
+        results[f"batch_dicts/{bank_size}q/{batch_size}t"] = summary
+
+        packed = scoring.pack_rows(score_rows, attitude_rows)
+        def pack_unpack():
+            scoring.unpack_rows(scoring.pack_rows(score_rows, attitude_rows))
+        summary = summarize(time_call(pack_unpack, repeat))
+        summary["bytes_per_test"] = (len(packed) - 1) / batch_size
+        results[f"pack_rows/{bank_size}q/{batch_size}t"] = summary
+
+    return results
+
+# --- Recording ---
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(RESULTS_PATH)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def load_recorded():
+    if not os.path.exists(RESULTS_PATH):
+        return []
+    with open(RESULTS_PATH, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def compare(run, recorded, tolerance):
+    baseline = next((r for r in reversed(recorded) if r["commit"] != run["commit"] and r["quick"] == run["quick"]), None)
+    if baseline is None:
+        print("No recorded run from another commit to compare against.")
+        return []
+    print(f"Comparing against {baseline['commit']} ({baseline['recorded_at']}):")
+    regressions = []
+    for name, summary in run["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+        change = summary["median_s"] / previous["median_s"] - 1
+        flag = "  REGRESSION" if change > tolerance else ""
+        print(f"  {name:<36} {change:+7.1%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scoring engine.")
+    parser.add_argument("--quick", action="store_true", help="Smaller sizes and fewer repeats")
+    parser.add_argument("--record", action="store_true", help=f"Append results to {os.path.basename(RESULTS_PATH)}")
+    parser.add_argument("--compare", action="store_true", help="Compare with the last run recorded from another commit")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    run = {
+        "commit": git_commit(),
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "quick": args.quick,
+        "results": run_benchmarks(args.quick),
+    }
+
+    for name, summary in run["results"].items():
+        line = f"{name:<36} median {summary['median_s'] * 1e3:9.3f} ms  min {summary['min_s'] * 1e3:9.3f} ms"
+        if "tests_per_s" in summary:
+            line += f"  ({summary['tests_per_s']:,.0f} tests/s)"
+        if "bytes_per_test" in summary:
+            line += f"  ({summary['bytes_per_test']:.0f} bytes/test)"
+        print(line)
+
+    regressions = compare(run, load_recorded(), args.tolerance) if args.compare else []
+
+    if args.record:
+        with open(RESULTS_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(run) + "\n")
+
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
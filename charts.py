@@ -0,0 +1,145 @@
+# Vega-Lite specs for the test results view and the population statistics
+# page.
+#
+# All four result charts are emitted as one vertically concatenated spec with
+# the data inlined, so the results page sends a single chart element and needs
+# neither pandas nor altair. Specs are memoized on the immutable score tuples,
+# so rerunning the results page (or another test taker with the same scores)
+# reuses the already built spec.
+
+import functools
+
+DICHOTOMY_PAIRS = [('Te', 'Ti', 'Thinking'), ('Fe', 'Fi', 'Feeling'), ('Ne', 'Ni', 'Intuition'), ('Se', 'Si', 'Sensing')]
+DICHOTOMY_ORDER = [name for _, _, name in DICHOTOMY_PAIRS]
+
+FUNCTION_COLOR_SCALE = {
+    'domain': ['Fe', 'Fi', 'Ne', 'Ni', 'Se', 'Si', 'Te', 'Ti'],
+    'range': ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f'],
+}
+
+PRIMARY_FUNCTION_NAMES = {
+    'N': 'Intuition (N)',
+    'S': 'Sensing (S)',
+    'T': 'Thinking (T)',
+    'F': 'Feeling (F)'
+}
+
+CHART_WIDTH = 500
+
+def attitude_chart(attitude_scores):
+    values = [
+        {'Attitude': 'Introversion (i)', 'Score': attitude_scores.get('i', 0)},
+        {'Attitude': 'Extraversion (e)', 'Score': attitude_scores.get('e', 0)},
+    ]
+    return {
+        'title': 'Attitude Balance',
+        'width': CHART_WIDTH,
+        'data': {'values': values},
+        'mark': 'bar',
+        'encoding': {
+            'x': {'field': 'Score', 'type': 'quantitative'},
+            'y': {'field': 'Attitude', 'type': 'nominal'},
+            'color': {'field': 'Attitude', 'type': 'nominal', 'scale': {'range': ['#ff7f0e', '#1f77b4']}},
+        },
+    }
+
+def primary_function_chart(primary_functions):
+    values = [
+        {'Function': PRIMARY_FUNCTION_NAMES.get(key, key), 'Score': value}
+        for key, value in sorted(primary_functions.items(), key=lambda item: item[1], reverse=True)
+    ]
+    encoding = {
+        'x': {'field': 'Score', 'type': 'quantitative'},
+        'y': {'field': 'Function', 'type': 'nominal', 'sort': '-x'},
+    }
+    return {
+        'title': 'Primary Function Scores',
+        'width': CHART_WIDTH,
+        'data': {'values': values},
+        'layer': [
+            {'mark': 'bar', 'encoding': encoding},
+            # Nudges text to right so it doesn't overlap
+            {'mark': {'type': 'text', 'align': 'left', 'baseline': 'middle', 'dx': 3},
+             'encoding': {**encoding, 'text': {'field': 'Score', 'type': 'quantitative'}}},
+        ],
+    }
+
+def dichotomy_chart(pair_scores, title):
+    # pair_scores: [(pair name, func1, score1, func2, score2)]; func2 is drawn
+    # to the left of zero so each row shows the balance within the pair
+    values = []
+    for name, func1, score1, func2, score2 in pair_scores:
+        values.append({'pair': name, 'function': func1, 'score': score1, 'abs_score': score1})
+        values.append({'pair': name, 'function': func2, 'score': -score2, 'abs_score': score2})
+    position = {
+        'x': {'field': 'score', 'type': 'quantitative'},
+        'y': {'field': 'pair', 'type': 'nominal', 'sort': DICHOTOMY_ORDER},
+    }
+    return {
+        'title': title,
+        'width': CHART_WIDTH,
+        'data': {'values': values},
+        'layer': [
+            {'mark': 'bar',
+             'encoding': {**position, 'color': {'field': 'function', 'type': 'nominal', 'scale': FUNCTION_COLOR_SCALE}}},
+            {'mark': {'type': 'text', 'align': 'left', 'baseline': 'middle', 'dx': 3},
+             'encoding': {**position, 'text': {'field': 'function', 'type': 'nominal'}}},
+        ],
+    }
+
+def distribution_chart(shares, title, label):
+    # shares: [(value, count, share of all results)], drawn in the given order
+    values = [{label: value, 'Test takers': count, 'Share': share} for value, count, share in shares]
+    encoding = {
+        'x': {'field': 'Share', 'type': 'quantitative', 'axis': {'format': '%'}},
+        'y': {'field': label, 'type': 'nominal', 'sort': None},
+        'tooltip': [{'field': label}, {'field': 'Test takers', 'type': 'quantitative'},
+                    {'field': 'Share', 'type': 'quantitative', 'format': '.1%'}],
+    }
+    return {
+        '$schema': 'https://vega.github.io/schema/vega-lite/v5.json',
+        'title': title,
+        'width': CHART_WIDTH,
+        'data': {'values': values},
+        'layer': [
+            {'mark': 'bar', 'encoding': encoding},
+            {'mark': {'type': 'text', 'align': 'left', 'baseline': 'middle', 'dx': 3},
+             'encoding': {**encoding, 'text': {'field': 'Share', 'type': 'quantitative', 'format': '.1%'}}},
+        ],
+    }
+
+@functools.lru_cache(maxsize=4096)
+def results_chart_spec(score_items, attitude_items):
+    # score_items / attitude_items are tuples of (key, value) pairs. The
+    # returned spec is shared between callers and must not be mutated.
+    scores = dict(score_items)
+    attitude_scores = dict(attitude_items)
+    charts = []
+
+    if attitude_scores.get('i', 0) or attitude_scores.get('e', 0):
+        charts.append(attitude_chart(attitude_scores))
+
+    primary_functions = {key: val for key, val in scores.items() if len(key) == 1}
+    if primary_functions:
+        charts.append(primary_function_chart(primary_functions))
+
+    charts.append(dichotomy_chart(
+        [(name, f1, scores.get(f1, 0), f2, scores.get(f2, 0)) for f1, f2, name in DICHOTOMY_PAIRS],
+        'Function Pair Balances'
+    ))
+
+    # Blended: each function weighted by its parent letter's score
+    charts.append(dichotomy_chart(
+        [(name, f1, scores.get(f1, 0) * scores.get(f1[0], 0), f2, scores.get(f2, 0) * scores.get(f1[0], 0))
+         for f1, f2, name in DICHOTOMY_PAIRS],
+        'Blended Function Pair Balances (Weighted by Primary Function)'
+    ))
+
+    return {
+        '$schema': 'https://vega.github.io/schema/vega-lite/v5.json',
+        'vconcat': charts,
+        'resolve': {'scale': {'color': 'independent', 'x': 'independent', 'y': 'independent'}},
+    }
+
+def results_chart(scores, attitude_scores):
+    return results_chart_spec(tuple(scores.items()), tuple(attitude_scores.items()))
@@ -0,0 +1,200 @@
+# Item analysis of the question bank from stored test results.
+#
+# Usage:
+#   python item_analysis.py [--full] [--sqlite app.db]
+#
+# For every question the job keeps additive response statistics: how many
+# results answered it, how often each of A / B / Both / Neither was chosen,
+# and for each option the sums needed for a Pearson correlation between
+# choosing it (0/1) and the test taker's score for the function that option
+# targets. That score is the corrected item-total: it is recomputed from the
+# answers with the current question set, minus this question's own
+# contribution, so an item isn't correlated with itself.
+#
+# Each page of results is turned into an (n_results, n_questions) answer
+# matrix and all sums are column reductions over it. Because the sums add up,
+# the job only reads results newer than its last run and adds them to the
+# stored rows; --full recomputes everything, which is worth doing after the
+# question set has changed, and drops the rows of questions left without
+# responses. Reading every result needs
+# SUPABASE_SERVICE_ROLE_KEY, or --sqlite.
+#
+# Like score_sketches.py, the job stops at the first result created less than
+# --lag-seconds ago, so a result committed after a higher id isn't skipped.
+
+import argparse
+import math
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from question_io import iter_questions, open_repository
+from score_sketches import RESULTS_SETTLE_LAG, settled_result_pages
+from scoring import (
+    ANSWER_A, ANSWER_B, ANSWER_BOTH, ANSWER_NONE, SCORE_INDEX, compile_questions, encode_answers_by_id,
+    score_answer_matrix,
+)
+
+RESULTS_PAGE_SIZE = 5000
+STATS_PAGE_SIZE = 1000
+
+# Additive per-question columns of the question_stats table
+STAT_COLUMNS = [
+    "responses", "a_count", "b_count", "both_count", "neither_count",
+    "a_sum_y", "a_sum_yy", "a_sum_xy", "b_sum_y", "b_sum_yy", "b_sum_xy",
+]
+
+
+# --- Statistics ---
+def option_totals(compiled, questions, score_rows, took_a, took_b, option):
+    # Corrected item-total for one option of every question: the score of the
+    # function the option targets, minus what this question added to it.
+    # (n_results, n_questions); columns without a scored function are zero.
+    functions = [q.get(f"{option}_function") for q in questions]
+    columns = np.array([SCORE_INDEX.get(f, 0) for f in functions], dtype=np.int64)
+    scored = np.array([f in SCORE_INDEX for f in functions])
+    rows = np.arange(len(questions))
+    own = took_a * compiled.a_scores[rows, columns] + took_b * compiled.b_scores[rows, columns]
+    return np.where(scored, score_rows[:, columns] - own, 0.0)
+
+def analyze_results(questions, compiled, rows):
+    # {question id: {STAT_COLUMNS: value}} for one page of result rows
+    answers = np.stack([encode_answers_by_id(row.get("answers") or {}, compiled) for row in rows])
+    # Unanswered and "Neither" are both stored as code 0, so presence comes
+    # from the answer keys
+    presented = np.zeros(answers.shape, dtype=bool)
+    for n, row in enumerate(rows):
+        for question_id in (row.get("answers") or {}):
+            i = compiled.question_index.get(str(question_id))
+            if i is not None:
+                presented[n, i] = True
+
+    score_rows, _ = score_answer_matrix(compiled, answers)
+    score_rows = score_rows.astype(np.float64)
+    took_a = ((answers == ANSWER_A) | (answers == ANSWER_BOTH)).astype(np.float64)
+    took_b = ((answers == ANSWER_B) | (answers == ANSWER_BOTH)).astype(np.float64)
+    mask = presented.astype(np.float64)
+
+    columns = {
+        "responses": mask.sum(axis=0),
+        "a_count": (mask * (answers == ANSWER_A)).sum(axis=0),
+        "b_count": (mask * (answers == ANSWER_B)).sum(axis=0),
+        "both_count": (mask * (answers == ANSWER_BOTH)).sum(axis=0),
+        "neither_count": (mask * (answers == ANSWER_NONE)).sum(axis=0),
+    }
+    for option, took in [("a", took_a), ("b", took_b)]:
+        y = option_totals(compiled, questions, score_rows, took_a, took_b, option) * mask
+        columns[f"{option}_sum_y"] = y.sum(axis=0)
+        columns[f"{option}_sum_yy"] = (y * y).sum(axis=0)
+        columns[f"{option}_sum_xy"] = (took * y).sum(axis=0)
+
+    return {
+        q["id"]: {column: int(columns[column][i]) for column in STAT_COLUMNS}
+        for i, q in enumerate(questions) if columns["responses"][i]
+    }
+
+def merge_stats(into, other):
+    for question_id, stats in other.items():
+        current = into.setdefault(question_id, dict.fromkeys(STAT_COLUMNS, 0))
+        for column in STAT_COLUMNS:
+            current[column] += stats[column]
+    return into
+
+def correlation(n, sum_x, sum_y, sum_yy, sum_xy):
+    # Pearson r of a 0/1 item against a total; None when either side is constant
+    if n < 2:
+        return None
+    var_x = sum_x * (n - sum_x)
+    var_y = n * sum_yy - sum_y * sum_y
+    if var_x <= 0 or var_y <= 0:
+        return None
+    return (n * sum_xy - sum_x * sum_y) / math.sqrt(var_x * var_y)
+
+def derived_stats(stats):
+    # Display values for one question_stats row: endorsement rates and the
+    # item-total correlation of each option
+    n = stats.get("responses") or 0
+    if not n:
+        return {}
+    return {
+        "responses": n,
+        "a_rate": stats["a_count"] / n,
+        "b_rate": stats["b_count"] / n,
+        "both_rate": stats["both_count"] / n,
+        "neither_rate": stats["neither_count"] / n,
+        "a_item_total_r": correlation(n, stats["a_count"] + stats["both_count"],
+                                      stats["a_sum_y"], stats["a_sum_yy"], stats["a_sum_xy"]),
+        "b_item_total_r": correlation(n, stats["b_count"] + stats["both_count"],
+                                      stats["b_sum_y"], stats["b_sum_yy"], stats["b_sum_xy"]),
+    }
+
+
+# --- Batch job ---
+def iter_question_stats(repository, page_size=STATS_PAGE_SIZE):
+    # Every stored question_stats row, one keyset page at a time until a page
+    # comes back empty
+    after_question_id = None
+    while True:
+        page = repository.question_stats_after(after_question_id, page_size)
+        if not page:
+            return
+        yield from page
+        after_question_id = page[-1]["question_id"]
+
+def run_analysis(repository, full=False, page_size=RESULTS_PAGE_SIZE, on_progress=None, lag=RESULTS_SETTLE_LAG):
+    # Adds settled results newer than the last run to the stored statistics
+    # (or recomputes them from every settled result, with full=True). Returns
+    # the number of results read.
+    questions = list(iter_questions(repository))
+    compiled = compile_questions(questions)
+    stats, after_id = {}, None
+    if not full:
+        for row in iter_question_stats(repository):
+            stats[row["question_id"]] = {column: row[column] for column in STAT_COLUMNS}
+            if row.get("last_result_id") is not None:
+                after_id = max(after_id or 0, row["last_result_id"])
+
+    read = 0
+    pages = settled_result_pages(repository, after_id, page_size, lag) if questions else []
+    for page in pages:
+        merge_stats(stats, analyze_results(questions, compiled, page))
+        after_id = page[-1]["id"]
+        read += len(page)
+        if on_progress:
+            on_progress(read)
+
+    question_ids = {q["id"] for q in questions}
+    built_at = datetime.now(timezone.utc).isoformat()
+    rows = [{"question_id": question_id, **values, "last_result_id": after_id, "built_at": built_at}
+            for question_id, values in stats.items() if question_id in question_ids]
+    if rows:
+        repository.save_question_stats(rows)
+    if full:
+        # Questions without responses in the recomputed set keep no row
+        kept = {row["question_id"] for row in rows}
+        stale = [row["question_id"] for row in iter_question_stats(repository) if row["question_id"] not in kept]
+        if stale:
+            repository.delete_question_stats(stale)
+    return read
+
+
+# --- Command line ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute per-question response statistics from stored results.")
+    parser.add_argument("--full", action="store_true", help="Recompute from every result instead of only new ones")
+    parser.add_argument("--sqlite", help="Use this SQLite database instead of Supabase")
+    parser.add_argument("--page-size", type=int, default=RESULTS_PAGE_SIZE)
+    parser.add_argument("--lag-seconds", type=float, default=RESULTS_SETTLE_LAG.total_seconds(),
+                        help="Leave results created this recently for the next run")
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+    read = run_analysis(open_repository(args), args.full, args.page_size,
+                        on_progress=lambda done: print(f"{done} results read", file=sys.stderr),
+                        lag=timedelta(seconds=args.lag_seconds))
+    print(f"Analyzed {read} new results in {time.monotonic() - started:.1f}s.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+# Concurrent-session load test for app.py.
+#
+# Usage:
+#   python load_test.py [--sessions 24] [--concurrency 8] [--questions 60]
+#                       [--record] [--compare] [--tolerance 0.25]
+#
+# Drives many simulated sessions through the real page script with
+# Streamlit's AppTest, all in this process and against a throwaway SQLite
+# database (sqlite_repository.py), so it needs no Supabase project. Sessions
+# share the process-wide caches exactly like browser sessions of one server.
+# AppTest swaps process-global state (st.secrets, the runtime) for each run,
+# so runs cannot overlap in threads; instead up to --concurrency sessions are
+# alive at once and advanced one rerun at a time, round robin. That is how a
+# single GIL-bound server process serves CPU-bound reruns anyway, so the wall
+# clock throughput is the process's capacity.
+#
+# Sessions are spread over three scenarios:
+#
+#   take_test      Home -> Take Test -> answer every question -> Finish Test
+#   question_bank  log in -> Question Bank -> open questions -> vote -> comment
+#                  -> next page
+#   moderator      log in as a moderator -> Edit Questions -> search -> update
+#
+# Every widget interaction is timed with the app's own "rerun" span from
+# metrics.py, as tests/test_perf_budget.py does: AppTest polls for the script
+# to finish, which adds far more wall-clock time than the script itself
+# takes. An interaction whose script calls st.rerun() counts all of its
+# reruns. The report has p50/p95/p99 rerun latency per scenario and overall,
+# throughput in reruns and sessions per second (wall clock), and the memory
+# each live session holds (traced with tracemalloc in a separate, smaller
+# pass; it includes AppTest's own element tree, so treat it as an upper
+# bound).
+#
+# --record appends the run to load_results.jsonl, tagged with the current git
+# commit. --compare checks p95 latency, throughput and memory per session
+# against the most recent recorded run from a different commit with the same
+# settings and exits with status 1 if any got worse by more than --tolerance.
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+
+import metrics
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "load_results.jsonl")
+
+SCENARIOS = ["take_test", "question_bank", "moderator"]
+PASSWORD = "load-test-password"
+MODERATOR_EMAIL = "moderator@load.test"
+# Question Bank expanders each question_bank session opens
+QUESTIONS_OPENED = 2
+
+# --- Test data ---
+def populate(database_path, question_count, user_count, seed=0):
+    from bench_scoring import make_questions
+    from sqlite_repository import SQLiteDatabase, SQLiteRepository
+
+    rng = random.Random(seed)
+    database = SQLiteDatabase(database_path)
+    repository = SQLiteRepository(database)
+    for question in make_questions(question_count, seed):
+        repository.insert_question({
+            "question": f"Load test question {question['id']}: which fits you better?",
+            "status": "approved" if rng.random() < 0.8 else rng.choice(["draft", "rejected", "retired"]),
+            "a_function": question["a_function"],
+            "b_function": question["b_function"],
+            "a_answer": f"Option A of question {question['id']}",
+            "b_answer": f"Option B of question {question['id']}",
+            "question_dimension": question["question_dimension"],
+            "question_type": "self_reported",
+            "additional_info": "",
+        })
+
+    emails = [f"user{i}@load.test" for i in range(user_count)]
+    for email in emails + [MODERATOR_EMAIL]:
+        response = repository.sign_up(email, PASSWORD)
+        repository.create_profile(response.user.id, "moderator" if email == MODERATOR_EMAIL else "user")
+    database.close()
+    return emails
+
+# --- Sessions ---
+def rerun_span():
+    return metrics.registry.snapshot().get(("app", "rerun"), {"seconds": 0.0, "count": 0})
+
+# Scenarios are generators that yield after every rerun, so the scheduler
+# can interleave many sessions
+class Session:
+    # One simulated browser session: an AppTest whose reruns are timed
+    def __init__(self, database_path):
+        from streamlit.testing.v1 import AppTest
+
+        self.at = AppTest.from_file(APP_PATH, default_timeout=60)
+        self.at.secrets["DATA_BACKEND"] = "sqlite"
+        self.at.secrets["SQLITE_PATH"] = database_path
+        self.timings = []
+
+    def run(self):
+        before = rerun_span()
+        self.at.run()
+        if self.at.exception:
+            raise RuntimeError(self.at.exception[0].message)
+        after = rerun_span()
+        if after["count"] == before["count"]:
+            raise RuntimeError("The rerun did not record an app rerun span")
+        self.timings.append(after["seconds"] - before["seconds"])
+        yield
+
+    def button(self, label, sidebar=False):
+        buttons = self.at.sidebar.button if sidebar else self.at.button
+        for button in buttons:
+            if button.label == label:
+                return button
+        raise RuntimeError(f"No {label!r} button on the page")
+
+    def click(self, label, sidebar=False):
+        self.button(label, sidebar).click()
+        yield from self.run()
+
+    def log_in(self, email):
+        self.at.sidebar.text_input[0].set_value(email)
+        self.at.sidebar.text_input[1].set_value(PASSWORD)
+        yield from self.click("Login", sidebar=True)
+        if self.at.session_state["user"] is None:
+            yield from self.run() # The identity is resolved on the rerun after sign-in
+        if self.at.session_state["user"] is None:
+            raise RuntimeError(f"Could not log in as {email}")
+
+def take_test(session, rng, email):
+    yield from session.run()
+    yield from session.click("Take the Test Now!")
+    while True:
+        radio = session.at.radio[0]
+        radio.set_value(rng.choice(radio.options))
+        yield from session.run()
+        if not any(b.label == "Next" for b in session.at.button):
+            break
+        yield from session.click("Next")
+    yield from session.click("Finish Test")
+    if session.at.session_state["final_record"] is None:
+        raise RuntimeError("Finishing the test did not produce a result")
+
+def question_bank(session, rng, email):
+    yield from session.run()
+    yield from session.log_in(email)
+    yield from session.click("Question Bank", sidebar=True)
+    # Votes and comments only render inside an opened question
+    keys = [e.key for e in session.at.expander if (e.key or "").startswith("bank_question_")]
+    if not keys:
+        raise RuntimeError("No questions in the Question Bank")
+    opened = rng.sample(keys, min(QUESTIONS_OPENED, len(keys)))
+    def keep_open():
+        # AppTest doesn't send expander state back like a browser does
+        for key in opened:
+            session.at.session_state[key] = True
+    keep_open()
+    yield from session.run()
+
+    votes = [b for b in session.at.button if b.label.startswith(("👍", "👎"))]
+    comment_buttons = [b for b in session.at.button if b.label == "Post Comment"]
+    if not votes or not comment_buttons:
+        raise RuntimeError(f"Opened questions show {len(votes)} vote and {len(comment_buttons)} comment buttons")
+    open_votes = [b for b in votes if not b.disabled]
+    if open_votes:
+        rng.choice(open_votes).click()
+        keep_open()
+        yield from session.run()
+    comment_buttons = [b for b in session.at.button if b.label == "Post Comment"]
+    box = rng.randrange(len(comment_buttons))
+    session.at.text_area[box].set_value(f"Load test comment from {email}")
+    comment_buttons[box].click()
+    keep_open()
+    yield from session.run()
+    if not session.button("Next page").disabled:
+        yield from session.click("Next page")
+
+def moderator(session, rng, email):
+    yield from session.run()
+    yield from session.log_in(MODERATOR_EMAIL)
+    yield from session.click("Edit Questions", sidebar=True)
+    session.at.text_input(key="edit_search").set_value(f"question {rng.randint(1, 9)}")
+    yield from session.run()
+    session.at.text_area[0].set_value(f"Edited by the load test at {time.time():.3f}")
+    yield from session.click("Update Question")
+
+SCENARIO_FUNCTIONS = {"take_test": take_test, "question_bank": question_bank, "moderator": moderator}
+
+def run_interleaved(database_path, plan, concurrency):
+    # plan: [(scenario, email, seed)]. Returns ({scenario: [timings]}, failures, sessions)
+    pending = deque(plan)
+    active = deque()
+    timings = {name: [] for name in SCENARIOS}
+    failures = []
+    finished = []
+    while pending or active:
+        while pending and len(active) < concurrency:
+            scenario, email, seed = pending.popleft()
+            session = Session(database_path)
+            active.append((scenario, email, session, SCENARIO_FUNCTIONS[scenario](session, random.Random(seed), email)))
+        scenario, email, session, steps = active.popleft()
+        try:
+            next(steps)
+            active.append((scenario, email, session, steps))
+        except StopIteration:
+            timings[scenario].extend(session.timings)
+            finished.append(session)
+        except Exception as e:
+            failures.append(f"{scenario} ({email}): {e}")
+    return timings, failures, finished
+
+# --- Measurement ---
+def percentiles(timings):
+    ordered = sorted(timings)
+    def pick(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "reruns": len(ordered)}
+
+def measure_latency(database_path, emails, sessions, concurrency):
+    plan = [(SCENARIOS[i % len(SCENARIOS)], emails[i], i) for i in range(sessions)]
+    started = time.perf_counter()
+    per_scenario, failures, _ = run_interleaved(database_path, plan, concurrency)
+    elapsed = time.perf_counter() - started
+
+    all_timings = [t for timings in per_scenario.values() for t in timings]
+    results = {f"{name} rerun": percentiles(timings) for name, timings in per_scenario.items() if timings}
+    if all_timings:
+        results["all rerun"] = percentiles(all_timings)
+    results["throughput"] = {"reruns_per_s": len(all_timings) / elapsed, "sessions_per_s": (sessions - len(failures)) / elapsed}
+    return results, failures
+
+def measure_memory(database_path, emails, sessions):
+    # Keeps `sessions` finished test-taking sessions alive and divides the
+    # traced growth by their number
+    run_interleaved(database_path, [("take_test", emails[0], 0)], 1) # Warm the shared caches first
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    _, failures, alive = run_interleaved(database_path, [("take_test", emails[i], i) for i in range(sessions)], sessions)
+    if failures:
+        raise RuntimeError(f"Memory pass failed: {failures[0]}")
+    gc.collect()
+    grown = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del alive
+    return {"bytes_per_session": grown / sessions, "sessions": sessions}
+
+# --- Recording ---
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(RESULTS_PATH)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def load_recorded():
+    if not os.path.exists(RESULTS_PATH):
+        return []
+    with open(RESULTS_PATH, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def compare(run, recorded, tolerance):
+    baseline = next((r for r in reversed(recorded) if r["commit"] != run["commit"] and r["settings"] == run["settings"]), None)
+    if baseline is None:
+        print("No recorded run from another commit with the same settings to compare against.")
+        return []
+    print(f"Comparing against {baseline['commit']} ({baseline['recorded_at']}):")
+    # (section, metric, True if higher is better)
+    checks = [(name, "p95_ms", False) for name in run["results"] if name.endswith("rerun")]
+    checks += [("throughput", "reruns_per_s", True), ("memory", "bytes_per_session", False)]
+    regressions = []
+    for section, metric, higher_is_better in checks:
+        current = run["results"].get(section, {}).get(metric)
+        previous = baseline["results"].get(section, {}).get(metric)
+        if not current or not previous:
+            continue
+        change = current / previous - 1
+        worse = -change if higher_is_better else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        print(f"  {section + ' ' + metric:<36} {change:+7.1%}{flag}")
+        if flag:
+            regressions.append(f"{section} {metric}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the app with concurrent simulated sessions.")
+    parser.add_argument("--sessions", type=int, default=24, help="Simulated sessions, spread round robin over the scenarios")
+    parser.add_argument("--concurrency", type=int, default=8, help="Sessions alive and interleaved at the same time")
+    parser.add_argument("--questions", type=int, default=60, help="Questions in the generated bank")
+    parser.add_argument("--memory-sessions", type=int, default=8, help="Live sessions in the memory pass (0 skips it)")
+    parser.add_argument("--record", action="store_true", help=f"Append results to {os.path.basename(RESULTS_PATH)}")
+    parser.add_argument("--compare", action="store_true", help="Compare with the last run recorded from another commit")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_path = os.path.join(directory, "load_test.db")
+        emails = populate(database_path, args.questions, max(args.sessions, args.memory_sessions, 1))
+        results, failures = measure_latency(database_path, emails, args.sessions, args.concurrency)
+        if args.memory_sessions:
+            results["memory"] = measure_memory(database_path, emails, args.memory_sessions)
+
+    run = {
+        "commit": git_commit(),
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "settings": {"sessions": args.sessions, "concurrency": args.concurrency, "questions": args.questions,
+                     "memory_sessions": args.memory_sessions},
+        "results": results,
+    }
+
+    for name, summary in results.items():
+        if name.endswith("rerun"):
+            print(f"{name:<22} p50 {summary['p50_ms']:8.1f} ms  p95 {summary['p95_ms']:8.1f} ms  "
+                  f"p99 {summary['p99_ms']:8.1f} ms  ({summary['reruns']} reruns)")
+    throughput = results["throughput"]
+    print(f"{'throughput':<22} {throughput['reruns_per_s']:.1f} reruns/s, {throughput['sessions_per_s']:.2f} sessions/s")
+    if "memory" in results:
+        print(f"{'memory':<22} {results['memory']['bytes_per_session'] / 1024:.0f} KiB per live session")
+    for failure in failures:
+        print(f"Session failed: {failure}")
+
+    regressions = compare(run, load_recorded(), args.tolerance) if args.compare else []
+
+    if args.record and not failures:
+        with open(RESULTS_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(run) + "\n")
+
+    if failures or regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# Timing spans and process-wide metrics for app.py.
+#
+# Every backend call goes through InstrumentedRepository, and the app wraps
+# its major render blocks in `span(...)`. Each finished span is
+#
+#   - added to the current rerun's Trace (one per script run, per thread), which
+#     the moderator debug panel shows as a breakdown, and
+#   - aggregated into the process-wide MetricsRegistry: call and error counts,
+#     a latency histogram, rows returned and estimated payload bytes per span
+#     name.
+#
+# The registry renders the Prometheus text exposition format; it can be
+# scraped from a small HTTP exporter (start_http_exporter) or downloaded from
+# the debug panel.
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_PREFIX = "openjung"
+
+
+class MetricsRegistry:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # (kind, name) -> {"count", "errors", "seconds", "rows", "bytes", "buckets"}
+        self._series = {}
+
+    def observe(self, kind, name, seconds, rows=None, payload_bytes=None, error=False):
+        with self._lock:
+            series = self._series.get((kind, name))
+            if series is None:
+                series = self._series[(kind, name)] = {
+                    "count": 0, "errors": 0, "seconds": 0.0, "rows": 0, "bytes": 0,
+                    "buckets": [0] * len(self.buckets),
+                }
+            series["count"] += 1
+            series["errors"] += int(error)
+            series["seconds"] += seconds
+            series["rows"] += rows or 0
+            series["bytes"] += payload_bytes or 0
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series["buckets"][i] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {key: {**series, "buckets": list(series["buckets"])} for key, series in self._series.items()}
+
+    def render_prometheus(self):
+        series = sorted(self.snapshot().items())
+        lines = [
+            f"# HELP {METRIC_PREFIX}_span_seconds Time spent in instrumented backend calls and render blocks.",
+            f"# TYPE {METRIC_PREFIX}_span_seconds histogram",
+        ]
+        for (kind, name), values in series:
+            labels = f'kind="{escape_label(kind)}",span="{escape_label(name)}"'
+            for bound, count in zip(self.buckets, values["buckets"]):
+                lines.append(f'{METRIC_PREFIX}_span_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{METRIC_PREFIX}_span_seconds_bucket{{{labels},le="+Inf"}} {values["count"]}')
+            lines.append(f"{METRIC_PREFIX}_span_seconds_sum{{{labels}}} {values['seconds']:.6f}")
+            lines.append(f"{METRIC_PREFIX}_span_seconds_count{{{labels}}} {values['count']}")
+        for metric, field, help_text in [
+            ("span_errors_total", "errors", "Instrumented spans that raised."),
+            ("span_rows_total", "rows", "Rows returned by backend calls."),
+            ("span_payload_bytes_total", "bytes", "Estimated JSON size of backend call results."),
+        ]:
+            lines.append(f"# HELP {METRIC_PREFIX}_{metric} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{metric} counter")
+            for (kind, name), values in series:
+                lines.append(f'{METRIC_PREFIX}_{metric}{{kind="{escape_label(kind)}",span="{escape_label(name)}"}} {values[field]}')
+        return "\n".join(lines) + "\n"
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# The process-wide registry; imported modules survive Streamlit reruns
+registry = MetricsRegistry()
+
+
+# --- Per-rerun traces ---
+class Trace:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+
+    def add(self, kind, name, seconds, rows=None, payload_bytes=None, error=None):
+        self.spans.append({"kind": kind, "name": name, "ms": seconds * 1000, "rows": rows,
+                           "bytes": payload_bytes, "error": error})
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+_local = threading.local()
+
+def start_trace():
+    # Called at the top of every script run; spans from threads without a
+    # trace (cache warm-up, background writers) only reach the registry
+    _local.trace = Trace()
+    return _local.trace
+
+def current_trace():
+    return getattr(_local, "trace", None)
+
+def record(kind, name, seconds, rows=None, payload_bytes=None, error=None):
+    registry.observe(kind, name, seconds, rows, payload_bytes, error is not None)
+    trace = current_trace()
+    if trace is not None:
+        trace.add(kind, name, seconds, rows, payload_bytes, error)
+
+@contextmanager
+def span(kind, name):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record(kind, name, time.perf_counter() - started, error=f"{type(e).__name__}: {e}")
+        raise
+    record(kind, name, time.perf_counter() - started)
+
+
+# --- Backend instrumentation ---
+# Rows serialized to estimate a result's payload size; a whole page is
+# never encoded just to be measured
+PAYLOAD_SAMPLE_ROWS = 4
+
+def result_size(result):
+    # (rows, estimated JSON bytes) of a backend call's result: the encoded
+    # size of a few evenly spaced rows, scaled to the row count
+    if result is None:
+        return None, None
+    if isinstance(result, tuple):
+        # (rows, total) pages
+        result = result[0]
+    if not isinstance(result, (list, dict)):
+        return None, None
+    items = list(result.values()) if isinstance(result, dict) else result
+    if not items:
+        return 0, 2
+    sample = items[::max(1, len(items) // PAYLOAD_SAMPLE_ROWS)][:PAYLOAD_SAMPLE_ROWS]
+    try:
+        sample_bytes = sum(len(json.dumps(item, default=str)) for item in sample)
+    except (TypeError, ValueError):
+        return len(items), None
+    return len(items), round(sample_bytes * len(items) / len(sample))
+
+class InstrumentedRepository:
+    # Wraps a Repository so every method call becomes a "backend" span
+    def __init__(self, repository):
+        self._repository = repository
+
+    def __getattr__(self, name):
+        attribute = getattr(self._repository, name)
+        if name.startswith("_") or not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = attribute(*args, **kwargs)
+            except Exception as e:
+                record("backend", name, time.perf_counter() - started, error=f"{type(e).__name__}: {e}")
+                raise
+            elapsed = time.perf_counter() - started
+            rows, payload_bytes = result_size(result)
+            record("backend", name, elapsed, rows, payload_bytes)
+            return result
+        return call
+
+
+# --- Exporter ---
+def start_http_exporter(port, host="0.0.0.0"):
+    # Serves the registry at http://host:port/metrics from a daemon thread
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    return server
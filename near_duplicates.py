@@ -0,0 +1,231 @@
+# Near-duplicate detection for the question bank.
+#
+# Usage:
+#   python near_duplicates.py [--threshold 0.6] [--sqlite app.db]
+#
+# Every question is reduced to the set of character 5-grams of its question
+# and answer text (lowercased, punctuation and extra whitespace dropped), and
+# that set to a MinHash signature of NUM_HASHES values. The share of equal
+# signature positions estimates the Jaccard similarity of two questions'
+# shingle sets, so rewordings that keep most of the wording score high.
+#
+# Signatures are split into LSH_BANDS bands of LSH_ROWS values, and each band
+# is hashed into a bucket. A lookup only compares against questions sharing at
+# least one bucket, instead of every row in the bank: with 32 bands of 4,
+# pairs at 0.5 similarity collide with ~87% probability, at 0.7 with >99.9%,
+# and at 0.2 with ~5%. Adding, replacing and removing a question touches
+# only its own buckets, so the app keeps one index per process and applies
+# inserts, updates and deletes to it as they happen.
+#
+# SyncedDuplicateIndex keeps such an index current with writes made by other
+# processes: at most every sync_interval seconds it reads the rows changed and
+# the deletion tombstones recorded since its last sync (the same change feed
+# as the app's Edit Questions snapshot) and applies them. Its source must be
+# able to read every question and the question_deletions tombstones; on
+# Supabase that is the service role, or any role the tombstone policy allows.
+#
+# The command line lists likely duplicate pairs across the whole bank.
+
+import argparse
+import re
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from question_io import iter_questions, open_repository
+
+NUM_HASHES = 128
+LSH_BANDS = 32
+LSH_ROWS = NUM_HASHES // LSH_BANDS
+SHINGLE_SIZE = 5
+# Estimated similarity at which a question is reported as a likely duplicate
+DUPLICATE_THRESHOLD = 0.5
+MAX_MATCHES = 5
+# Kept per indexed question so matches can be shown without another query
+MATCH_COLUMNS = ["id", "question", "status", "a_answer", "b_answer"]
+
+# Syncs re-read this far behind their watermark, so rows committed by a
+# transaction that started before the last sync are not missed
+SYNC_OVERLAP = timedelta(seconds=5)
+# More changes than this since the last sync and the index is rebuilt
+SYNC_MAX_CHANGES = 500
+EPOCH = "1970-01-01T00:00:00+00:00"
+
+# Universal hashing h(x) = (a * x + b) mod p; with p < 2^31 the products fit
+# in uint64. The seed is fixed so signatures from different runs agree.
+_PRIME = np.uint64((1 << 31) - 1)
+_rng = np.random.default_rng(20261017)
+_A = _rng.integers(1, int(_PRIME), size=NUM_HASHES, dtype=np.uint64)
+_B = _rng.integers(0, int(_PRIME), size=NUM_HASHES, dtype=np.uint64)
+
+
+# --- Signatures ---
+def question_text(row):
+    return " ".join(str(row.get(column) or "") for column in ["question", "a_answer", "b_answer"])
+
+def normalize(text):
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+def shingles(text):
+    text = normalize(text)
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+def minhash(text):
+    # Signature of the text, or None when it has nothing to compare
+    grams = shingles(text)
+    if not grams:
+        return None
+    values = np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams)) % _PRIME
+    # (NUM_HASHES, n_shingles) hashes, minimum per row
+    return ((_A[:, None] * values[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+def band_keys(signature):
+    return [(band, signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes()) for band in range(LSH_BANDS)]
+
+def similarity(signature, other):
+    return float(np.mean(signature == other))
+
+
+# --- Index ---
+class DuplicateIndex:
+    def __init__(self):
+        self.signatures = {}
+        self.rows = {}
+        self.buckets = {}
+        # Shared between sessions; lookups and updates come from different threads
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def add(self, row):
+        # Adds a question row, or replaces it if it is already indexed
+        question_id = row["id"]
+        signature = minhash(question_text(row))
+        with self.lock:
+            self._remove(question_id)
+            if signature is None:
+                return
+            self.signatures[question_id] = signature
+            self.rows[question_id] = {column: row.get(column) for column in MATCH_COLUMNS}
+            for key in band_keys(signature):
+                self.buckets.setdefault(key, set()).add(question_id)
+
+    def remove(self, question_id):
+        with self.lock:
+            self._remove(question_id)
+
+    def _remove(self, question_id):
+        signature = self.signatures.pop(question_id, None)
+        if signature is None:
+            return
+        del self.rows[question_id]
+        for key in band_keys(signature):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.discard(question_id)
+                if not bucket:
+                    del self.buckets[key]
+
+    def matches(self, text, threshold=DUPLICATE_THRESHOLD, limit=MAX_MATCHES, exclude=None):
+        # [(question row, estimated similarity)] most similar first
+        signature = minhash(text)
+        if signature is None:
+            return []
+        with self.lock:
+            candidates = set()
+            for key in band_keys(signature):
+                candidates |= self.buckets.get(key, set())
+            candidates.discard(exclude)
+            scored = [(self.rows[question_id], similarity(signature, self.signatures[question_id]))
+                      for question_id in candidates]
+        scored = [match for match in scored if match[1] >= threshold]
+        scored.sort(key=lambda match: (-match[1], match[0]["id"]))
+        return scored[:limit]
+
+def build_index(rows):
+    index = DuplicateIndex()
+    for row in rows:
+        index.add(row)
+    return index
+
+def later(timestamp, other):
+    return max(timestamp, other, key=datetime.fromisoformat)
+
+def overlap_watermark(watermark):
+    return (datetime.fromisoformat(watermark) - SYNC_OVERLAP).isoformat()
+
+class SyncedDuplicateIndex:
+    def __init__(self, source, sync_interval=30.0):
+        self.source = source
+        self.sync_interval = sync_interval
+        self.index = None
+        self.watermark = None
+        self.deleted_watermark = None
+        self.synced_at = 0.0
+        # One caller syncs at a time; the others wait and reuse its result
+        self.lock = threading.Lock()
+
+    def current(self):
+        # The index, built on first use and synced when it is due
+        with self.lock:
+            if self.index is None:
+                self.rebuild()
+            elif time.monotonic() - self.synced_at >= self.sync_interval:
+                self.sync()
+            return self.index
+
+    def rebuild(self):
+        # Watermarks first: rows written during the build are re-applied by the next sync
+        self.watermark = self.source.latest_question_change() or EPOCH
+        self.deleted_watermark = self.source.latest_question_deletion() or EPOCH
+        self.index = build_index(iter_questions(self.source))
+        self.synced_at = time.monotonic()
+
+    def sync(self):
+        changed = self.source.questions_changed_since(overlap_watermark(self.watermark), SYNC_MAX_CHANGES + 1)
+        deleted = self.source.question_deletions_since(overlap_watermark(self.deleted_watermark), SYNC_MAX_CHANGES + 1)
+        if len(changed) > SYNC_MAX_CHANGES or len(deleted) > SYNC_MAX_CHANGES:
+            self.rebuild()
+            return
+        for row in changed:
+            self.index.add(row)
+            self.watermark = later(self.watermark, row['updated_at'])
+        for tombstone in deleted:
+            self.index.remove(tombstone['question_id'])
+            self.deleted_watermark = later(self.deleted_watermark, tombstone['deleted_at'])
+        self.synced_at = time.monotonic()
+
+
+# --- Command line ---
+def duplicate_pairs(repository, threshold=DUPLICATE_THRESHOLD):
+    # (question, other question, similarity) for every likely duplicate pair,
+    # each pair once, found with one index lookup per question
+    index = build_index(iter_questions(repository))
+    pairs = []
+    for row in list(index.rows.values()):
+        for other, score in index.matches(question_text(row), threshold, limit=None, exclude=row["id"]):
+            if other["id"] > row["id"]:
+                pairs.append((row, other, score))
+    pairs.sort(key=lambda pair: -pair[2])
+    return pairs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List likely duplicate questions in the bank.")
+    parser.add_argument("--threshold", type=float, default=DUPLICATE_THRESHOLD,
+                        help="Minimum estimated similarity, 0 to 1")
+    parser.add_argument("--sqlite", help="Use this SQLite database instead of Supabase")
+    args = parser.parse_args(argv)
+
+    pairs = duplicate_pairs(open_repository(args), args.threshold)
+    for row, other, score in pairs:
+        print(f"{score:.2f}  #{row['id']} ({row['status']}) {row['question']!r}  ~  #{other['id']} ({other['status']}) {other['question']!r}")
+    print(f"{len(pairs)} likely duplicate pairs.")
+
+if __name__ == "__main__":
+    main()
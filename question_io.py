@@ -0,0 +1,229 @@
+# Bulk import and export of the question bank.
+#
+# Usage:
+#   python question_io.py export --output questions.jsonl [--sqlite app.db]
+#   python question_io.py import --input questions.csv [--dry-run] [--sqlite app.db]
+#
+# Options go after the command name.
+#
+# Imports read CSV (with a header row) or JSONL. Every row is validated first:
+# `question`, `a_answer` and `b_answer` are required, `a_function`/`b_function`
+# must be one of the eight functions, and `question_dimension`, `question_type`
+# and `status` must be allowed values. Nothing is written unless the whole
+# file is valid. Rows with an `id` are upserted (they replace that question's
+# editable fields); rows without one are inserted as new questions. Writes go
+# out in batches of --batch-size rows, one round trip each. Vote counts and
+# timestamps in the file are ignored, so an export can be re-imported as is.
+# After restoring explicit ids into an empty Postgres table, reset the
+# questions id sequence so new submissions don't collide.
+#
+# Exports page through the table by id and write each page as it arrives, so
+# memory stays flat however big the bank is.
+#
+# The command line talks to Supabase using SUPABASE_URL and
+# SUPABASE_SERVICE_ROLE_KEY from the environment, or to a local database with
+# --sqlite. The app's moderator page uses the same functions.
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+
+QUESTION_FUNCTIONS = ["Fe", "Fi", "Ne", "Ni", "Se", "Si", "Te", "Ti"]
+QUESTION_DIMENSIONS = ["between_functions", "within_functions"]
+QUESTION_TYPES = ["scenario_based", "self_reported", "interests"]
+QUESTION_STATUSES = ["draft", "pending", "approved", "rejected", "retired"]
+
+# Editable columns written by an import, with the default for optional ones
+REQUIRED_COLUMNS = ["question", "a_answer", "b_answer", "a_function", "b_function", "question_dimension", "question_type"]
+OPTIONAL_COLUMNS = {"status": "draft", "additional_info": ""}
+
+EXPORT_COLUMNS = [
+    "id", "question", "status", "a_function", "b_function", "a_answer", "b_answer",
+    "question_dimension", "question_type", "additional_info", "upvotes", "downvotes", "created_at", "updated_at",
+]
+
+DEFAULT_BATCH_SIZE = 200
+EXPORT_PAGE_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+# --- Reading and validation ---
+def read_rows(file, file_format):
+    # Yields (line number, row dict) from a binary or text file object
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="") if isinstance(file.read(0), bytes) else file
+    if file_format == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(text, start=1):
+            if line.strip():
+                try:
+                    yield line_number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_number, ValueError(f"invalid JSON: {e.msg}")
+
+def normalize_function(value):
+    # "fe", " FE " -> "Fe"
+    value = value.strip()
+    return value[:1].upper() + value[1:].lower()
+
+def validate_row(row):
+    # Returns (clean row, [error messages])
+    if isinstance(row, ValueError):
+        return None, [str(row)]
+    if not isinstance(row, dict):
+        return None, ["expected an object"]
+    def text(column):
+        value = row.get(column)
+        return "" if value is None else str(value).strip()
+
+    errors = []
+    clean = {}
+    if text("id"):
+        try:
+            clean["id"] = int(text("id"))
+        except ValueError:
+            errors.append(f"id {text('id')!r} is not a number")
+    for column in ["question", "a_answer", "b_answer"]:
+        clean[column] = text(column)
+        if not clean[column]:
+            errors.append(f"{column} is required")
+    for column in ["a_function", "b_function"]:
+        clean[column] = normalize_function(text(column))
+        if clean[column] not in QUESTION_FUNCTIONS:
+            errors.append(f"{column} {text(column)!r} is not one of {', '.join(QUESTION_FUNCTIONS)}")
+    for column, allowed in [("question_dimension", QUESTION_DIMENSIONS), ("question_type", QUESTION_TYPES)]:
+        clean[column] = text(column)
+        if clean[column] not in allowed:
+            errors.append(f"{column} {text(column)!r} is not one of {', '.join(allowed)}")
+    for column, default in OPTIONAL_COLUMNS.items():
+        clean[column] = text(column) or default
+    if clean["status"] not in QUESTION_STATUSES:
+        errors.append(f"status {clean['status']!r} is not one of {', '.join(QUESTION_STATUSES)}")
+    return clean, errors
+
+def parse_import(file, file_format):
+    # Returns (valid rows, [(line number, message)]). Collects every row's
+    # errors so a file can be fixed in one go.
+    rows, errors = [], []
+    seen_ids = {}
+    for line_number, row in read_rows(file, file_format):
+        clean, row_errors = validate_row(row)
+        if clean and "id" in clean:
+            if clean["id"] in seen_ids:
+                row_errors.append(f"id {clean['id']} already appears on line {seen_ids[clean['id']]}")
+            seen_ids.setdefault(clean["id"], line_number)
+        errors.extend((line_number, message) for message in row_errors)
+        if not row_errors:
+            rows.append(clean)
+    return rows, errors
+
+def file_format_for(name):
+    return "csv" if name.lower().endswith(".csv") else "jsonl"
+
+# --- Writing ---
+def batched(rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+
+def import_questions(repository, rows, batch_size=DEFAULT_BATCH_SIZE, submitted_by=None, on_progress=None):
+    # Upserts rows with ids and inserts the rest, one round trip per batch.
+    # on_progress(written, total) is called after every batch.
+    updates = [row for row in rows if "id" in row]
+    inserts = [{**row, "submitted_by": submitted_by} if submitted_by else row for row in rows if "id" not in row]
+    written = 0
+    for rows_batch, write in [(updates, repository.upsert_questions), (inserts, repository.insert_questions)]:
+        for batch in batched(rows_batch, batch_size):
+            write(batch)
+            written += len(batch)
+            if on_progress:
+                on_progress(written, len(rows))
+    return written
+
+# --- Export ---
+def iter_questions(repository, page_size=EXPORT_PAGE_SIZE):
+    # Every question in id order, fetched one keyset page at a time. A short
+    # page doesn't mean the end: the server may cap the page size.
+    after_id = None
+    while True:
+        page = repository.questions_after(after_id, page_size)
+        if not page:
+            return
+        yield from page
+        after_id = page[-1]["id"]
+
+def export_questions(repository, out, file_format, page_size=EXPORT_PAGE_SIZE):
+    # Writes the bank to a text file object; returns the number of rows
+    count = 0
+    if file_format == "csv":
+        writer = csv.DictWriter(out, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+    for row in iter_questions(repository, page_size):
+        if file_format == "csv":
+            writer.writerow(row)
+        else:
+            out.write(json.dumps({column: row.get(column) for column in EXPORT_COLUMNS}, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+# --- Command line ---
+def open_repository(args):
+    if args.sqlite:
+        from sqlite_repository import SQLiteDatabase, SQLiteRepository
+        return SQLiteRepository(SQLiteDatabase(args.sqlite), service=True)
+    from supabase import create_client
+    from repository import SupabaseRepository
+    url, key = os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+    if not url or not key:
+        sys.exit("Set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY, or use --sqlite.")
+    return SupabaseRepository(create_client(url, key))
+
+def run_import(args):
+    with open(args.input, "rb") as f:
+        rows, errors = parse_import(f, file_format_for(args.input))
+    for line_number, message in errors[:MAX_REPORTED_ERRORS]:
+        print(f"{args.input}:{line_number}: {message}", file=sys.stderr)
+    if errors:
+        more = len(errors) - MAX_REPORTED_ERRORS
+        sys.exit(f"{len(errors)} errors{f' ({more} not shown)' if more > 0 else ''}; nothing was imported.")
+    if args.dry_run:
+        print(f"{len(rows)} valid questions; nothing written (--dry-run).")
+        return
+    written = import_questions(open_repository(args), rows, args.batch_size,
+                               on_progress=lambda done, total: print(f"{done}/{total} written", file=sys.stderr))
+    print(f"Imported {written} questions.")
+
+def run_export(args):
+    repository = open_repository(args)
+    with open(args.output, "w", newline="", encoding="utf-8") as out:
+        count = export_questions(repository, out, file_format_for(args.output), args.page_size)
+    print(f"Exported {count} questions to {args.output}.")
+
+def main(argv=None):
+    # Options every command takes, given after the command name
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--sqlite", help="Use this SQLite database instead of Supabase")
+
+    parser = argparse.ArgumentParser(description="Bulk import or export the question bank.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", parents=[common], help="Validate and import a .csv or .jsonl file")
+    import_parser.add_argument("--input", required=True)
+    import_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    import_parser.add_argument("--dry-run", action="store_true", help="Only validate")
+
+    export_parser = commands.add_parser("export", parents=[common], help="Write the whole bank to a .csv or .jsonl file")
+    export_parser.add_argument("--output", required=True)
+    export_parser.add_argument("--page-size", type=int, default=EXPORT_PAGE_SIZE)
+
+    args = parser.parse_args(argv)
+    if args.command == "import":
+        run_import(args)
+    else:
+        run_export(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+# Data access for app.py.
+#
+# Page code talks to a Repository instead of building Supabase queries inline.
+# SupabaseRepository is the production backend; SQLiteRepository (in
+# sqlite_repository.py) implements the same methods with the same semantics on
+# a local SQLite database, so the app can be load-tested and profiled without
+# a Supabase project.
+#
+# Rows are plain dicts keyed by column name, as PostgREST returns them. Auth
+# methods return objects with `.user` and `.session` attributes like
+# supabase-py's auth responses. Backend errors are raised as exceptions.
+
+from abc import ABC, abstractmethod
+
+# Columns needed to render and order the Question Bank expander headers,
+# with the question's comment count
+QUESTION_BANK_HEADER_COLUMNS = "id, question, status, upvotes, downvotes, created_at, comments(count)"
+
+# Columns shown inside a Question Bank expander, fetched when it is opened
+QUESTION_BANK_DETAIL_COLUMNS = "id, question_dimension, a_answer, a_function, b_answer, b_function, additional_info"
+COMMENT_COLUMNS = "id, question_id, user_id, comment_text, created_at"
+
+# Columns of the moderator "Edit Questions" table
+EDIT_QUESTION_COLUMNS = "id, question, status, upvotes, downvotes, question_dimension, a_answer, a_function, b_answer, b_function, additional_info, updated_at"
+
+# Text covered by search_questions, most important first
+QUESTION_SEARCH_COLUMNS = ["question", "a_answer", "b_answer", "additional_info"]
+
+VOTE_TYPES = ("up", "down")
+
+
+class Repository(ABC):
+    # --- Questions ---
+    @abstractmethod
+    def approved_questions(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def question_bank_page(self, statuses, order_by, descending, limit, cursor=None):
+        # Header rows in (order_by, id) order strictly after the (value, id)
+        # cursor; each row has a `comment_count`
+        raise NotImplementedError
+
+    @abstractmethod
+    def question_details(self, question_ids):
+        # {id: detail row}
+        raise NotImplementedError
+
+    @abstractmethod
+    def edit_questions_page(self, statuses, limit, before_id=None):
+        # (rows in id-descending order below before_id, total matching rows);
+        # the total is only counted for the first page and is None otherwise
+        raise NotImplementedError
+
+    @abstractmethod
+    def search_questions(self, query, statuses, limit, offset=0):
+        # Full question rows matching the search text, best match first,
+        # answered from a maintained text index; each row has a `comment_count`
+        raise NotImplementedError
+
+    @abstractmethod
+    def latest_question_change(self):
+        # Newest questions.updated_at, or None for an empty table
+        raise NotImplementedError
+
+    @abstractmethod
+    def latest_question_deletion(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def questions_changed_since(self, timestamp, limit):
+        raise NotImplementedError
+
+    @abstractmethod
+    def question_deletions_since(self, timestamp, limit):
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert_question(self, row):
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_question(self, question_id, fields):
+        # The updated row, or None if it is not visible to this user
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_question(self, question_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert_questions(self, rows):
+        # One batched insert; all rows have the same columns
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert_questions(self, rows):
+        # One batched insert-or-update keyed on id
+        raise NotImplementedError
+
+    @abstractmethod
+    def questions_after(self, after_id, limit):
+        # Full rows in id order, strictly after after_id (None for the start)
+        raise NotImplementedError
+
+    # --- Votes ---
+    @abstractmethod
+    def user_votes(self, user_id, question_ids):
+        # {question_id: vote_type}
+        raise NotImplementedError
+
+    @abstractmethod
+    def cast_vote(self, question_id, vote_type):
+        # Records the signed-in user's vote and bumps the counter in one step.
+        # Returns {'upvotes', 'downvotes', 'accepted', 'existing_vote_type'}.
+        raise NotImplementedError
+
+    @abstractmethod
+    def increment_upvotes(self, question_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def increment_downvotes(self, question_id):
+        raise NotImplementedError
+
+    # --- Comments ---
+    @abstractmethod
+    def question_comments(self, question_id, limit, cursor=None):
+        # Newest first, strictly after the (created_at, id) cursor
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_comment(self, question_id, user_id, comment_text):
+        raise NotImplementedError
+
+    # --- Profiles ---
+    @abstractmethod
+    def user_role(self, user_id):
+        # The user's role, or None if they have no profile yet
+        raise NotImplementedError
+
+    @abstractmethod
+    def user_roles(self, user_ids):
+        # {user_id: role} for the users that have a profile
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_profile(self, user_id, role="user"):
+        raise NotImplementedError
+
+    # --- Results ---
+    @abstractmethod
+    def insert_results(self, rows):
+        raise NotImplementedError
+
+    @abstractmethod
+    def result_type_counts(self):
+        # [{'category', 'value', 'count'}], kept up to date by a trigger on results
+        raise NotImplementedError
+
+    @abstractmethod
+    def results_after(self, after_id, limit):
+        # {'id', 'created_at', 'answers', 'scores', 'attitude_scores'} rows in
+        # id order, strictly after after_id (None for the start); needs the
+        # service role on Supabase
+        raise NotImplementedError
+
+    @abstractmethod
+    def score_sketches(self):
+        # [{'metric', 'counts', 'total', 'last_result_id', 'built_at'}]
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_score_sketches(self, rows):
+        # Upserts sketch rows keyed on metric
+        raise NotImplementedError
+
+    @abstractmethod
+    def question_stats(self, question_ids=None):
+        # item_analysis.py rows for these questions (all of them for None)
+        raise NotImplementedError
+
+    @abstractmethod
+    def question_stats_after(self, after_question_id, limit):
+        # question_stats rows in question_id order, strictly after
+        # after_question_id (None for the start)
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_question_stats(self, rows):
+        # Upserts question_stats rows keyed on question_id
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_question_stats(self, question_ids):
+        raise NotImplementedError
+
+    # --- Test sessions ---
+    @abstractmethod
+    def save_test_sessions(self, rows):
+        # Upserts in-progress test checkpoints keyed on their session token
+        # (`id`); a finished one is deleted instead. Raises for oversized rows.
+        raise NotImplementedError
+
+    @abstractmethod
+    def test_session(self, session_id):
+        # The unexpired checkpoint row for this session token, or None
+        raise NotImplementedError
+
+    # --- Auth ---
+    @abstractmethod
+    def sign_up(self, email, password):
+        raise NotImplementedError
+
+    @abstractmethod
+    def sign_in(self, email, password):
+        raise NotImplementedError
+
+    @abstractmethod
+    def sign_out(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_session(self, access_token, refresh_token):
+        # Validates the session with the backend, refreshing an expired token
+        raise NotImplementedError
+
+    @abstractmethod
+    def use_token(self, access_token):
+        # Act as the token's user for data calls, without any network call
+        raise NotImplementedError
+
+
+# --- Supabase ---
+def keyset_filter(order_by, descending, cursor):
+    # Rows strictly after the cursor in (order_by, id) order, as a PostgREST `or` filter
+    value, last_id = cursor
+    op = "lt" if descending else "gt"
+    if isinstance(value, str):
+        value = f'"{value}"' # Timestamps contain reserved characters
+    return f"{order_by}.{op}.{value},and({order_by}.eq.{value},id.{op}.{last_id})"
+
+def with_comment_count(row):
+    # PostgREST returns an embedded count as comments: [{'count': n}]
+    return {**row, 'comment_count': (row.pop('comments', None) or [{'count': 0}])[0]['count']}
+
+
+class SupabaseRepository(Repository):
+    def __init__(self, client):
+        self.client = client
+
+    # --- Questions ---
+    def approved_questions(self):
+        return self.client.table("questions").select("*").eq("status", "approved").execute().data
+
+    def question_bank_page(self, statuses, order_by, descending, limit, cursor=None):
+        query = self.client.table("questions").select(QUESTION_BANK_HEADER_COLUMNS).in_("status", statuses)
+        if cursor is not None:
+            query = query.or_(keyset_filter(order_by, descending, cursor))
+        # id breaks ties so the cursor is unique
+        query = query.order(order_by, desc=descending).order("id", desc=descending)
+        return [with_comment_count(row) for row in query.limit(limit).execute().data]
+
+    def question_details(self, question_ids):
+        response = self.client.table("questions").select(QUESTION_BANK_DETAIL_COLUMNS).in_("id", question_ids).execute()
+        return {q['id']: q for q in response.data}
+
+    def edit_questions_page(self, statuses, limit, before_id=None):
+        # An exact count scans every matching row, so only the first page pays for it
+        query = self.client.table("questions").select(EDIT_QUESTION_COLUMNS, count="exact" if before_id is None else None)
+        if statuses:
+            query = query.in_("status", statuses)
+        if before_id is not None:
+            query = query.lt("id", before_id)
+        response = query.order("id", desc=True).limit(limit).execute()
+        return response.data, response.count
+
+    def search_questions(self, query, statuses, limit, offset=0):
+        # Ranked in the database: full-text match plus trigram word similarity
+        rows = self.client.rpc('search_questions', {
+            'query': query, 'statuses': list(statuses) or None, 'max_results': limit, 'skip': offset,
+        }).select("*, comments(count)").execute().data
+        return [with_comment_count(row) for row in rows]
+
+    def _latest(self, table, column):
+        rows = self.client.table(table).select(column).order(column, desc=True).limit(1).execute().data
+        return rows[0][column] if rows else None
+
+    def latest_question_change(self):
+        return self._latest("questions", "updated_at")
+
+    def latest_question_deletion(self):
+        return self._latest("question_deletions", "deleted_at")
+
+    def questions_changed_since(self, timestamp, limit):
+        return (self.client.table("questions").select(EDIT_QUESTION_COLUMNS)
+                .gt("updated_at", timestamp).order("updated_at").limit(limit).execute().data)
+
+    def question_deletions_since(self, timestamp, limit):
+        return (self.client.table("question_deletions").select("question_id, deleted_at")
+                .gt("deleted_at", timestamp).order("deleted_at").limit(limit).execute().data)
+
+    def insert_question(self, row):
+        return self.client.table("questions").insert(row).execute().data[0]
+
+    def update_question(self, question_id, fields):
+        rows = self.client.table("questions").update(fields).eq("id", question_id).execute().data
+        return rows[0] if rows else None
+
+    def delete_question(self, question_id):
+        self.client.table("questions").delete().eq("id", question_id).execute()
+
+    def insert_questions(self, rows):
+        self.client.table("questions").insert(rows).execute()
+
+    def upsert_questions(self, rows):
+        self.client.table("questions").upsert(rows, on_conflict="id").execute()
+
+    def questions_after(self, after_id, limit):
+        query = self.client.table("questions").select("*")
+        if after_id is not None:
+            query = query.gt("id", after_id)
+        return query.order("id").limit(limit).execute().data
+
+    # --- Votes ---
+    def user_votes(self, user_id, question_ids):
+        response = (self.client.table("votes").select("question_id, vote_type")
+                    .eq("user_id", user_id).in_("question_id", question_ids).execute())
+        return {v['question_id']: v['vote_type'] for v in response.data}
+
+    def cast_vote(self, question_id, vote_type):
+        data = self.client.rpc('cast_vote', {'question_id_to_vote': question_id, 'vote_type_to_cast': vote_type}).execute().data
+        return data[0] if isinstance(data, list) else data
+
+    def increment_upvotes(self, question_id):
+        self.client.rpc('increment_upvotes', {'question_id_to_update': question_id}).execute()
+
+    def increment_downvotes(self, question_id):
+        self.client.rpc('increment_downvotes', {'question_id_to_update': question_id}).execute()
+
+    # --- Comments ---
+    def question_comments(self, question_id, limit, cursor=None):
+        query = self.client.table("comments").select(COMMENT_COLUMNS).eq("question_id", question_id)
+        if cursor is not None:
+            query = query.or_(keyset_filter("created_at", True, cursor))
+        return query.order("created_at", desc=True).order("id", desc=True).limit(limit).execute().data
+
+    def add_comment(self, question_id, user_id, comment_text):
+        self.client.table("comments").insert({
+            "question_id": question_id,
+            "user_id": user_id,
+            "comment_text": comment_text
+        }).execute()
+
+    # --- Profiles ---
+    def user_role(self, user_id):
+        rows = self.client.table("profiles").select("role").eq("id", user_id).execute().data
+        return rows[0]['role'] if rows else None
+
+    def user_roles(self, user_ids):
+        rows = self.client.table("profiles").select("id, role").in_("id", list(user_ids)).execute().data
+        return {row['id']: row['role'] for row in rows}
+
+    def create_profile(self, user_id, role="user"):
+        self.client.table("profiles").insert({"id": user_id, "role": role}).execute()
+
+    # --- Results ---
+    def insert_results(self, rows):
+        self.client.table("results").insert(rows).execute()
+
+    def result_type_counts(self):
+        return self.client.table("result_type_counts").select("category, value, count").execute().data
+
+    def results_after(self, after_id, limit):
+        query = self.client.table("results").select("id, created_at, answers, scores, attitude_scores")
+        if after_id is not None:
+            query = query.gt("id", after_id)
+        return query.order("id").limit(limit).execute().data
+
+    def score_sketches(self):
+        return self.client.table("score_sketches").select("*").execute().data
+
+    def save_score_sketches(self, rows):
+        self.client.table("score_sketches").upsert(rows, on_conflict="metric").execute()
+
+    def question_stats(self, question_ids=None):
+        query = self.client.table("question_stats").select("*")
+        if question_ids is not None:
+            query = query.in_("question_id", question_ids)
+        return query.execute().data
+
+    def question_stats_after(self, after_question_id, limit):
+        query = self.client.table("question_stats").select("*")
+        if after_question_id is not None:
+            query = query.gt("question_id", after_question_id)
+        return query.order("question_id").limit(limit).execute().data
+
+    def save_question_stats(self, rows):
+        self.client.table("question_stats").upsert(rows, on_conflict="question_id").execute()
+
+    def delete_question_stats(self, question_ids):
+        self.client.table("question_stats").delete().in_("question_id", list(question_ids)).execute()
+
+    # --- Test sessions ---
+    def save_test_sessions(self, rows):
+        self.client.rpc('save_test_sessions', {'sessions': rows}).execute()
+
+    def test_session(self, session_id):
+        rows = self.client.rpc('load_test_session', {'session_id': session_id}).execute().data
+        return rows[0] if rows else None
+
+    # --- Auth ---
+    def sign_up(self, email, password):
+        return self.client.auth.sign_up({"email": email, "password": password})
+
+    def sign_in(self, email, password):
+        return self.client.auth.sign_in_with_password({"email": email, "password": password})
+
+    def sign_out(self):
+        self.client.auth.sign_out()
+
+    def set_session(self, access_token, refresh_token):
+        return self.client.auth.set_session(access_token, refresh_token)
+
+    def use_token(self, access_token):
+        self.client.postgrest.auth(access_token)
@@ -0,0 +1,220 @@
+# Offline re-scoring of exported test responses.
+#
+# Usage:
+#   python rescore.py --questions questions.json --input responses.jsonl --output rescored.jsonl
+#
+# Each response record needs an `id` and an `answers` object mapping question
+# id to "A", "B", "Both" or "Neither" (in CSV exports `answers` is a JSON
+# string column). Records are streamed, scored in batches across a process
+# pool and written out in input order. A checkpoint file is updated after
+# every written batch, so an interrupted run picks up where it stopped when
+# started again with --resume.
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+from scoring import (
+    ATTITUDE_KEYS, SCORE_KEYS, calculate_cognitive_profile, calculate_mbti_analysis,
+    compile_questions, encode_answers_by_id, score_answer_matrix,
+)
+
+# --- Input ---
+def load_questions(path):
+    # A JSON array, JSONL or CSV export of the questions table
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.csv'):
+            return list(csv.DictReader(f))
+        if path.endswith('.jsonl'):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+def read_responses(path, skip=0):
+    # Yields response records one at a time, never holding the whole file
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.csv'):
+            records = csv.DictReader(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+        for record in islice(records, skip, None):
+            answers = record.get('answers') or {}
+            if isinstance(answers, str):
+                answers = json.loads(answers)
+            yield {'id': record.get('id'), 'answers': answers}
+
+def batched(records, batch_size):
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
+
+# --- Workers ---
+# Each worker process compiles the question set once in its initializer
+_compiled = None
+
+def init_worker(questions):
+    global _compiled
+    _compiled = compile_questions(questions)
+
+def score_batch(batch):
+    answers = np.stack([encode_answers_by_id(record['answers'], _compiled) for record in batch])
+    score_rows, attitude_rows = score_answer_matrix(_compiled, answers)
+    analyses = calculate_mbti_analysis(score_rows, attitude_rows)
+    profiles = calculate_cognitive_profile(score_rows)
+    return [
+        {
+            'id': record['id'],
+            'scores': dict(zip(SCORE_KEYS, map(int, score_row))),
+            'attitude_scores': dict(zip(ATTITUDE_KEYS, map(int, attitude_row))),
+            'mbti_analysis': analysis,
+            'cognitive_profile': profile,
+        }
+        for record, score_row, attitude_row, analysis, profile
+        in zip(batch, score_rows, attitude_rows, analyses, profiles)
+    ]
+
+# --- Output ---
+CSV_COLUMNS = ['id', 'mbti_type', 'overall_strength', 'profile_string'] + SCORE_KEYS + ATTITUDE_KEYS
+
+def csv_row(result):
+    return {
+        'id': result['id'],
+        'mbti_type': result['mbti_analysis'].get('mbti_type', ''),
+        'overall_strength': result['mbti_analysis'].get('overall_strength', ''),
+        'profile_string': result['cognitive_profile'].get('profile_string', ''),
+        **result['scores'],
+        **result['attitude_scores'],
+    }
+
+class ResultWriter:
+    def __init__(self, path, truncate_at=None):
+        self.is_csv = path.endswith('.csv')
+        exists = os.path.exists(path)
+        self.f = open(path, 'a' if exists else 'w', newline='', encoding='utf-8')
+        if exists and truncate_at is not None:
+            # Drop anything written after the last checkpoint
+            self.f.truncate(truncate_at)
+            self.f.seek(truncate_at)
+        if self.is_csv:
+            self.csv = csv.DictWriter(self.f, fieldnames=CSV_COLUMNS)
+            if self.f.tell() == 0:
+                self.csv.writeheader()
+
+    def write(self, results):
+        for result in results:
+            if self.is_csv:
+                self.csv.writerow(csv_row(result))
+            else:
+                self.f.write(json.dumps(result) + '\n')
+
+    def sync(self):
+        # Flush to disk and return the byte offset the checkpoint can trust
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        return self.f.tell()
+
+    def close(self):
+        self.f.close()
+
+# --- Checkpoints ---
+def load_checkpoint(path, args):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('input') != os.path.abspath(args.input) or checkpoint.get('output') != os.path.abspath(args.output):
+        sys.exit(f"Checkpoint {path} belongs to a different input/output pair.")
+    return checkpoint
+
+def save_checkpoint(path, args, records_done, output_bytes):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'input': os.path.abspath(args.input),
+            'output': os.path.abspath(args.output),
+            'records_done': records_done,
+            'output_bytes': output_bytes,
+        }, f)
+    os.replace(tmp_path, path)
+
+# --- Progress ---
+class Progress:
+    def __init__(self, already_done, interval):
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.already_done = already_done
+        self.done = 0
+        self.interval = interval
+
+    def add(self, count):
+        self.done += count
+        now = time.monotonic()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report()
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def report(self, final=False):
+        label = "Done" if final else "Progress"
+        print(f"{label}: {self.already_done + self.done} records "
+              f"({self.done} this run, {self.rate():,.0f} records/s)", file=sys.stderr)
+
+def rescore(args):
+    questions = load_questions(args.questions)
+    checkpoint_path = args.checkpoint or f"{args.output}.checkpoint"
+    checkpoint = load_checkpoint(checkpoint_path, args) if args.resume else None
+    records_done = checkpoint['records_done'] if checkpoint else 0
+
+    writer = ResultWriter(args.output, truncate_at=checkpoint['output_bytes'] if checkpoint else 0)
+    progress = Progress(records_done, args.progress_interval)
+    batches = batched(read_responses(args.input, skip=records_done), args.batch_size)
+    # Bound the batches in flight so memory stays flat however large the input is
+    max_in_flight = args.workers * 2
+    pending = deque()
+
+    def drain_oldest():
+        nonlocal records_done
+        results = pending.popleft().result()
+        writer.write(results)
+        records_done += len(results)
+        save_checkpoint(checkpoint_path, args, records_done, writer.sync())
+        progress.add(len(results))
+
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(questions,)) as pool:
+            for batch in batches:
+                pending.append(pool.submit(score_batch, batch))
+                if len(pending) >= max_in_flight:
+                    drain_oldest()
+            while pending:
+                drain_oldest()
+    finally:
+        writer.close()
+    progress.report(final=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-score exported test responses against the current question set.")
+    parser.add_argument("--questions", required=True, help="Question export (.json, .jsonl or .csv)")
+    parser.add_argument("--input", required=True, help="Response export (.jsonl or .csv)")
+    parser.add_argument("--output", required=True, help="Where to write results (.jsonl or .csv)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("--resume", action="store_true", help="Continue from the last checkpoint")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="Seconds between progress lines")
+    rescore(parser.parse_args(argv))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# Population percentiles for the test results view.
+#
+# Usage:
+#   python score_sketches.py [--full] [--sqlite app.db]
+#
+# Every function score and every MBTI dichotomy percentage has a ScoreSketch:
+# a fixed-bin histogram of all stored results. Function scores are small
+# integers, so they get one bin per value (SCORE_BINS, the last bin also
+# holds anything larger); dichotomy percentages get one bin per percentage
+# point. For values this coarse the histogram is exact, stays a few hundred
+# integers however many results exist, and two sketches merge by adding
+# their counts. A percentile lookup is a prefix sum over the bins.
+#
+# The sketches live in the score_sketches table and are rebuilt by this batch
+# job, never by the app. By default the job reads only results newer than the
+# last run (keyset paging on results.id) and merges them into the stored
+# sketches; --full rebuilds from scratch, e.g. after rescore.py or deleting
+# results. Reading every result needs SUPABASE_SERVICE_ROLE_KEY, or --sqlite.
+#
+# Result ids are taken when a row is inserted, not when its transaction
+# commits, so a result with a lower id can become visible after a higher one.
+# The job therefore stops at the first result created less than --lag-seconds
+# ago and records the last id before it; a result still uncommitted after
+# the lag would be missed until the next --full run.
+
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from question_io import open_repository
+from scoring import ATTITUDE_KEYS, MBTI_DICHOTOMIES, SCORE_KEYS, as_score_matrix, mbti_arrays
+
+SCORE_BINS = 128
+PERCENT_BINS = 100
+SKETCH_METRICS = SCORE_KEYS + list(MBTI_DICHOTOMIES)
+RESULTS_PAGE_SIZE = 5000
+# Results newer than this are left for the next run
+RESULTS_SETTLE_LAG = timedelta(minutes=5)
+
+
+class ScoreSketch:
+    def __init__(self, bins, scale, counts=None):
+        # A value v falls into bin floor(v * scale), clamped to [0, bins)
+        self.bins = bins
+        self.scale = scale
+        self.counts = np.zeros(bins, dtype=np.int64)
+        if counts:
+            self.counts[:len(counts)] = counts
+        self._below = None
+        self._total = 0
+
+    @classmethod
+    def for_metric(cls, metric, counts=None):
+        if metric in MBTI_DICHOTOMIES:
+            return cls(PERCENT_BINS, PERCENT_BINS, counts)
+        return cls(SCORE_BINS, 1, counts)
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def bin_of(self, values):
+        # The small epsilon keeps 0.29 * 100 = 28.999... in bin 29
+        return np.clip(np.floor(np.asarray(values, dtype=np.float64) * self.scale + 1e-9), 0, self.bins - 1).astype(np.int64)
+
+    def add(self, values):
+        self.counts += np.bincount(self.bin_of(values), minlength=self.bins)
+        self._below = None
+
+    def merge(self, other):
+        self.counts += other.counts
+        self._below = None
+        return self
+
+    def percentile(self, value):
+        # Share of results below value, counting ties as half, in percent.
+        # None while the sketch is empty.
+        if self._below is None:
+            # Cached prefix sums make each lookup two list reads
+            # (the app shares one sketch between sessions, so _total is set first)
+            cumulative = np.cumsum(self.counts)
+            self._total = int(cumulative[-1])
+            self._below = (cumulative - self.counts).tolist()
+        if not self._total:
+            return None
+        i = int(self.bin_of(value))
+        return 100.0 * (self._below[i] + self.counts[i] / 2) / self._total
+
+    def to_row(self, metric):
+        # Trailing empty bins are dropped to keep the stored row small
+        nonzero = np.flatnonzero(self.counts)
+        length = int(nonzero[-1]) + 1 if len(nonzero) else 0
+        return {"metric": metric, "counts": self.counts[:length].tolist(), "total": self.total}
+
+
+# --- Reading results ---
+def settled_result_pages(repository, after_id, page_size, lag=RESULTS_SETTLE_LAG):
+    # Pages of results after after_id in id order, ending before the first
+    # result created within `lag` of now. Pages until one comes back empty,
+    # since the server may return fewer rows than asked for.
+    settled_before = datetime.now(timezone.utc) - lag
+    while True:
+        page = repository.results_after(after_id, page_size)
+        settled = []
+        for row in page:
+            if datetime.fromisoformat(row["created_at"]) >= settled_before:
+                break
+            settled.append(row)
+        if settled:
+            yield settled
+            after_id = settled[-1]["id"]
+        if not page or len(settled) < len(page):
+            return
+
+
+# --- Building ---
+def empty_sketches():
+    return {metric: ScoreSketch.for_metric(metric) for metric in SKETCH_METRICS}
+
+def sketch_results(rows):
+    # Sketches of a batch of result rows (with `scores` and `attitude_scores` dicts)
+    score_rows = as_score_matrix([row.get("scores") or {} for row in rows], SCORE_KEYS)
+    attitude_rows = as_score_matrix([row.get("attitude_scores") or {} for row in rows], ATTITUDE_KEYS)
+    sketches = empty_sketches()
+    for i, key in enumerate(SCORE_KEYS):
+        sketches[key].add(score_rows[:, i])
+    arrays = mbti_arrays(score_rows, attitude_rows)
+    for name in MBTI_DICHOTOMIES:
+        data = arrays[name]
+        sketches[name].add(data["percentage"][data["present"]])
+    return sketches
+
+def merge_sketches(into, other):
+    for metric, sketch in other.items():
+        into[metric].merge(sketch)
+    return into
+
+def load_sketches(repository):
+    # (sketches, id of the last result they include)
+    sketches = empty_sketches()
+    last_result_id = None
+    for row in repository.score_sketches():
+        if row["metric"] in sketches:
+            sketches[row["metric"]] = ScoreSketch.for_metric(row["metric"], row["counts"])
+            last_result_id = row.get("last_result_id")
+    return sketches, last_result_id
+
+def build_sketches(repository, full=False, page_size=RESULTS_PAGE_SIZE, on_progress=None, lag=RESULTS_SETTLE_LAG):
+    # Folds settled results newer than the stored sketches into them (or
+    # every settled result, with full=True) and saves the merged sketches.
+    # Returns the number of results read.
+    sketches, after_id = (empty_sketches(), None) if full else load_sketches(repository)
+    read = 0
+    for page in settled_result_pages(repository, after_id, page_size, lag):
+        merge_sketches(sketches, sketch_results(page))
+        after_id = page[-1]["id"]
+        read += len(page)
+        if on_progress:
+            on_progress(read)
+    built_at = datetime.now(timezone.utc).isoformat()
+    repository.save_score_sketches([
+        {**sketch.to_row(metric), "last_result_id": after_id, "built_at": built_at}
+        for metric, sketch in sketches.items()
+    ])
+    return read
+
+
+# --- Command line ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the population percentile sketches from stored results.")
+    parser.add_argument("--full", action="store_true", help="Rebuild from every result instead of only new ones")
+    parser.add_argument("--sqlite", help="Use this SQLite database instead of Supabase")
+    parser.add_argument("--page-size", type=int, default=RESULTS_PAGE_SIZE)
+    parser.add_argument("--lag-seconds", type=float, default=RESULTS_SETTLE_LAG.total_seconds(),
+                        help="Leave results created this recently for the next run")
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+    read = build_sketches(open_repository(args), args.full, args.page_size,
+                          on_progress=lambda done: print(f"{done} results read", file=sys.stderr),
+                          lag=timedelta(seconds=args.lag_seconds))
+    print(f"Folded {read} results into {len(SKETCH_METRICS)} sketches in {time.monotonic() - started:.1f}s.")
+
+if __name__ == "__main__":
+    main()
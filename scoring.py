@@ -0,0 +1,411 @@
+import sys
+from array import array
+
+import numpy as np
+
+# --- Score Layout ---
+# Every score row uses this fixed column order (the same order the test has
+# always used for its `scores` dict), so a batch of results is just an
+# (n_tests, 12) integer matrix.
+SCORE_KEYS = ["Fe", "Fi", "Ne", "Ni", "Se", "Si", "Te", "Ti", "F", "T", "N", "S"]
+ATTITUDE_KEYS = ["i", "e"]
+SCORE_INDEX = {key: i for i, key in enumerate(SCORE_KEYS)}
+ATTITUDE_INDEX = {key: i for i, key in enumerate(ATTITUDE_KEYS)}
+
+# Orders the analysis functions walk in; ties go to the first one listed
+DETAILED_FUNCTIONS = ["Te", "Ti", "Fe", "Fi", "Ne", "Ni", "Se", "Si"]
+PRIMARY_LETTERS = ["T", "F", "N", "S"]
+DETAILED_COLUMNS = np.array([SCORE_INDEX[f] for f in DETAILED_FUNCTIONS])
+PRIMARY_COLUMNS = np.array([SCORE_INDEX[l] for l in PRIMARY_LETTERS])
+
+INFERIOR_MAP = {
+    'Ti': 'Fe', 'Te': 'Fi', 'Fi': 'Te', 'Fe': 'Ti',
+    'Ni': 'Se', 'Ne': 'Si', 'Si': 'Ne', 'Se': 'Ni'
+}
+
+# --- Answer Encoding ---
+# Answers are stored per question as a small integer code. Unanswered
+# questions and "Neither" both score nothing.
+ANSWER_NONE = 0
+ANSWER_A = 1
+ANSWER_B = 2
+ANSWER_BOTH = 3
+
+def encode_answer(answer):
+    # Same matching rules as the radio labels on the "Take Test" page. The
+    # bare stored forms ("A", "B") and existing codes are accepted as well.
+    if isinstance(answer, (int, np.integer)):
+        return int(answer) if answer in (ANSWER_A, ANSWER_B, ANSWER_BOTH) else ANSWER_NONE
+    if not answer:
+        return ANSWER_NONE
+    if answer == "Both":
+        return ANSWER_BOTH
+    if answer == "A" or answer.startswith("A:"):
+        return ANSWER_A
+    if answer == "B" or answer.startswith("B:"):
+        return ANSWER_B
+    return ANSWER_NONE
+
+def encode_answers(user_answers, question_count):
+    # {question_index: radio label} -> answer vector of length question_count
+    vector = np.zeros(question_count, dtype=np.int8)
+    for i, answer in user_answers.items():
+        vector[int(i)] = encode_answer(answer)
+    return vector
+
+# Stored form of each answer code (results are keyed by question id so they
+# can be re-scored after the question set changes)
+ANSWER_LABELS = {ANSWER_NONE: "Neither", ANSWER_A: "A", ANSWER_B: "B", ANSWER_BOTH: "Both"}
+
+def answers_by_question_id(questions, user_answers):
+    # {question_index: radio label} -> {question_id: "A" | "B" | "Both" | "Neither"}
+    return {str(questions[int(i)]['id']): ANSWER_LABELS[encode_answer(answer)] for i, answer in user_answers.items()}
+
+def encode_answers_by_id(answers_by_id, compiled):
+    # {question_id: answer} -> answer vector in the compiled question order.
+    # Answers to questions that are no longer in the set are ignored.
+    vector = np.zeros(compiled.question_count, dtype=np.int8)
+    for question_id, answer in answers_by_id.items():
+        i = compiled.question_index.get(str(question_id))
+        if i is not None:
+            vector[i] = encode_answer(answer)
+    return vector
+
+# --- Question Compilation ---
+def function_incidence(func, question_dimension):
+    # Score and attitude increments for choosing an option tagged with `func`
+    score_row = np.zeros(len(SCORE_KEYS), dtype=np.int32)
+    attitude_row = np.zeros(len(ATTITUDE_KEYS), dtype=np.int32)
+    if not func:
+        return score_row, attitude_row
+
+    # Score the specific function (e.g., Fe, Ni, or F, N)
+    if func in SCORE_INDEX:
+        score_row[SCORE_INDEX[func]] += 1
+    # If it's a detailed function (Fe, Ni), score the general one too (F, N)
+    if len(func) > 1 and func[0] in SCORE_INDEX:
+        score_row[SCORE_INDEX[func[0]]] += 1
+    # Score attitude (i vs e) for within_functions questions
+    if question_dimension == 'within_functions' and len(func) > 1 and func[1] in ATTITUDE_INDEX:
+        attitude_row[ATTITUDE_INDEX[func[1]]] += 1
+    return score_row, attitude_row
+
+class CompiledQuestions:
+    # A question set compiled into question x score-column incidence
+    # matrices, one for option A and one for option B. They are stored as
+    # float32 so the batch products run through BLAS; every count stays far
+    # below 2**24, so the results are exact.
+    def __init__(self, questions):
+        count = len(questions)
+        self.question_count = count
+        # Question ids are matched as strings, since JSON object keys always are
+        self.question_index = {str(q.get('id')): i for i, q in enumerate(questions)}
+        # Banks reuse a handful of (function, dimension) pairs, so build each
+        # distinct incidence row once and gather them with fancy indexing
+        row_ids = {}
+        a_rows = [row_ids.setdefault((q.get('a_function'), q.get('question_dimension')), len(row_ids)) for q in questions]
+        b_rows = [row_ids.setdefault((q.get('b_function'), q.get('question_dimension')), len(row_ids)) for q in questions]
+        score_table = np.zeros((len(row_ids), len(SCORE_KEYS)), dtype=np.float32)
+        attitude_table = np.zeros((len(row_ids), len(ATTITUDE_KEYS)), dtype=np.float32)
+        for (func, dimension), row_id in row_ids.items():
+            score_table[row_id], attitude_table[row_id] = function_incidence(func, dimension)
+        a_rows = np.array(a_rows, dtype=np.int64)
+        b_rows = np.array(b_rows, dtype=np.int64)
+        self.a_scores = score_table[a_rows].reshape(count, len(SCORE_KEYS))
+        self.b_scores = score_table[b_rows].reshape(count, len(SCORE_KEYS))
+        self.a_attitudes = attitude_table[a_rows].reshape(count, len(ATTITUDE_KEYS))
+        self.b_attitudes = attitude_table[b_rows].reshape(count, len(ATTITUDE_KEYS))
+
+def compile_questions(questions):
+    return CompiledQuestions(questions)
+
+def score_answer_matrix(compiled, answers):
+    # answers: (n_tests, n_questions) answer codes, or a single answer vector.
+    # Returns (score_rows, attitude_rows) with one row per test.
+    answers = np.atleast_2d(np.asarray(answers))
+    took_a = ((answers == ANSWER_A) | (answers == ANSWER_BOTH)).astype(np.float32)
+    took_b = ((answers == ANSWER_B) | (answers == ANSWER_BOTH)).astype(np.float32)
+    score_rows = took_a @ compiled.a_scores + took_b @ compiled.b_scores
+    attitude_rows = took_a @ compiled.a_attitudes + took_b @ compiled.b_attitudes
+    return np.rint(score_rows).astype(np.int32), np.rint(attitude_rows).astype(np.int32)
+
+def scores_to_dict(score_row):
+    return {key: int(value) for key, value in zip(SCORE_KEYS, score_row)}
+
+def attitudes_to_dict(attitude_row):
+    return {key: int(value) for key, value in zip(ATTITUDE_KEYS, attitude_row)}
+
+# --- Compact Score Records ---
+RECORD_WIDTH = len(SCORE_KEYS) + len(ATTITUDE_KEYS)
+
+# Packed form: one byte giving the item size (1 or 2), then the 14 counts as
+# little-endian unsigned integers. Most tests fit in 15 bytes.
+RECORD_TYPECODES = {1: 'B', 2: 'H'}
+
+class ScoreRecord:
+    # One test's scores in the fixed layout SCORE_KEYS + ATTITUDE_KEYS, held
+    # in a single unsigned 16-bit array instead of two string-keyed dicts
+    __slots__ = ('values',)
+
+    def __init__(self, values):
+        self.values = values if isinstance(values, array) and values.typecode == 'H' else array('H', values)
+        if len(self.values) != RECORD_WIDTH:
+            raise ValueError(f"A score record holds {RECORD_WIDTH} counts, got {len(self.values)}")
+
+    @classmethod
+    def from_rows(cls, score_row, attitude_row):
+        return cls([int(v) for v in score_row] + [int(v) for v in attitude_row])
+
+    @classmethod
+    def from_dicts(cls, scores, attitude_scores):
+        return cls([scores.get(key, 0) for key in SCORE_KEYS] + [attitude_scores.get(key, 0) for key in ATTITUDE_KEYS])
+
+    def score(self, key):
+        return self.values[SCORE_INDEX[key]]
+
+    def attitude(self, key):
+        return self.values[len(SCORE_KEYS) + ATTITUDE_INDEX[key]]
+
+    def score_values(self):
+        return tuple(self.values[:len(SCORE_KEYS)])
+
+    def attitude_values(self):
+        return tuple(self.values[len(SCORE_KEYS):])
+
+    def scores_dict(self):
+        return dict(zip(SCORE_KEYS, self.score_values()))
+
+    def attitudes_dict(self):
+        return dict(zip(ATTITUDE_KEYS, self.attitude_values()))
+
+    def pack(self):
+        itemsize = 1 if max(self.values) < 256 else 2
+        packed = array(RECORD_TYPECODES[itemsize], self.values)
+        if sys.byteorder != 'little':
+            packed.byteswap()
+        return bytes([itemsize]) + packed.tobytes()
+
+    @classmethod
+    def unpack(cls, data):
+        packed = array(RECORD_TYPECODES[data[0]])
+        packed.frombytes(data[1:])
+        if sys.byteorder != 'little':
+            packed.byteswap()
+        return cls(packed)
+
+    def __eq__(self, other):
+        return isinstance(other, ScoreRecord) and self.values == other.values
+
+    def __hash__(self):
+        return hash(self.values.tobytes())
+
+    def __repr__(self):
+        return f"ScoreRecord({self.scores_dict()}, {self.attitudes_dict()})"
+
+def pack_rows(score_rows, attitude_rows):
+    # A batch of records as one byte string: the item size, then an
+    # (n, RECORD_WIDTH) little-endian matrix
+    rows = np.hstack([np.atleast_2d(score_rows), np.atleast_2d(attitude_rows)])
+    dtype = '<u1' if rows.size == 0 or rows.max() < 256 else '<u2'
+    return bytes([np.dtype(dtype).itemsize]) + rows.astype(dtype).tobytes()
+
+def unpack_rows(data):
+    # Inverse of pack_rows: (score_rows, attitude_rows)
+    rows = np.frombuffer(data, dtype='<u1' if data[0] == 1 else '<u2', offset=1).reshape(-1, RECORD_WIDTH)
+    return rows[:, :len(SCORE_KEYS)].astype(np.int32), rows[:, len(SCORE_KEYS):].astype(np.int32)
+
+def score_test(questions, user_answers):
+    # The interactive "Finish Test" path: one test, one ScoreRecord
+    compiled = compile_questions(questions)
+    score_rows, attitude_rows = score_answer_matrix(compiled, encode_answers(user_answers, len(questions)))
+    return ScoreRecord.from_rows(score_rows[0], attitude_rows[0])
+
+def as_score_matrix(rows, keys):
+    # Accepts an (n, len(keys)) array, a list of ScoreRecords or a list of
+    # score dicts
+    if isinstance(rows, np.ndarray):
+        return np.atleast_2d(rows)
+    rows = list(rows)
+    if rows and isinstance(rows[0], ScoreRecord):
+        matrix = np.array([record.values for record in rows], dtype=np.int64)
+        return matrix[:, :len(SCORE_KEYS)] if keys is SCORE_KEYS else matrix[:, len(SCORE_KEYS):]
+    return np.array([[row.get(key, 0) for key in keys] for row in rows], dtype=np.int64).reshape(-1, len(keys))
+
+# --- Batch Analysis ---
+def strength_labels(strength_vals):
+    return np.select([strength_vals > 0.75, strength_vals > 0.60], ["Strong", "Moderate"], "Weak")
+
+def ratio(numerator, denominator):
+    # numerator / denominator, 0 where the denominator is 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / np.where(denominator > 0, denominator, 1), 0.0)
+
+def mbti_arrays(score_rows, attitude_rows):
+    # Vectorized core of calculate_mbti_analysis. Every entry is an array
+    # with one element per test.
+    score_rows = np.asarray(score_rows, dtype=np.float64)
+    attitude_rows = np.asarray(attitude_rows, dtype=np.float64)
+    result = {}
+    total_strength = np.zeros(len(score_rows))
+    preference_count = np.zeros(len(score_rows))
+    mbti_type = np.full(len(score_rows), "", dtype=object)
+
+    for name, positive, negative in [('I/E', attitude_rows[:, ATTITUDE_INDEX['i']], attitude_rows[:, ATTITUDE_INDEX['e']]),
+                                     ('N/S', score_rows[:, SCORE_INDEX['N']], score_rows[:, SCORE_INDEX['S']]),
+                                     ('T/F', score_rows[:, SCORE_INDEX['T']], score_rows[:, SCORE_INDEX['F']])]:
+        total = positive + negative
+        present = total > 0
+        positive_percent = ratio(positive, total)
+        negative_percent = ratio(negative, total)
+        letters = name.split('/')
+        preference = np.where(positive_percent > negative_percent, letters[0], letters[1])
+        top = np.maximum(positive_percent, negative_percent)
+        result[name] = {
+            'present': present,
+            'percentage': positive_percent,
+            'preference': preference,
+            'strength': np.abs(positive_percent - negative_percent),
+            'strength_label': strength_labels(top),
+        }
+        mbti_type = np.where(present, mbti_type + preference.astype(object), mbti_type)
+        total_strength += np.where(present, top, 0.0)
+        preference_count += present
+
+    # J/P follows the type of the highest scoring detailed function
+    dominant = DETAILED_COLUMNS[np.argmax(score_rows[:, DETAILED_COLUMNS], axis=1)]
+    dominant_letters = np.array(SCORE_KEYS)[dominant]
+    preference = np.where(np.isin(dominant_letters, ['Te', 'Ti', 'Fe', 'Fi']), 'J', 'P')
+
+    judging_score = score_rows[:, SCORE_INDEX['T']] + score_rows[:, SCORE_INDEX['F']]
+    perceiving_score = score_rows[:, SCORE_INDEX['N']] + score_rows[:, SCORE_INDEX['S']]
+    total_jp = judging_score + perceiving_score
+    # Neutral 50/50 when there are no scores at all
+    j_percent = np.where(total_jp > 0, ratio(judging_score, total_jp), 0.5)
+    p_percent = np.where(total_jp > 0, ratio(perceiving_score, total_jp), 0.5)
+    top = np.maximum(j_percent, p_percent)
+    result['J/P'] = {
+        'present': np.ones(len(score_rows), dtype=bool),
+        'percentage': j_percent,
+        'preference': preference,
+        'strength': np.abs(j_percent - p_percent),
+        'strength_label': strength_labels(top),
+    }
+    mbti_type = mbti_type + preference.astype(object)
+    total_strength += top
+    preference_count += 1
+
+    result['overall_strength'] = strength_labels(total_strength / preference_count)
+    result['mbti_type'] = mbti_type
+    return result
+
+MBTI_DICHOTOMIES = {
+    'I/E': ('Introversion', 'Extraversion'),
+    'N/S': ('Intuition', 'Sensing'),
+    'T/F': ('Thinking', 'Feeling'),
+    'J/P': ('Judging', 'Perceiving'),
+}
+
+def calculate_mbti_analysis(scores, attitude_scores=None):
+    # A single ScoreRecord (or pair of score dicts) returns one analysis
+    # dict; a batch returns a list of them. Records carry their own attitude
+    # scores, so `attitude_scores` is only needed for dicts and matrices.
+    single = isinstance(scores, (dict, ScoreRecord))
+    if attitude_scores is None:
+        attitude_scores = scores
+    score_rows = as_score_matrix([scores] if single else scores, SCORE_KEYS)
+    attitude_rows = as_score_matrix([attitude_scores] if single else attitude_scores, ATTITUDE_KEYS)
+    arrays = mbti_arrays(score_rows, attitude_rows)
+
+    analyses = []
+    for n in range(len(score_rows)):
+        analysis = {}
+        for name, (positive, negative) in MBTI_DICHOTOMIES.items():
+            data = arrays[name]
+            if not data['present'][n]:
+                continue
+            preference = str(data['preference'][n])
+            letters = name.split('/')
+            analysis[name] = {
+                'positive': positive,
+                'negative': negative,
+                'opposite': letters[1] if name != 'J/P' else ('P' if preference == 'J' else 'J'),
+                'percentage': float(data['percentage'][n]),
+                'preference': preference,
+                'strength': f"{float(data['strength'][n]):.0%}",
+                'strength_label': str(data['strength_label'][n])
+            }
+        analysis['overall_strength'] = str(arrays['overall_strength'][n])
+        analysis['mbti_type'] = str(arrays['mbti_type'][n])
+        analyses.append(analysis)
+    return analyses[0] if single else analyses
+
+# Column lookup tables for cognitive_arrays, indexed by score column
+EXTRAVERTED_COLUMN = np.zeros(len(SCORE_KEYS), dtype=np.int64)
+INTROVERTED_COLUMN = np.zeros(len(SCORE_KEYS), dtype=np.int64)
+LETTER_COLUMN = np.zeros(len(SCORE_KEYS), dtype=np.int64)
+INFERIOR_COLUMN = np.zeros(len(SCORE_KEYS), dtype=np.int64)
+for _key, _i in SCORE_INDEX.items():
+    LETTER_COLUMN[_i] = SCORE_INDEX[_key[0]]
+    EXTRAVERTED_COLUMN[_i] = SCORE_INDEX[f"{_key[0]}e"]
+    INTROVERTED_COLUMN[_i] = SCORE_INDEX[f"{_key[0]}i"]
+    INFERIOR_COLUMN[_i] = SCORE_INDEX[INFERIOR_MAP[_key]] if _key in INFERIOR_MAP else _i
+
+def cognitive_arrays(score_rows):
+    # Vectorized core of calculate_cognitive_profile. Functions are returned
+    # as score column indices; `valid` is False where there is not enough data.
+    score_rows = np.asarray(score_rows, dtype=np.float64)
+    rows = np.arange(len(score_rows))
+    primary_scores = score_rows[:, PRIMARY_COLUMNS]
+    valid = primary_scores.any(axis=1)
+
+    # 1. Primary function: strongest letter, then its stronger attitude
+    primary_letter = PRIMARY_COLUMNS[np.argmax(primary_scores, axis=1)]
+    extraverted = EXTRAVERTED_COLUMN[primary_letter]
+    introverted = INTROVERTED_COLUMN[primary_letter]
+    primary = np.where(score_rows[rows, extraverted] >= score_rows[rows, introverted], extraverted, introverted)
+    primary_is_introverted = primary == introverted
+
+    # 2. Secondary function: strongest letter of the other kind, opposite attitude
+    judging = np.isin(primary_letter, [SCORE_INDEX['T'], SCORE_INDEX['F']])
+    perceiving_letter = np.where(score_rows[:, SCORE_INDEX['N']] >= score_rows[:, SCORE_INDEX['S']], SCORE_INDEX['N'], SCORE_INDEX['S'])
+    judging_letter = np.where(score_rows[:, SCORE_INDEX['T']] >= score_rows[:, SCORE_INDEX['F']], SCORE_INDEX['T'], SCORE_INDEX['F'])
+    secondary_letter = np.where(judging, perceiving_letter, judging_letter)
+    secondary = np.where(primary_is_introverted, EXTRAVERTED_COLUMN[secondary_letter], INTROVERTED_COLUMN[secondary_letter])
+
+    # 3. Inferior function
+    inferior = INFERIOR_COLUMN[primary]
+
+    def pair_strength(function):
+        letter = LETTER_COLUMN[function]
+        pair_total = score_rows[rows, EXTRAVERTED_COLUMN[letter]] + score_rows[rows, INTROVERTED_COLUMN[letter]]
+        return strength_labels(ratio(score_rows[rows, function], pair_total))
+
+    return {
+        'valid': valid,
+        'primary': primary, 'primary_strength': pair_strength(primary),
+        'secondary': secondary, 'secondary_strength': pair_strength(secondary),
+        'inferior': inferior, 'inferior_strength': pair_strength(inferior),
+    }
+
+def calculate_cognitive_profile(scores):
+    # A single ScoreRecord or score dict returns one profile dict; a batch
+    # returns a list
+    single = isinstance(scores, (dict, ScoreRecord))
+    score_rows = as_score_matrix([scores] if single else scores, SCORE_KEYS)
+    arrays = cognitive_arrays(score_rows)
+
+    profiles = []
+    for n in range(len(score_rows)):
+        if not arrays['valid'][n]:
+            profiles.append({"error": "Not enough data for cognitive profile."})
+            continue
+        primary_function = SCORE_KEYS[arrays['primary'][n]]
+        secondary_function = SCORE_KEYS[arrays['secondary'][n]]
+        inferior_function = SCORE_KEYS[arrays['inferior'][n]]
+        profiles.append({
+            "primary": {"function": primary_function, "strength": str(arrays['primary_strength'][n])},
+            "secondary": {"function": secondary_function, "strength": str(arrays['secondary_strength'][n])},
+            "inferior": {"function": inferior_function, "strength": str(arrays['inferior_strength'][n])},
+            "profile_string": f"{primary_function}-{secondary_function}-{inferior_function}"
+        })
+    return profiles[0] if single else profiles
@@ -0,0 +1,655 @@
+# SQLite implementation of the Repository interface in repository.py.
+#
+# Mirrors the Supabase schema and behaviour closely enough to run the app
+# against it: the same tables and columns, the updated_at trigger and deletion
+# tombstones of the Edit Questions sync, the result type counters, the
+# `cast_vote` and `increment_upvotes`/`increment_downvotes` RPCs, and row
+# level security where the app depends on it (votes need a signed-in user;
+# guests may only store unattributed results). Auth is local: passwords are
+# salted PBKDF2 hashes, access tokens are HS256 JWTs signed with the
+# database's secret, and refresh tokens are opaque strings stored in the
+# database.
+#
+# One SQLiteDatabase (a single connection guarded by a lock) is shared by
+# every session in the process; each session gets its own SQLiteRepository,
+# which holds the signed-in user like a supabase-py client holds its token.
+
+import hashlib
+import json
+import secrets
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import jwt
+
+from repository import (
+    COMMENT_COLUMNS, EDIT_QUESTION_COLUMNS, QUESTION_BANK_DETAIL_COLUMNS, QUESTION_BANK_HEADER_COLUMNS,
+    QUESTION_SEARCH_COLUMNS, VOTE_TYPES, Repository,
+)
+
+ACCESS_TOKEN_TTL = 3600  # seconds
+PASSWORD_HASH_ITERATIONS = 100_000
+
+# Test checkpoint limits, as in the test session ownership migration
+TEST_SESSION_TTL = timedelta(days=7)
+TEST_SESSION_BATCH_LIMIT = 100
+TEST_SESSION_TOKEN_LENGTHS = range(16, 129)
+TEST_SESSION_MAX_LENGTHS = {"question_set": 64, "answers": 5000, "question_order": 40000}
+TEST_SESSION_MAX_POSITION = 5000
+
+# Same textual format as SQLITE_NOW, so timestamps compare as strings
+def utc_timestamp(value=None):
+    moment = datetime.now(timezone.utc) if value is None else datetime.fromisoformat(value).astimezone(timezone.utc)
+    return moment.isoformat(timespec="milliseconds")
+
+SQLITE_NOW = "(strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))"
+
+SCHEMA = f"""
+create table if not exists users (
+    id text primary key,
+    email text not null unique,
+    password_hash text not null,
+    salt text not null,
+    created_at text not null default {SQLITE_NOW}
+);
+
+create table if not exists refresh_tokens (
+    token text primary key,
+    user_id text not null references users (id) on delete cascade,
+    revoked integer not null default 0
+);
+
+create table if not exists profiles (
+    id text primary key,
+    role text not null default 'user'
+);
+
+create table if not exists questions (
+    id integer primary key autoincrement,
+    question text not null,
+    status text not null default 'draft',
+    a_function text,
+    b_function text,
+    a_answer text,
+    b_answer text,
+    question_dimension text,
+    question_type text,
+    additional_info text,
+    submitted_by text,
+    upvotes integer not null default 0,
+    downvotes integer not null default 0,
+    created_at text not null default {SQLITE_NOW},
+    updated_at text not null default {SQLITE_NOW}
+);
+
+create index if not exists questions_created_at_id_idx on questions (created_at, id);
+create index if not exists questions_upvotes_id_idx on questions (upvotes, id);
+create index if not exists questions_downvotes_id_idx on questions (downvotes, id);
+create index if not exists questions_status_idx on questions (status);
+create index if not exists questions_updated_at_id_idx on questions (updated_at, id);
+
+create trigger if not exists questions_touch_updated_at
+after update on questions for each row when new.updated_at = old.updated_at
+begin
+    update questions set updated_at = {SQLITE_NOW} where id = new.id;
+end;
+
+-- Search index: an FTS5 trigram table over the questions' text, kept in
+-- step with the questions table by triggers
+create virtual table if not exists questions_fts using fts5(
+    {", ".join(QUESTION_SEARCH_COLUMNS)}, content='questions', content_rowid='id', tokenize='trigram'
+);
+
+create trigger if not exists questions_fts_insert after insert on questions
+begin
+    insert into questions_fts (rowid, {", ".join(QUESTION_SEARCH_COLUMNS)})
+    values (new.id, {", ".join("new." + c for c in QUESTION_SEARCH_COLUMNS)});
+end;
+
+create trigger if not exists questions_fts_delete after delete on questions
+begin
+    insert into questions_fts (questions_fts, rowid, {", ".join(QUESTION_SEARCH_COLUMNS)})
+    values ('delete', old.id, {", ".join("old." + c for c in QUESTION_SEARCH_COLUMNS)});
+end;
+
+create trigger if not exists questions_fts_update after update of {", ".join(QUESTION_SEARCH_COLUMNS)} on questions
+begin
+    insert into questions_fts (questions_fts, rowid, {", ".join(QUESTION_SEARCH_COLUMNS)})
+    values ('delete', old.id, {", ".join("old." + c for c in QUESTION_SEARCH_COLUMNS)});
+    insert into questions_fts (rowid, {", ".join(QUESTION_SEARCH_COLUMNS)})
+    values (new.id, {", ".join("new." + c for c in QUESTION_SEARCH_COLUMNS)});
+end;
+
+create table if not exists question_deletions (
+    question_id integer primary key,
+    deleted_at text not null default {SQLITE_NOW}
+);
+
+create index if not exists question_deletions_deleted_at_idx on question_deletions (deleted_at);
+
+create trigger if not exists questions_record_deletion
+after delete on questions for each row
+begin
+    insert or replace into question_deletions (question_id, deleted_at) values (old.id, {SQLITE_NOW});
+end;
+
+create table if not exists votes (
+    id integer primary key autoincrement,
+    user_id text not null,
+    question_id integer not null references questions (id) on delete cascade,
+    vote_type text not null check (vote_type in ('up', 'down')),
+    created_at text not null default {SQLITE_NOW},
+    unique (user_id, question_id)
+);
+
+create table if not exists comments (
+    id integer primary key autoincrement,
+    question_id integer not null references questions (id) on delete cascade,
+    user_id text,
+    comment_text text not null,
+    created_at text not null default {SQLITE_NOW}
+);
+
+create index if not exists comments_question_id_created_at_idx on comments (question_id, created_at, id);
+
+create table if not exists results (
+    id integer primary key autoincrement,
+    user_id text,
+    question_set_version integer,
+    question_set text,
+    answers text not null,
+    scores text not null,
+    attitude_scores text not null,
+    mbti_type text,
+    profile_string text,
+    mbti_analysis text,
+    cognitive_profile text,
+    created_at text not null default {SQLITE_NOW}
+);
+
+create index if not exists results_user_id_idx on results (user_id);
+create index if not exists results_created_at_idx on results (created_at);
+
+create table if not exists result_type_counts (
+    category text not null check (category in ('mbti_type', 'profile_string')),
+    value text not null,
+    count integer not null default 0,
+    updated_at text not null default {SQLITE_NOW},
+    primary key (category, value)
+);
+
+create table if not exists score_sketches (
+    metric text primary key,
+    counts text not null,
+    total integer not null,
+    last_result_id integer,
+    built_at text not null default {SQLITE_NOW}
+);
+
+create table if not exists question_stats (
+    question_id integer primary key references questions (id) on delete cascade,
+    responses integer not null default 0,
+    a_count integer not null default 0,
+    b_count integer not null default 0,
+    both_count integer not null default 0,
+    neither_count integer not null default 0,
+    a_sum_y integer not null default 0,
+    a_sum_yy integer not null default 0,
+    a_sum_xy integer not null default 0,
+    b_sum_y integer not null default 0,
+    b_sum_yy integer not null default 0,
+    b_sum_xy integer not null default 0,
+    last_result_id integer,
+    built_at text not null default {SQLITE_NOW}
+);
+
+create table if not exists test_sessions (
+    id text primary key,
+    question_set text not null,
+    answers text not null,
+    question_order text,
+    position integer not null default 0,
+    adaptive integer not null default 0,
+    finished integer not null default 0,
+    updated_at text not null default {SQLITE_NOW}
+);
+
+create index if not exists test_sessions_updated_at_idx on test_sessions (updated_at);
+
+create trigger if not exists results_count_types
+after insert on results for each row
+begin
+    insert into result_type_counts (category, value, count)
+    select 'mbti_type', new.mbti_type, 1 where new.mbti_type is not null
+    on conflict (category, value) do update set count = count + 1, updated_at = {SQLITE_NOW};
+    insert into result_type_counts (category, value, count)
+    select 'profile_string', new.profile_string, 1 where new.profile_string is not null
+    on conflict (category, value) do update set count = count + 1, updated_at = {SQLITE_NOW};
+end;
+"""
+
+QUESTION_BANK_ORDER_COLUMNS = {"created_at", "upvotes", "downvotes"}
+# The embedded comments(count) of the Question Bank header columns
+COMMENT_COUNT_SQL = "(select count(*) from comments c where c.question_id = questions.id) as comment_count"
+
+def placeholders(values):
+    return ", ".join("?" for _ in values)
+
+def columns_sql(columns):
+    # "a, b, c" column lists from repository.py, minus embedded resources
+    return ", ".join(c.strip() for c in columns.split(",") if "(" not in c and ")" not in c)
+
+def test_session_key(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class SQLiteDatabase:
+    def __init__(self, path=":memory:", jwt_secret=None):
+        self.path = path
+        # Tokens from another process only verify if the secret is shared
+        self.jwt_secret = jwt_secret or secrets.token_hex(32)
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("pragma foreign_keys = on")
+        if path != ":memory:":
+            self.connection.execute("pragma journal_mode = wal")
+        indexed = self.connection.execute("select 1 from sqlite_master where name = 'questions_fts'").fetchone()
+        self.connection.executescript(SCHEMA)
+        if not indexed:
+            # Databases from before the search index get it filled once
+            self.connection.execute("insert into questions_fts (questions_fts) values ('rebuild')")
+        # Databases from before results.question_set get the column
+        result_columns = {row['name'] for row in self.connection.execute("pragma table_info(results)")}
+        if "question_set" not in result_columns:
+            self.connection.execute("alter table results add column question_set text")
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return [dict(row) for row in self.connection.execute(sql, params)]
+
+    def execute(self, sql, params=()):
+        with self.lock:
+            return self.connection.execute(sql, params)
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            self.connection.execute("begin immediate")
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute("rollback")
+                raise
+            self.connection.execute("commit")
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class SQLiteRepository(Repository):
+    def __init__(self, database, service=False):
+        # service=True acts like the service role key and bypasses the
+        # row level checks, as the background results writer needs
+        self.database = database
+        self.service = service
+        self.user_id = None
+        self.refresh_token = None
+
+    # --- Questions ---
+    def approved_questions(self):
+        return self.database.query("select * from questions where status = 'approved'")
+
+    def question_bank_page(self, statuses, order_by, descending, limit, cursor=None):
+        if order_by not in QUESTION_BANK_ORDER_COLUMNS:
+            raise ValueError(f"Cannot order the question bank by {order_by!r}")
+        op, direction = ("<", "desc") if descending else (">", "asc")
+        sql = (f"select {columns_sql(QUESTION_BANK_HEADER_COLUMNS)}, {COMMENT_COUNT_SQL}"
+               f" from questions where status in ({placeholders(statuses)})")
+        params = list(statuses)
+        if cursor is not None:
+            value, last_id = cursor
+            sql += f" and ({order_by} {op} ? or ({order_by} = ? and id {op} ?))"
+            params += [value, value, last_id]
+        # id breaks ties so the cursor is unique
+        sql += f" order by {order_by} {direction}, id {direction} limit ?"
+        return self.database.query(sql, params + [limit])
+
+    def question_details(self, question_ids):
+        if not question_ids:
+            return {}
+        ids = list(question_ids)
+        rows = self.database.query(
+            f"select {columns_sql(QUESTION_BANK_DETAIL_COLUMNS)} from questions where id in ({placeholders(ids)})", ids)
+        return {row['id']: row for row in rows}
+
+    def edit_questions_page(self, statuses, limit, before_id=None):
+        conditions, params = [], []
+        if statuses:
+            conditions.append(f"status in ({placeholders(statuses)})")
+            params += list(statuses)
+        where = " where " + " and ".join(conditions) if conditions else ""
+        total = None
+        if before_id is None:
+            total = self.database.query(f"select count(*) as n from questions{where}", params)[0]['n']
+
+        page_conditions, page_params = list(conditions), list(params)
+        if before_id is not None:
+            page_conditions.append("id < ?")
+            page_params.append(before_id)
+        page_where = " where " + " and ".join(page_conditions) if page_conditions else ""
+        rows = self.database.query(
+            f"select {columns_sql(EDIT_QUESTION_COLUMNS)} from questions{page_where} order by id desc limit ?",
+            page_params + [limit])
+        return rows, total
+
+    def search_questions(self, query, statuses, limit, offset=0):
+        # Every word of 3+ characters must appear as a substring (the trigram
+        # tokenizer can't match shorter ones); bm25 ranks question text above
+        # answers above additional info
+        words = [word.replace('"', '""') for word in query.split() if len(word) >= 3]
+        if not words:
+            return []
+        sql = (
+            f"select questions.*, {COMMENT_COUNT_SQL} from questions_fts join questions on questions.id = questions_fts.rowid"
+            " where questions_fts match ?"
+        )
+        params = [" ".join(f'"{word}"' for word in words)]
+        if statuses:
+            sql += f" and questions.status in ({placeholders(statuses)})"
+            params += list(statuses)
+        sql += " order by bm25(questions_fts, 10.0, 4.0, 4.0, 1.0), questions.id desc limit ? offset ?"
+        return self.database.query(sql, params + [limit, offset])
+
+    def latest_question_change(self):
+        return self.database.query("select max(updated_at) as latest from questions")[0]['latest']
+
+    def latest_question_deletion(self):
+        return self.database.query("select max(deleted_at) as latest from question_deletions")[0]['latest']
+
+    def questions_changed_since(self, timestamp, limit):
+        return self.database.query(
+            f"select {columns_sql(EDIT_QUESTION_COLUMNS)} from questions where updated_at > ? order by updated_at limit ?",
+            (utc_timestamp(timestamp), limit))
+
+    def question_deletions_since(self, timestamp, limit):
+        return self.database.query(
+            "select question_id, deleted_at from question_deletions where deleted_at > ? order by deleted_at limit ?",
+            (utc_timestamp(timestamp), limit))
+
+    def insert_question(self, row):
+        columns = list(row)
+        with self.database.transaction() as connection:
+            cursor = connection.execute(
+                f"insert into questions ({', '.join(columns)}) values ({placeholders(columns)})", [row[c] for c in columns])
+            return dict(connection.execute("select * from questions where id = ?", (cursor.lastrowid,)).fetchone())
+
+    def update_question(self, question_id, fields):
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self.database.transaction() as connection:
+            connection.execute(f"update questions set {assignments} where id = ?", [*fields.values(), question_id])
+            row = connection.execute("select * from questions where id = ?", (question_id,)).fetchone()
+        return dict(row) if row else None
+
+    def delete_question(self, question_id):
+        self.database.execute("delete from questions where id = ?", (question_id,))
+
+    def insert_questions(self, rows):
+        columns = list(rows[0])
+        with self.database.transaction() as connection:
+            connection.executemany(
+                f"insert into questions ({', '.join(columns)}) values ({placeholders(columns)})",
+                [[row[c] for c in columns] for row in rows])
+
+    def upsert_questions(self, rows):
+        columns = list(rows[0])
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != "id")
+        with self.database.transaction() as connection:
+            connection.executemany(
+                f"insert into questions ({', '.join(columns)}) values ({placeholders(columns)})"
+                f" on conflict (id) do update set {updates}",
+                [[row[c] for c in columns] for row in rows])
+
+    def questions_after(self, after_id, limit):
+        return self.database.query("select * from questions where id > ? order by id limit ?",
+                                   (-1 if after_id is None else after_id, limit))
+
+    # --- Votes ---
+    def user_votes(self, user_id, question_ids):
+        ids = list(question_ids)
+        if not ids:
+            return {}
+        rows = self.database.query(
+            f"select question_id, vote_type from votes where user_id = ? and question_id in ({placeholders(ids)})",
+            [user_id, *ids])
+        return {v['question_id']: v['vote_type'] for v in rows}
+
+    def cast_vote(self, question_id, vote_type):
+        if self.user_id is None:
+            raise PermissionError("You must be logged in to vote")
+        if vote_type not in VOTE_TYPES:
+            raise ValueError(f"Invalid vote type: {vote_type}")
+        with self.database.transaction() as connection:
+            inserted = connection.execute(
+                "insert or ignore into votes (user_id, question_id, vote_type) values (?, ?, ?)",
+                (self.user_id, question_id, vote_type)).rowcount == 1
+            existing = None
+            if inserted:
+                connection.execute(
+                    "update questions set upvotes = coalesce(upvotes, 0) + ?, downvotes = coalesce(downvotes, 0) + ? where id = ?",
+                    (int(vote_type == "up"), int(vote_type == "down"), question_id))
+            else:
+                existing = connection.execute(
+                    "select vote_type from votes where user_id = ? and question_id = ?",
+                    (self.user_id, question_id)).fetchone()['vote_type']
+            counts = connection.execute("select upvotes, downvotes from questions where id = ?", (question_id,)).fetchone()
+            if counts is None:
+                raise LookupError(f"Question {question_id} does not exist")
+        return {'upvotes': counts['upvotes'] or 0, 'downvotes': counts['downvotes'] or 0,
+                'accepted': inserted, 'existing_vote_type': existing}
+
+    def increment_upvotes(self, question_id):
+        self.database.execute("update questions set upvotes = coalesce(upvotes, 0) + 1 where id = ?", (question_id,))
+
+    def increment_downvotes(self, question_id):
+        self.database.execute("update questions set downvotes = coalesce(downvotes, 0) + 1 where id = ?", (question_id,))
+
+    # --- Comments ---
+    def question_comments(self, question_id, limit, cursor=None):
+        sql = f"select {COMMENT_COLUMNS} from comments where question_id = ?"
+        params = [question_id]
+        if cursor is not None:
+            sql += " and (created_at < ? or (created_at = ? and id < ?))"
+            params += [cursor[0], cursor[0], cursor[1]]
+        return self.database.query(sql + " order by created_at desc, id desc limit ?", params + [limit])
+
+    def add_comment(self, question_id, user_id, comment_text):
+        self.database.execute(
+            "insert into comments (question_id, user_id, comment_text) values (?, ?, ?)",
+            (question_id, user_id, comment_text))
+
+    # --- Profiles ---
+    def user_role(self, user_id):
+        rows = self.database.query("select role from profiles where id = ?", (user_id,))
+        return rows[0]['role'] if rows else None
+
+    def user_roles(self, user_ids):
+        ids = list(user_ids)
+        if not ids:
+            return {}
+        rows = self.database.query(f"select id, role from profiles where id in ({placeholders(ids)})", ids)
+        return {row['id']: row['role'] for row in rows}
+
+    def create_profile(self, user_id, role="user"):
+        self.database.execute("insert into profiles (id, role) values (?, ?)", (user_id, role))
+
+    # --- Results ---
+    def insert_results(self, rows):
+        if not self.service and any(row.get('user_id') not in (None, self.user_id) for row in rows):
+            raise PermissionError("Results can only be stored for the signed-in user")
+        json_columns = {'answers', 'scores', 'attitude_scores', 'mbti_analysis', 'cognitive_profile'}
+        with self.database.transaction() as connection:
+            for row in rows:
+                columns = list(row)
+                values = [json.dumps(row[c]) if c in json_columns and row[c] is not None else row[c] for c in columns]
+                connection.execute(f"insert into results ({', '.join(columns)}) values ({placeholders(columns)})", values)
+
+    def result_type_counts(self):
+        return self.database.query("select category, value, count from result_type_counts")
+
+    def results_after(self, after_id, limit):
+        if not self.service:
+            raise PermissionError("Reading every result needs the service role")
+        rows = self.database.query(
+            "select id, created_at, answers, scores, attitude_scores from results where id > ? order by id limit ?",
+            (-1 if after_id is None else after_id, limit))
+        return [{**row, **{c: json.loads(row[c]) for c in ('answers', 'scores', 'attitude_scores')}} for row in rows]
+
+    def score_sketches(self):
+        rows = self.database.query("select metric, counts, total, last_result_id, built_at from score_sketches")
+        return [{**row, 'counts': json.loads(row['counts'])} for row in rows]
+
+    def save_score_sketches(self, rows):
+        if not self.service:
+            raise PermissionError("Only the service role can write score sketches")
+        with self.database.transaction() as connection:
+            connection.executemany(
+                "insert into score_sketches (metric, counts, total, last_result_id, built_at) values (?, ?, ?, ?, ?)"
+                " on conflict (metric) do update set counts = excluded.counts, total = excluded.total,"
+                " last_result_id = excluded.last_result_id, built_at = excluded.built_at",
+                [(row['metric'], json.dumps(row['counts']), row['total'], row['last_result_id'], row['built_at'])
+                 for row in rows])
+
+    def question_stats(self, question_ids=None):
+        if question_ids is None:
+            return self.database.query("select * from question_stats")
+        return self.database.query(f"select * from question_stats where question_id in ({placeholders(question_ids)})",
+                                   list(question_ids))
+
+    def question_stats_after(self, after_question_id, limit):
+        return self.database.query("select * from question_stats where question_id > ? order by question_id limit ?",
+                                   (-1 if after_question_id is None else after_question_id, limit))
+
+    def save_question_stats(self, rows):
+        if not self.service:
+            raise PermissionError("Only the service role can write question stats")
+        columns = list(rows[0])
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != "question_id")
+        with self.database.transaction() as connection:
+            connection.executemany(
+                f"insert into question_stats ({', '.join(columns)}) values ({placeholders(columns)})"
+                f" on conflict (question_id) do update set {updates}",
+                [[row[c] for c in columns] for row in rows])
+
+    def delete_question_stats(self, question_ids):
+        if not self.service:
+            raise PermissionError("Only the service role can write question stats")
+        ids = list(question_ids)
+        self.database.execute(f"delete from question_stats where question_id in ({placeholders(ids)})", ids)
+
+    # --- Test sessions ---
+    # Rows are keyed on the SHA-256 of the session token, so only its holder
+    # can read or overwrite a checkpoint; finished tests are deleted and
+    # unfinished ones expire after TEST_SESSION_TTL
+    def save_test_sessions(self, rows):
+        if len(rows) > TEST_SESSION_BATCH_LIMIT:
+            raise ValueError(f"save_test_sessions takes at most {TEST_SESSION_BATCH_LIMIT} sessions")
+        for row in rows:
+            if len(row["id"] or "") not in TEST_SESSION_TOKEN_LENGTHS:
+                raise ValueError("Invalid test session token")
+            if (any(len(row[c] or "") > limit for c, limit in TEST_SESSION_MAX_LENGTHS.items())
+                    or not 0 <= row["position"] <= TEST_SESSION_MAX_POSITION):
+                raise ValueError("Test session checkpoint is too large")
+        columns = ["id", "question_set", "answers", "question_order", "position", "adaptive", "finished"]
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != "id")
+        expired = utc_timestamp((datetime.now(timezone.utc) - TEST_SESSION_TTL).isoformat())
+        with self.database.transaction() as connection:
+            connection.execute("delete from test_sessions where updated_at < ?", (expired,))
+            connection.executemany("delete from test_sessions where id = ?",
+                                   [(test_session_key(row["id"]),) for row in rows if row["finished"]])
+            connection.executemany(
+                f"insert into test_sessions ({', '.join(columns)}) values ({placeholders(columns)})"
+                f" on conflict (id) do update set {updates}, updated_at = {SQLITE_NOW}",
+                [[test_session_key(row["id"]), *[row[c] for c in columns[1:]]] for row in rows if not row["finished"]])
+
+    def test_session(self, session_id):
+        expired = utc_timestamp((datetime.now(timezone.utc) - TEST_SESSION_TTL).isoformat())
+        rows = self.database.query("select * from test_sessions where id = ? and updated_at >= ?",
+                                   (test_session_key(session_id), expired))
+        if not rows:
+            return None
+        return {**rows[0], 'adaptive': bool(rows[0]['adaptive']), 'finished': bool(rows[0]['finished'])}
+
+    # --- Auth ---
+    def _issue_session(self, user):
+        expires_at = int(time.time()) + ACCESS_TOKEN_TTL
+        access_token = jwt.encode(
+            {'sub': user['id'], 'email': user['email'], 'aud': 'authenticated', 'role': 'authenticated', 'exp': expires_at},
+            self.database.jwt_secret, algorithm="HS256")
+        refresh_token = secrets.token_urlsafe(24)
+        self.database.execute("insert into refresh_tokens (token, user_id) values (?, ?)", (refresh_token, user['id']))
+        self.user_id = user['id']
+        self.refresh_token = refresh_token
+        user = SimpleNamespace(id=user['id'], email=user['email'])
+        session = SimpleNamespace(access_token=access_token, refresh_token=refresh_token, expires_at=expires_at, user=user)
+        return SimpleNamespace(user=user, session=session)
+
+    def _hash_password(self, password, salt):
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), bytes.fromhex(salt), PASSWORD_HASH_ITERATIONS).hex()
+
+    def sign_up(self, email, password):
+        salt = secrets.token_hex(16)
+        user = {'id': str(uuid.uuid4()), 'email': email}
+        try:
+            self.database.execute(
+                "insert into users (id, email, password_hash, salt) values (?, ?, ?, ?)",
+                (user['id'], email, self._hash_password(password, salt), salt))
+        except sqlite3.IntegrityError:
+            raise ValueError("User already registered") from None
+        return self._issue_session(user)
+
+    def sign_in(self, email, password):
+        rows = self.database.query("select * from users where email = ?", (email,))
+        if not rows or not secrets.compare_digest(rows[0]['password_hash'], self._hash_password(password, rows[0]['salt'])):
+            raise ValueError("Invalid login credentials")
+        return self._issue_session(rows[0])
+
+    def sign_out(self):
+        if self.refresh_token:
+            self.database.execute("update refresh_tokens set revoked = 1 where token = ?", (self.refresh_token,))
+        self.user_id = None
+        self.refresh_token = None
+
+    def _decode(self, access_token, verify_exp=True):
+        return jwt.decode(access_token, self.database.jwt_secret, algorithms=["HS256"], audience="authenticated",
+                          options={"verify_exp": verify_exp})
+
+    def set_session(self, access_token, refresh_token):
+        claims = self._decode(access_token, verify_exp=False)
+        users = self.database.query("select id, email from users where id = ?", (claims['sub'],))
+        if not users:
+            raise ValueError("User not found")
+        if claims['exp'] > time.time():
+            self.user_id = claims['sub']
+            self.refresh_token = refresh_token
+            user = SimpleNamespace(**users[0])
+            return SimpleNamespace(user=user, session=SimpleNamespace(
+                access_token=access_token, refresh_token=refresh_token, expires_at=claims['exp'], user=user))
+
+        # Expired: rotate the refresh token, as Supabase does
+        with self.database.transaction() as connection:
+            revoked = connection.execute(
+                "update refresh_tokens set revoked = 1 where token = ? and user_id = ? and revoked = 0",
+                (refresh_token, claims['sub'])).rowcount
+        if not revoked:
+            raise ValueError("Invalid refresh token")
+        return self._issue_session(users[0])
+
+    def use_token(self, access_token):
+        self.user_id = self._decode(access_token)['sub']
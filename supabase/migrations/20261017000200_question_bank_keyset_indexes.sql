@@ -0,0 +1,7 @@
+-- Indexes backing the keyset-paginated Question Bank.
+-- Each page is `status IN (...) ORDER BY <col>, id LIMIT n` with a
+-- (<col>, id) cursor, so every order_by choice gets a composite index.
+create index if not exists questions_created_at_id_idx on public.questions (created_at, id);
+create index if not exists questions_upvotes_id_idx on public.questions (upvotes, id);
+create index if not exists questions_downvotes_id_idx on public.questions (downvotes, id);
+create index if not exists questions_status_idx on public.questions (status);
@@ -0,0 +1,27 @@
+-- Finished test submissions, written in batches by the app's write-behind queue.
+-- `answers` maps question id -> "A" | "B" | "Both" | "Neither" so results can
+-- be re-scored with rescore.py after the question set changes.
+create table if not exists public.results (
+    id bigint generated by default as identity primary key,
+    user_id uuid references auth.users (id) on delete set null,
+    question_set_version integer,
+    answers jsonb not null,
+    scores jsonb not null,
+    attitude_scores jsonb not null,
+    mbti_type text,
+    profile_string text,
+    mbti_analysis jsonb,
+    cognitive_profile jsonb,
+    created_at timestamptz not null default now()
+);
+
+create index if not exists results_user_id_idx on public.results (user_id);
+create index if not exists results_created_at_idx on public.results (created_at);
+
+alter table public.results enable row level security;
+
+-- Guests can take the test too, so anyone may insert; only owners read their rows
+create policy "Anyone can submit results" on public.results
+    for insert to anon, authenticated with check (user_id is null or user_id = auth.uid());
+create policy "Users read their own results" on public.results
+    for select to authenticated using (user_id = auth.uid());
@@ -0,0 +1,88 @@
+-- Single round trip voting: record the vote and bump the counter in one
+-- transaction. Duplicate votes are rejected by the unique constraint and
+-- leave the counters untouched. Returns the question's current counts.
+--
+-- The old client-side voting path could record a user's vote on a question
+-- more than once. Those duplicates are removed first, keeping each user's
+-- earliest vote, and the affected questions' counters are recomputed from
+-- the votes that remain; otherwise the constraint could not be added.
+do $$
+begin
+    if not exists (select 1 from pg_constraint where conname = 'votes_user_id_question_id_key') then
+        -- One statement, so the counts come from the rows being kept
+        with ranked as (
+            select id, question_id, vote_type,
+                   row_number() over (partition by user_id, question_id order by created_at, id) as n
+            from public.votes
+        ), deleted as (
+            delete from public.votes v using ranked r
+            where v.id = r.id and r.n > 1
+            returning v.question_id
+        ), kept as (
+            select question_id,
+                   count(*) filter (where vote_type = 'up') as upvotes,
+                   count(*) filter (where vote_type = 'down') as downvotes
+            from ranked
+            where n = 1 and question_id in (select question_id from deleted)
+            group by question_id
+        )
+        update public.questions q
+        set upvotes = kept.upvotes, downvotes = kept.downvotes
+        from kept
+        where q.id = kept.question_id;
+
+        alter table public.votes add constraint votes_user_id_question_id_key unique (user_id, question_id);
+    end if;
+end $$;
+
+create or replace function public.cast_vote(question_id_to_vote bigint, vote_type_to_cast text)
+returns json
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    voter uuid := auth.uid();
+    inserted integer;
+    existing text;
+    result json;
+begin
+    if voter is null then
+        raise exception 'You must be logged in to vote' using errcode = '28000';
+    end if;
+    if vote_type_to_cast not in ('up', 'down') then
+        raise exception 'Invalid vote type: %', vote_type_to_cast using errcode = '22023';
+    end if;
+
+    insert into votes (user_id, question_id, vote_type)
+    values (voter, question_id_to_vote, vote_type_to_cast)
+    on conflict (user_id, question_id) do nothing;
+    get diagnostics inserted = row_count;
+
+    if inserted = 1 then
+        update questions
+        set upvotes = coalesce(upvotes, 0) + (vote_type_to_cast = 'up')::int,
+            downvotes = coalesce(downvotes, 0) + (vote_type_to_cast = 'down')::int
+        where id = question_id_to_vote;
+    else
+        select v.vote_type into existing from votes v
+        where v.user_id = voter and v.question_id = question_id_to_vote;
+    end if;
+
+    select json_build_object(
+        'upvotes', coalesce(q.upvotes, 0),
+        'downvotes', coalesce(q.downvotes, 0),
+        'accepted', inserted = 1,
+        'existing_vote_type', existing
+    ) into result
+    from questions q where q.id = question_id_to_vote;
+
+    if result is null then
+        raise exception 'Question % does not exist', question_id_to_vote using errcode = 'P0002';
+    end if;
+    return result;
+end;
+$$;
+
+revoke execute on function public.cast_vote(bigint, text) from public, anon;
+grant execute on function public.cast_vote(bigint, text) to authenticated;
@@ -0,0 +1,52 @@
+-- Change tracking for the moderator "Edit Questions" delta sync.
+-- Every insert/update stamps `updated_at`, and deletes leave a tombstone in
+-- `question_deletions`, so the app can fetch only what changed since its
+-- last sync (`updated_at > watermark`) instead of reloading the table.
+alter table public.questions add column if not exists updated_at timestamptz not null default now();
+
+create or replace function public.touch_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at := now();
+    return new;
+end;
+$$;
+
+drop trigger if exists questions_touch_updated_at on public.questions;
+create trigger questions_touch_updated_at
+    before update on public.questions
+    for each row execute function public.touch_updated_at();
+
+create index if not exists questions_updated_at_id_idx on public.questions (updated_at, id);
+
+create table if not exists public.question_deletions (
+    question_id bigint primary key,
+    deleted_at timestamptz not null default now()
+);
+
+create index if not exists question_deletions_deleted_at_idx on public.question_deletions (deleted_at);
+
+create or replace function public.record_question_deletion()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    insert into public.question_deletions (question_id) values (old.id)
+    on conflict (question_id) do update set deleted_at = excluded.deleted_at;
+    return old;
+end;
+$$;
+
+drop trigger if exists questions_record_deletion on public.questions;
+create trigger questions_record_deletion
+    after delete on public.questions
+    for each row execute function public.record_question_deletion();
+
+alter table public.question_deletions enable row level security;
+
+create policy "Authenticated users read question deletions" on public.question_deletions
+    for select to authenticated using (true);
@@ -0,0 +1,58 @@
+-- Running population counts of result types for the "Population Stats" page.
+-- A statement-level trigger folds each inserted batch of results into one
+-- counter row per (category, value), so reading the distribution costs the
+-- same however many results exist. `category` is 'mbti_type' or
+-- 'profile_string'.
+create table if not exists public.result_type_counts (
+    category text not null check (category in ('mbti_type', 'profile_string')),
+    value text not null,
+    count bigint not null default 0,
+    updated_at timestamptz not null default now(),
+    primary key (category, value)
+);
+
+create or replace function public.count_result_types()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    insert into public.result_type_counts (category, value, count)
+    select category, value, count(*)
+    from (
+        select 'mbti_type' as category, mbti_type as value from inserted_results
+        union all
+        select 'profile_string', profile_string from inserted_results
+    ) types
+    where value is not null
+    group by category, value
+    on conflict (category, value) do update
+        set count = result_type_counts.count + excluded.count,
+            updated_at = now();
+    return null;
+end;
+$$;
+
+drop trigger if exists results_count_types on public.results;
+create trigger results_count_types
+    after insert on public.results
+    referencing new table as inserted_results
+    for each statement execute function public.count_result_types();
+
+-- Backfill from results stored before the counters existed
+insert into public.result_type_counts (category, value, count)
+select category, value, count(*)
+from (
+    select 'mbti_type' as category, mbti_type as value from public.results
+    union all
+    select 'profile_string', profile_string from public.results
+) types
+where value is not null
+group by category, value
+on conflict (category, value) do update set count = excluded.count, updated_at = now();
+
+alter table public.result_type_counts enable row level security;
+
+create policy "Anyone can read result type counts" on public.result_type_counts
+    for select to anon, authenticated using (true);
@@ -0,0 +1,17 @@
+-- Population percentile sketches, one row per function score / MBTI
+-- dichotomy, written by score_sketches.py. `counts` is a fixed-bin histogram
+-- (trailing empty bins dropped); `last_result_id` is the newest result folded
+-- in, so the next run only reads results after it.
+create table if not exists public.score_sketches (
+    metric text primary key,
+    counts jsonb not null,
+    total bigint not null,
+    last_result_id bigint,
+    built_at timestamptz not null default now()
+);
+
+alter table public.score_sketches enable row level security;
+
+-- Everyone sees their percentiles; only the service role rebuilds the sketches
+create policy "Anyone can read score sketches" on public.score_sketches
+    for select to anon, authenticated using (true);
@@ -0,0 +1,27 @@
+-- Per-question response statistics, written by item_analysis.py and shown to
+-- moderators in "Edit Questions". Every column except the bookkeeping ones is
+-- a running sum, so new results are added without rereading old ones.
+create table if not exists public.question_stats (
+    question_id bigint primary key references public.questions (id) on delete cascade,
+    responses bigint not null default 0,
+    a_count bigint not null default 0,
+    b_count bigint not null default 0,
+    both_count bigint not null default 0,
+    neither_count bigint not null default 0,
+    -- Sums for the item-total correlation of each option (x = option chosen,
+    -- y = corrected score of the function it targets)
+    a_sum_y bigint not null default 0,
+    a_sum_yy bigint not null default 0,
+    a_sum_xy bigint not null default 0,
+    b_sum_y bigint not null default 0,
+    b_sum_yy bigint not null default 0,
+    b_sum_xy bigint not null default 0,
+    last_result_id bigint,
+    built_at timestamptz not null default now()
+);
+
+alter table public.question_stats enable row level security;
+
+create policy "Moderators read question stats" on public.question_stats
+    for select to authenticated
+    using (exists (select 1 from public.profiles p where p.id = auth.uid() and p.role = 'moderator'));
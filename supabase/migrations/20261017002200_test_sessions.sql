@@ -0,0 +1,58 @@
+-- Checkpoints of in-progress tests, so a reload or dropped connection can
+-- resume where the test taker was. `id` is a random token kept in the test
+-- taker's URL; `question_set` fingerprints the approved question set the
+-- answers refer to. `answers` has one character per question in that set:
+-- '.' unanswered, '0' Neither, '1' A, '2' B, '3' Both.
+create table if not exists public.test_sessions (
+    id text primary key,
+    question_set text not null,
+    answers text not null,
+    question_order text,
+    position integer not null default 0,
+    adaptive boolean not null default false,
+    finished boolean not null default false,
+    updated_at timestamptz not null default now()
+);
+
+create index if not exists test_sessions_updated_at_idx on public.test_sessions (updated_at);
+
+-- No policies: guests have no identity to check, so the table is only
+-- reachable through the functions below, which need the session token
+alter table public.test_sessions enable row level security;
+
+create or replace function public.save_test_sessions(sessions jsonb)
+returns void
+language sql
+security definer
+set search_path = public
+as $$
+    insert into test_sessions (id, question_set, answers, question_order, position, adaptive, finished, updated_at)
+    select id, question_set, answers, question_order, position, adaptive, finished, now()
+    from jsonb_to_recordset(sessions) as s(
+        id text, question_set text, answers text, question_order text,
+        position integer, adaptive boolean, finished boolean
+    )
+    on conflict (id) do update set
+        question_set = excluded.question_set,
+        answers = excluded.answers,
+        question_order = excluded.question_order,
+        position = excluded.position,
+        adaptive = excluded.adaptive,
+        finished = excluded.finished,
+        updated_at = excluded.updated_at;
+$$;
+
+create or replace function public.load_test_session(session_id text)
+returns setof public.test_sessions
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select * from test_sessions where id = session_id;
+$$;
+
+revoke execute on function public.save_test_sessions(jsonb) from public;
+revoke execute on function public.load_test_session(text) from public;
+grant execute on function public.save_test_sessions(jsonb) to anon, authenticated;
+grant execute on function public.load_test_session(text) to anon, authenticated;
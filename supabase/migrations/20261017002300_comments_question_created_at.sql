@@ -0,0 +1,4 @@
+-- Comments are loaded per question, newest first, one keyset page at a time
+-- (`question_id = ? ORDER BY created_at DESC, id DESC` with a (created_at, id)
+-- cursor), and the Question Bank only asks for per-question counts.
+create index if not exists comments_question_id_created_at_idx on public.comments (question_id, created_at, id);
@@ -0,0 +1,51 @@
+-- Indexed search over question, a_answer, b_answer and additional_info for
+-- the Question Bank and Edit Questions. Whole words are matched against a
+-- weighted full-text document (question > answers > additional info), and
+-- partial words and typos against a trigram index of the same text. Both are
+-- expression indexes, so the questions table keeps its columns and the
+-- indexes are maintained by Postgres on every write.
+create extension if not exists pg_trgm;
+
+create or replace function public.question_search_document(question text, a_answer text, b_answer text, additional_info text)
+returns tsvector
+language sql
+immutable
+as $$
+    select setweight(to_tsvector('english', coalesce(question, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(a_answer, '') || ' ' || coalesce(b_answer, '')), 'B')
+        || setweight(to_tsvector('english', coalesce(additional_info, '')), 'C');
+$$;
+
+create or replace function public.question_search_text(question text, a_answer text, b_answer text, additional_info text)
+returns text
+language sql
+immutable
+as $$
+    select lower(concat_ws(' ', question, a_answer, b_answer, additional_info));
+$$;
+
+create index if not exists questions_search_document_idx on public.questions
+    using gin (public.question_search_document(question, a_answer, b_answer, additional_info));
+create index if not exists questions_search_text_trgm_idx on public.questions
+    using gin (public.question_search_text(question, a_answer, b_answer, additional_info) gin_trgm_ops);
+
+-- Best matches first. Runs as the caller, so row level security still applies.
+create or replace function public.search_questions(query text, statuses text[] default null, max_results integer default 25, skip integer default 0)
+returns setof public.questions
+language sql
+stable
+as $$
+    select q.*
+    from public.questions q,
+         websearch_to_tsquery('english', query) as terms,
+         lower(trim(query)) as phrase
+    where (statuses is null or q.status = any(statuses))
+      and (public.question_search_document(q.question, q.a_answer, q.b_answer, q.additional_info) @@ terms
+           or phrase <% public.question_search_text(q.question, q.a_answer, q.b_answer, q.additional_info))
+    order by ts_rank_cd(public.question_search_document(q.question, q.a_answer, q.b_answer, q.additional_info), terms)
+             + word_similarity(phrase, public.question_search_text(q.question, q.a_answer, q.b_answer, q.additional_info)) desc,
+             q.id desc
+    limit max_results offset skip;
+$$;
+
+grant execute on function public.search_questions(text, text[], integer, integer) to anon, authenticated;
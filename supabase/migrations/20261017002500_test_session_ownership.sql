@@ -0,0 +1,79 @@
+-- Test checkpoints belong to whoever holds the session token in the URL.
+-- The token itself is never stored: a row's id is the SHA-256 of the token,
+-- and the functions derive that key from the token they are given, so a
+-- caller can only read or overwrite its own checkpoint. Tokens must be long
+-- enough not to be guessed.
+--
+-- Checkpoints are also bounded: at most 100 per call, size limits on every
+-- column, finished tests deleted instead of stored, and unfinished ones
+-- expiring after 7 days (pruned on every save, ignored on load).
+create or replace function public.test_session_key(token text)
+returns text
+language sql
+immutable
+as $$
+    select encode(sha256(convert_to(token, 'UTF8')), 'hex');
+$$;
+
+-- Existing rows are keyed on the raw token
+update public.test_sessions set id = public.test_session_key(id) where length(id) <> 64;
+
+alter table public.test_sessions add constraint test_sessions_size check (
+    length(question_set) <= 64
+    and length(answers) <= 5000
+    and length(coalesce(question_order, '')) <= 40000
+    and position between 0 and 5000
+);
+
+create or replace function public.save_test_sessions(sessions jsonb)
+returns void
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if jsonb_typeof(sessions) <> 'array' or jsonb_array_length(sessions) > 100 then
+        raise exception 'save_test_sessions takes an array of at most 100 sessions';
+    end if;
+    if exists (
+        select 1 from jsonb_to_recordset(sessions) as s(id text)
+        where s.id is null or length(s.id) not between 16 and 128
+    ) then
+        raise exception 'Invalid test session token';
+    end if;
+
+    delete from test_sessions where updated_at < now() - interval '7 days';
+
+    delete from test_sessions
+    where id in (
+        select test_session_key(s.id) from jsonb_to_recordset(sessions) as s(id text, finished boolean)
+        where s.finished
+    );
+
+    insert into test_sessions (id, question_set, answers, question_order, position, adaptive, finished, updated_at)
+    select test_session_key(id), question_set, answers, question_order, position, adaptive, false, now()
+    from jsonb_to_recordset(sessions) as s(
+        id text, question_set text, answers text, question_order text,
+        position integer, adaptive boolean, finished boolean
+    )
+    where not coalesce(s.finished, false)
+    on conflict (id) do update set
+        question_set = excluded.question_set,
+        answers = excluded.answers,
+        question_order = excluded.question_order,
+        position = excluded.position,
+        adaptive = excluded.adaptive,
+        updated_at = excluded.updated_at;
+end;
+$$;
+
+create or replace function public.load_test_session(session_id text)
+returns setof public.test_sessions
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select * from test_sessions
+    where id = test_session_key(session_id) and updated_at >= now() - interval '7 days';
+$$;
@@ -0,0 +1,5 @@
+-- Deletion tombstones hold only a question id and a time, and the app's
+-- shared anon client needs them to drop deleted questions from its
+-- near-duplicate index when no service role key is configured.
+create policy "Anyone can read question deletions" on public.question_deletions
+    for select to anon using (true);
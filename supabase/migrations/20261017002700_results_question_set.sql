@@ -0,0 +1,5 @@
+-- The question set a result was scored against, as the app's fingerprint of
+-- the approved question ids. question_set_version was the app process's own
+-- counter, which restarts at 0 and differs between processes, so it can't
+-- tell rescore.py which results need re-scoring; it is no longer written.
+alter table public.results add column if not exists question_set text;
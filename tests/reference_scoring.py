@@ -0,0 +1,278 @@
+# The scoring code app.py used before scoring.py, kept verbatim as the
+# reference the vectorized engine is tested against. Don't "fix" it: the
+# J/P block still raises UnboundLocalError when there are no T/F/N/S scores.
+
+
+def score_answers(questions, user_answers):
+    # The per-answer loop from the "Finish Test" button
+    scores = {
+        "Fe": 0, "Fi": 0, "Ne": 0, "Ni": 0,
+        "Se": 0, "Si": 0, "Te": 0, "Ti": 0,
+        "F": 0, "T": 0, "N": 0, "S": 0
+    }
+    attitude_scores = {"i": 0, "e": 0}
+
+    for i, answer in user_answers.items():
+        q = questions[i]
+        functions_to_score = []
+
+        if answer == "Both":
+            functions_to_score.append(q['a_function'])
+            functions_to_score.append(q['b_function'])
+        elif answer.startswith("A:"):
+            functions_to_score.append(q['a_function'])
+        elif answer.startswith("B:"):
+            functions_to_score.append(q['b_function'])
+
+        # Process the scoring
+        for func in functions_to_score:
+            if not func: continue # Skip if function is empty string or None
+
+            # Score the specific function (e.g., Fe, Ni, or F, N)
+            if func in scores:
+                scores[func] += 1
+
+            # If it's a detailed function (Fe, Ni), score the general one too (F, N)
+            if len(func) > 1 and func[0] in scores:
+                scores[func[0]] += 1
+
+            # Score attitude (i vs e) for within_functions questions
+            if q.get('question_dimension') == 'within_functions' and len(func) > 1:
+                attitude = func[1]
+                if attitude in attitude_scores:
+                    attitude_scores[attitude] += 1
+    return scores, attitude_scores
+
+
+def calculate_mbti_analysis(scores, attitude_scores):
+    analysis = {}
+    mbti_type = ""
+    total_strength = 0
+    preference_count = 0
+
+    def get_strength_label(strength_val):
+        if strength_val > 0.75:
+            return "Strong"
+        elif strength_val > 0.60:
+            return "Moderate"
+        else:
+            return "Weak"
+
+    # I/E
+    i_score = attitude_scores.get('i', 0)
+    e_score = attitude_scores.get('e', 0)
+    total_ie = i_score + e_score
+    if total_ie > 0:
+        i_percent = i_score / total_ie
+        e_percent = e_score / total_ie
+        preference = 'I' if i_percent > e_percent else 'E'
+        strength = abs(i_percent - e_percent)
+        analysis['I/E'] = {
+            'positive': 'Introversion',
+            'negative': 'Extraversion',
+            'opposite': 'E',
+            'percentage': i_percent,
+            'preference': preference,
+            'strength': f"{strength:.0%}",
+            'strength_label': get_strength_label(max(i_percent, e_percent))
+        }
+        mbti_type += preference
+        total_strength += max(i_percent, e_percent)
+        preference_count += 1
+
+    # N/S
+    n_score = scores.get('N', 0)
+    s_score = scores.get('S', 0)
+    total_ns = n_score + s_score
+    if total_ns > 0:
+        n_percent = n_score / total_ns
+        s_percent = s_score / total_ns
+        preference = 'N' if n_percent > s_percent else 'S'
+        strength = abs(n_percent - s_percent)
+        analysis['N/S'] = {
+            'positive': 'Intuition',
+            'negative': 'Sensing',
+            'opposite': 'S',
+            'percentage': n_percent,
+            'preference': preference,
+            'strength': f"{strength:.0%}",
+            'strength_label': get_strength_label(max(n_percent, s_percent))
+        }
+        mbti_type += preference
+        total_strength += max(n_percent, s_percent)
+        preference_count += 1
+
+    # T/F
+    t_score = scores.get('T', 0)
+    f_score = scores.get('F', 0)
+    total_tf = t_score + f_score
+    if total_tf > 0:
+        t_percent = t_score / total_tf
+        f_percent = f_score / total_tf
+        preference = 'T' if t_percent > f_percent else 'F'
+        strength = abs(t_percent - f_percent)
+        analysis['T/F'] = {
+            'positive': 'Thinking',
+            'negative': 'Feeling',
+            'opposite': 'F',
+            'percentage': t_percent,
+            'preference': preference,
+            'strength': f"{strength:.0%}",
+            'strength_label': get_strength_label(max(t_percent, f_percent))
+        }
+        mbti_type += preference
+        total_strength += max(t_percent, f_percent)
+        preference_count += 1
+
+    # J/P
+    # Determine the dominant function from all detailed functions
+    all_functions = {
+        'Te': scores.get('Te', 0), 'Ti': scores.get('Ti', 0),
+        'Fe': scores.get('Fe', 0), 'Fi': scores.get('Fi', 0),
+        'Ne': scores.get('Ne', 0), 'Ni': scores.get('Ni', 0),
+        'Se': scores.get('Se', 0), 'Si': scores.get('Si', 0)
+    }
+    
+    # Find the function with the highest score
+    # In case of a tie, the first one encountered will be chosen, which is an acceptable simplification
+    dominant_function = max(all_functions, key=all_functions.get)
+
+    # Determine J/P based on the dominant function's type (Rational/Judging vs. Irrational/Perceiving)
+    # Rational/Judging functions: T and F
+    # Irrational/Perceiving functions: N and S
+    if dominant_function[0] in ['T', 'F']:
+        preference = 'J'
+    else: # N or S
+        preference = 'P'
+
+    # Calculate a 'strength' for J/P based on the dominance of that function type
+    judging_score = scores.get('T', 0) + scores.get('F', 0)
+    perceiving_score = scores.get('N', 0) + scores.get('S', 0)
+    total_jp = judging_score + perceiving_score
+
+    if total_jp > 0:
+        j_percent = judging_score / total_jp
+        p_percent = perceiving_score / total_jp
+        jp_strength = abs(j_percent - p_percent)
+        percentage = j_percent
+    else:
+        jp_strength = 0
+        percentage = 0.5 # Default to neutral if no scores
+
+    analysis['J/P'] = {
+        'positive': 'Judging',
+        'negative': 'Perceiving',
+        'opposite': 'P' if preference == 'J' else 'J',
+        'percentage': percentage,
+        'preference': preference,
+        'strength': f"{jp_strength:.0%}",
+        'strength_label': get_strength_label(max(j_percent, p_percent))
+    }
+    mbti_type += preference
+    total_strength += max(j_percent, p_percent)
+    preference_count += 1
+
+    # Overall strength
+    overall_strength_value = total_strength / preference_count if preference_count > 0 else 0
+    analysis['overall_strength'] = get_strength_label(overall_strength_value)
+    analysis['mbti_type'] = mbti_type
+
+    return analysis
+
+def calculate_cognitive_profile(scores):
+    profile = {}
+    
+    # Detailed function scores
+    detailed_scores = {
+        'Te': scores.get('Te', 0), 'Ti': scores.get('Ti', 0),
+        'Fe': scores.get('Fe', 0), 'Fi': scores.get('Fi', 0),
+        'Ne': scores.get('Ne', 0), 'Ni': scores.get('Ni', 0),
+        'Se': scores.get('Se', 0), 'Si': scores.get('Si', 0)
+    }
+
+    # Primary function letter scores
+    primary_scores = {
+        'T': scores.get('T', 0),
+        'F': scores.get('F', 0),
+        'N': scores.get('N', 0),
+        'S': scores.get('S', 0)
+    }
+
+    if not any(primary_scores.values()):
+        return {"error": "Not enough data for cognitive profile."}
+
+    # 1. Determine Primary Function
+    primary_letter = max(primary_scores, key=primary_scores.get)
+    
+    # Determine if it's introverted or extroverted
+    func1 = f"{primary_letter}e"
+    func2 = f"{primary_letter}i"
+    
+    # Handle cases where one of the detailed functions might not be in the scores
+    score1 = detailed_scores.get(func1, 0)
+    score2 = detailed_scores.get(func2, 0)
+
+    primary_function = func1 if score1 >= score2 else func2
+    primary_attitude = primary_function[1]
+
+    # 2. Determine Secondary Function
+    secondary_letter = ''
+    if primary_letter in ['T', 'F']: # Judging
+        secondary_letter = 'N' if primary_scores.get('N', 0) >= primary_scores.get('S', 0) else 'S'
+    else: # Perceiving
+        secondary_letter = 'T' if primary_scores.get('T', 0) >= primary_scores.get('F', 0) else 'F'
+        
+    secondary_attitude = 'e' if primary_attitude == 'i' else 'i'
+    secondary_function = f"{secondary_letter}{secondary_attitude}"
+
+    # 3. Determine Inferior Function
+    inferior_map = {
+        'Ti': 'Fe', 'Te': 'Fi', 'Fi': 'Te', 'Fe': 'Ti',
+        'Ni': 'Se', 'Ne': 'Si', 'Si': 'Ne', 'Se': 'Ni'
+    }
+    inferior_function = inferior_map.get(primary_function)
+
+    # 4. Determine Strength
+    def get_strength_label(score, total):
+        if total == 0:
+            return "Weak"
+        strength_val = score / total
+        if strength_val > 0.75:
+            return "Strong"
+        elif strength_val > 0.60:
+            return "Moderate"
+        else:
+            return "Weak"
+
+    # Strength for Primary
+    primary_total = primary_scores.get(primary_letter, 0)
+    primary_specific_score = detailed_scores.get(primary_function, 0)
+    
+    # To calculate strength, we need a consistent denominator.
+    # Let's use the sum of the two detailed functions of that type.
+    primary_pair_total = detailed_scores.get(func1, 0) + detailed_scores.get(func2, 0)
+    primary_strength = get_strength_label(primary_specific_score, primary_pair_total)
+
+    # Strength for Secondary
+    sec_func1 = f"{secondary_letter}e"
+    sec_func2 = f"{secondary_letter}i"
+    secondary_specific_score = detailed_scores.get(secondary_function, 0)
+    secondary_pair_total = detailed_scores.get(sec_func1, 0) + detailed_scores.get(sec_func2, 0)
+    secondary_strength = get_strength_label(secondary_specific_score, secondary_pair_total)
+
+    # Strength for Inferior
+    inf_func1 = f"{inferior_function[0]}e"
+    inf_func2 = f"{inferior_function[0]}i"
+    inferior_specific_score = detailed_scores.get(inferior_function, 0)
+    inferior_pair_total = detailed_scores.get(inf_func1, 0) + detailed_scores.get(inf_func2, 0)
+    inferior_strength = get_strength_label(inferior_specific_score, inferior_pair_total)
+
+
+    profile = {
+        "primary": {"function": primary_function, "strength": primary_strength},
+        "secondary": {"function": secondary_function, "strength": secondary_strength},
+        "inferior": {"function": inferior_function, "strength": inferior_strength},
+        "profile_string": f"{primary_function}-{secondary_function}-{inferior_function}"
+    }
+
+    return profile
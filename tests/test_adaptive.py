@@ -0,0 +1,89 @@
+# The adaptive selector's decisions, question choice and stopping rule.
+
+import math
+
+import numpy as np
+
+import adaptive
+import scoring
+
+
+def test_erf_approximation():
+    x = np.linspace(-6, 6, 2001)
+    assert np.max(np.abs(adaptive._erf(x) - [math.erf(v) for v in x])) < 2e-7
+
+def test_jp_follows_dominant_function():
+    # Letter totals favour P (N = 6 against T = 5), but the top detailed
+    # function is Te, so the results page reports J
+    scores = dict.fromkeys(scoring.SCORE_KEYS, 0)
+    scores.update(Te=5, T=5, Ne=3, Ni=3, N=6)
+    assert scoring.calculate_mbti_analysis(scores, {"i": 0, "e": 0})["J/P"]["preference"] == "J"
+
+    state = np.array([scores[key] for key in scoring.SCORE_KEYS] + [0, 0], dtype=np.float64)
+    judging = state[adaptive.JUDGING_COLUMNS].max()
+    perceiving = state[adaptive.PERCEIVING_COLUMNS].max()
+    assert (judging, perceiving) == (5, 3)
+    # The J/P decision is the one after the fixed I/E, N/S and T/F decisions
+    confidence = adaptive.decision_confidences(state[None, :])[0, len(adaptive.FIXED_DECISIONS)]
+    assert confidence == adaptive.decision_confidence(np.array([5.0]), np.array([3.0]))[0]
+
+# A small fixed bank: twelve questions that settle every decision except
+# T/F (A = Ni each time), then candidates for the next question
+def question(question_id, a_function, b_function, dimension="within_functions"):
+    return {"id": question_id, "a_function": a_function, "b_function": b_function, "question_dimension": dimension}
+
+SETTLED = 12
+BANK = ([question(i, "Ni", "Se") for i in range(SETTLED)] + [
+    question(SETTLED, "Ti", "Fi"),                           # decides T/F
+    question(SETTLED + 1, "Ne", "Se", "between_functions"),  # N/S, already settled
+    question(SETTLED + 2, "Ni", "Si"),
+    question(SETTLED + 3, "Ni", "Ni"),
+] + [question(SETTLED + 4 + i, "Ti", "Fi") for i in range(6)])
+SETTLED_ANSWERS = {i: "A: intuition" for i in range(SETTLED)}
+
+def confidences(selector, user_answers):
+    return adaptive.decision_confidences(selector.state(user_answers)[None, :])[0]
+
+def test_next_question_targets_the_undecided_decision():
+    selector = adaptive.AdaptiveSelector(BANK, min_questions=1)
+    # Only T/F (the third decision) is open
+    assert [round(c, 3) for c in confidences(selector, SETTLED_ANSWERS)] == [1, 1, 0.5, 1, 1, 1]
+
+    gain = selector.information_gain(SETTLED_ANSWERS)
+    assert gain[SETTLED] > 0.1
+    assert np.all(gain[SETTLED + 1:SETTLED + 4] < 0.01)
+    assert selector.next_question(SETTLED_ANSWERS, set(SETTLED_ANSWERS)) == SETTLED
+
+def test_asked_questions_are_never_picked_again():
+    selector = adaptive.AdaptiveSelector(BANK)
+    asked, user_answers = [], {}
+    while (index := selector.next_question(user_answers, asked)) is not None:
+        assert index not in asked
+        asked.append(index)
+        user_answers[index] = "B: sensing" if len(asked) % 3 else "Neither"
+    assert sorted(asked) == list(range(len(BANK)))
+
+    partial = list(range(len(BANK) - 1))
+    assert selector.next_question({i: "A: x" for i in partial}, partial) == len(BANK) - 1
+
+def test_should_stop_once_every_decision_is_confident():
+    selector = adaptive.AdaptiveSelector(BANK, min_questions=1, confidence_threshold=0.9)
+    user_answers = dict(SETTLED_ANSWERS)
+    assert not selector.should_stop(user_answers)
+
+    stopped_at = None
+    for index in [SETTLED] + list(range(SETTLED + 4, len(BANK))):
+        user_answers[index] = "A: thinking"
+        confident = bool(np.all(confidences(selector, user_answers) >= 0.9))
+        assert selector.should_stop(user_answers) == confident
+        assert selector.should_stop(user_answers, selector.confidence(user_answers)) == confident
+        if confident and stopped_at is None:
+            stopped_at = len(user_answers)
+    # T/F passes 0.9 on the second T answer, not the first
+    assert stopped_at == SETTLED + 2
+
+def test_should_stop_waits_for_min_questions():
+    selector = adaptive.AdaptiveSelector(BANK, min_questions=len(BANK) - 1)
+    user_answers = {**SETTLED_ANSWERS, SETTLED: "A: thinking", SETTLED + 4: "A: thinking"}
+    assert selector.confidence(user_answers) >= selector.confidence_threshold
+    assert not selector.should_stop(user_answers)
@@ -0,0 +1,118 @@
+# item_analysis.run_analysis against the SQLite backend.
+
+import math
+from datetime import timedelta
+
+import pytest
+
+import item_analysis
+from sqlite_repository import SQLiteDatabase, SQLiteRepository
+
+# Results in these tests were all created just now
+SETTLED = timedelta(0)
+
+
+def add_result(repository, answers):
+    repository.insert_results([{"answers": answers, "scores": {}, "attitude_scores": {}}])
+
+def run_analysis(repository, **kwargs):
+    return item_analysis.run_analysis(repository, lag=SETTLED, **kwargs)
+
+def test_incremental_runs_add_up_to_a_full_run():
+    repository = SQLiteRepository(SQLiteDatabase(), service=True)
+    repository.insert_questions([{"question": f"Question {i}", "a_function": "Ne", "b_function": "Si"} for i in range(3)])
+    first, second, third = [row["id"] for row in repository.questions_after(None, 10)]
+
+    add_result(repository, {str(first): "A", str(second): "B"})
+    assert run_analysis(repository) == 1
+    add_result(repository, {str(first): "Both", str(third): "Neither"})
+    assert run_analysis(repository) == 1
+    incremental = {row["question_id"]: row for row in repository.question_stats()}
+    assert incremental[first]["responses"] == 2
+    assert incremental[first]["a_count"] == 1 and incremental[first]["both_count"] == 1
+
+    assert run_analysis(repository, full=True) == 2
+    full = {row["question_id"]: row for row in repository.question_stats()}
+    assert {question_id: {c: row[c] for c in item_analysis.STAT_COLUMNS} for question_id, row in full.items()} == \
+           {question_id: {c: row[c] for c in item_analysis.STAT_COLUMNS} for question_id, row in incremental.items()}
+
+def test_full_run_drops_questions_without_responses():
+    repository = SQLiteRepository(SQLiteDatabase(), service=True)
+    repository.insert_questions([{"question": f"Question {i}", "a_function": "Te", "b_function": "Fi"} for i in range(2)])
+    answered, dropped = [row["id"] for row in repository.questions_after(None, 10)]
+    add_result(repository, {str(answered): "A", str(dropped): "B"})
+    run_analysis(repository)
+    assert {row["question_id"] for row in repository.question_stats()} == {answered, dropped}
+
+    # The only result answering `dropped` is gone
+    repository.database.execute("delete from results")
+    add_result(repository, {str(answered): "B"})
+    run_analysis(repository, full=True)
+    assert [(row["question_id"], row["responses"]) for row in repository.question_stats()] == [(answered, 1)]
+
+def test_item_total_correlation_leaves_out_the_item_itself():
+    repository = SQLiteRepository(SQLiteDatabase(), service=True)
+    repository.insert_questions([{"question": f"Question {i}", "a_function": "Ne", "b_function": "Si"} for i in range(3)])
+    first, second, third = [row["id"] for row in repository.questions_after(None, 10)]
+    for answers in [("A", "A", "A"), ("A", "A", "B"), ("B", "B", "A"), ("B", "B", "B"), ("Both", "B", "B")]:
+        add_result(repository, dict(zip(map(str, [first, second, third]), answers)))
+    run_analysis(repository)
+    stats = {row["question_id"]: row for row in repository.question_stats()}[first]
+
+    # Option A of the first question (x: took A) against Ne from the other
+    # two questions only (y): x = 1 1 0 0 1, y = 2 1 1 0 0
+    assert (stats["a_sum_y"], stats["a_sum_yy"], stats["a_sum_xy"]) == (4, 6, 3)
+    # Option B (x: took B) against Si from the other two: x = 0 0 1 1 1, y = 0 1 1 2 2
+    assert (stats["b_sum_y"], stats["b_sum_yy"], stats["b_sum_xy"]) == (6, 10, 5)
+
+    derived = item_analysis.derived_stats(stats)
+    assert (derived["responses"], derived["a_rate"], derived["both_rate"]) == (5, 0.4, 0.2)
+    # r = (n sum_xy - sum_x sum_y) / sqrt(sum_x (n - sum_x) (n sum_yy - sum_y^2))
+    assert derived["a_item_total_r"] == pytest.approx((5 * 3 - 3 * 4) / math.sqrt(3 * 2 * (5 * 6 - 4 * 4)))
+    assert derived["b_item_total_r"] == pytest.approx((5 * 5 - 3 * 6) / math.sqrt(3 * 2 * (5 * 10 - 6 * 6)))
+
+def test_correlation_is_undefined_for_constant_sides():
+    assert item_analysis.correlation(1, 1, 2, 4, 2) is None
+    # Everyone chose the option
+    assert item_analysis.correlation(3, 3, 6, 14, 6) is None
+    # Every total is the same
+    assert item_analysis.correlation(3, 1, 6, 12, 2) is None
+    assert item_analysis.derived_stats({"responses": 0}) == {}
+
+class CappedRepository:
+    # Returns at most `cap` rows per paged read, like a server with a row limit
+    def __init__(self, repository, cap):
+        self.repository = repository
+        self.cap = cap
+
+    def results_after(self, after_id, limit):
+        return self.repository.results_after(after_id, min(limit, self.cap))
+
+    def question_stats_after(self, after_question_id, limit):
+        return self.repository.question_stats_after(after_question_id, min(limit, self.cap))
+
+    def __getattr__(self, name):
+        return getattr(self.repository, name)
+
+def test_incremental_runs_page_past_a_server_row_limit():
+    repository = SQLiteRepository(SQLiteDatabase(), service=True)
+    repository.insert_questions([{"question": f"Question {i}", "a_function": "Fe", "b_function": "Ti"} for i in range(5)])
+    ids = [str(row["id"]) for row in repository.questions_after(None, 10)]
+    capped = CappedRepository(repository, 2)
+    for _ in range(3):
+        add_result(repository, dict.fromkeys(ids, "A"))
+    assert run_analysis(capped) == 3
+    add_result(repository, dict.fromkeys(ids, "B"))
+    assert run_analysis(capped) == 1
+    # Every question kept the totals of the first run
+    assert {row["question_id"]: (row["a_count"], row["b_count"]) for row in repository.question_stats()} == \
+           {int(question_id): (3, 1) for question_id in ids}
+
+def test_recent_results_wait_for_the_next_run():
+    repository = SQLiteRepository(SQLiteDatabase(), service=True)
+    repository.insert_questions([{"question": "Question", "a_function": "Fe", "b_function": "Ti"}])
+    question_id = str(repository.questions_after(None, 1)[0]["id"])
+    add_result(repository, {question_id: "A"})
+    assert item_analysis.run_analysis(repository) == 0
+    repository.database.execute("update results set created_at = '2000-01-01T00:00:00.000+00:00'")
+    assert item_analysis.run_analysis(repository) == 1
@@ -0,0 +1,87 @@
+# The metrics registry's Prometheus output, payload size estimates and
+# backend instrumentation.
+
+import json
+
+import pytest
+
+import metrics
+from metrics import InstrumentedRepository, MetricsRegistry
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    for seconds in [0.05, 0.5, 0.5, 3.0]:
+        registry.observe("backend", "questions_after", seconds, rows=10)
+    registry.observe("backend", "questions_after", 0.05, error=True)
+
+    lines = registry.render_prometheus().splitlines()
+    labels = 'kind="backend",span="questions_after"'
+    assert f'openjung_span_seconds_bucket{{{labels},le="0.1"}} 2' in lines
+    assert f'openjung_span_seconds_bucket{{{labels},le="1.0"}} 4' in lines
+    # +Inf is every observation, including those above the last bound
+    assert f'openjung_span_seconds_bucket{{{labels},le="+Inf"}} 5' in lines
+    assert f"openjung_span_seconds_count{{{labels}}} 5" in lines
+    assert f"openjung_span_seconds_sum{{{labels}}} 4.100000" in lines
+    assert f"openjung_span_errors_total{{{labels}}} 1" in lines
+    assert f"openjung_span_rows_total{{{labels}}} 40" in lines
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry(buckets=(1.0,))
+    registry.observe("render", 'page:"Edit"\\Questions\nnext', 0.5)
+    assert 'span="page:\\"Edit\\"\\\\Questions\\nnext"' in registry.render_prometheus()
+    assert metrics.escape_label('a"b\\c\nd') == 'a\\"b\\\\c\\nd'
+
+def test_result_size_scales_a_sample(monkeypatch):
+    encoded = []
+    def dumps(item, **kwargs):
+        encoded.append(item)
+        return json.JSONEncoder(**kwargs).encode(item)
+    monkeypatch.setattr(metrics.json, "dumps", dumps)
+
+    rows = [{"id": i, "question": "x" * 20} for i in range(100, 200)]
+    assert metrics.result_size(rows) == (100, len(json.JSONEncoder().encode(rows[0])) * 100)
+    assert len(encoded) == metrics.PAYLOAD_SAMPLE_ROWS
+    # Evenly spaced rows, not the first few
+    assert [row["id"] for row in encoded] == [100, 125, 150, 175]
+
+def test_result_size_shapes():
+    rows = [{"id": 1}, {"id": 2}]
+    assert metrics.result_size((rows, 2)) == (2, 2 * len(json.dumps({"id": 1})))
+    assert metrics.result_size({1: {"id": 1}}) == (1, len(json.dumps({"id": 1})))
+    assert metrics.result_size([]) == (0, 2)
+    assert metrics.result_size(None) == (None, None)
+    assert metrics.result_size(42) == (None, None)
+    # Rows that can't be encoded are still counted
+    assert metrics.result_size([{(1, 2): "tuple key"}]) == (1, None)
+
+class FakeRepository:
+    def questions_after(self, after_id, limit):
+        return [{"id": after_id + 1}]
+
+    def delete_question(self, question_id):
+        raise PermissionError("moderators only")
+
+@pytest.fixture
+def trace(monkeypatch):
+    monkeypatch.setattr(metrics._local, "trace", None, raising=False)
+    return metrics.start_trace()
+
+def backend_series(name):
+    return metrics.registry.snapshot().get(("backend", name), {"count": 0, "errors": 0, "rows": 0})
+
+def test_instrumented_calls_are_recorded(trace):
+    before = backend_series("questions_after")
+    assert InstrumentedRepository(FakeRepository()).questions_after(1, 10) == [{"id": 2}]
+    after = backend_series("questions_after")
+    assert (after["count"] - before["count"], after["rows"] - before["rows"]) == (1, 1)
+    assert [(span["name"], span["rows"], span["error"]) for span in trace.spans] == [("questions_after", 1, None)]
+
+def test_instrumented_errors_are_recorded_and_reraised(trace):
+    before = backend_series("delete_question")
+    with pytest.raises(PermissionError):
+        InstrumentedRepository(FakeRepository()).delete_question(1)
+    after = backend_series("delete_question")
+    assert (after["count"] - before["count"], after["errors"] - before["errors"]) == (1, 1)
+    assert [(span["name"], span["error"]) for span in trace.spans] == [
+        ("delete_question", "PermissionError: moderators only")]
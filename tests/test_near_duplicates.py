@@ -0,0 +1,51 @@
+# The near-duplicate index and its sync from another process's writes.
+
+import time
+
+from near_duplicates import DuplicateIndex, SyncedDuplicateIndex, question_text
+from sqlite_repository import SQLiteDatabase, SQLiteRepository
+
+QUESTION = {"question": "Do you prefer planning your weekend in advance?",
+            "a_answer": "I plan every hour", "b_answer": "I decide on the day"}
+REWORDED = {"question": "Do you prefer planning your weekends in advance?",
+            "a_answer": "I plan every hour", "b_answer": "I decide on the day"}
+UNRELATED = {"question": "Which colour is the sky at noon on a clear day?",
+             "a_answer": "Blue", "b_answer": "Grey"}
+
+
+def test_matches_rewordings_only():
+    index = DuplicateIndex()
+    index.add({"id": 1, **QUESTION})
+    index.add({"id": 2, **UNRELATED})
+    matches = index.matches(question_text(REWORDED))
+    assert [row["id"] for row, _ in matches] == [1]
+    assert matches[0][1] > 0.8
+    assert index.matches(question_text(QUESTION), exclude=1) == []
+
+def test_add_replaces_and_remove_forgets():
+    index = DuplicateIndex()
+    index.add({"id": 1, **QUESTION})
+    index.add({"id": 1, **UNRELATED})
+    assert len(index) == 1
+    assert index.matches(question_text(QUESTION)) == []
+    assert [row["id"] for row, _ in index.matches(question_text(UNRELATED))] == [1]
+    index.remove(1)
+    index.remove(1)
+    assert len(index) == 0 and index.buckets == {}
+
+def test_sync_applies_writes_from_another_process(tmp_path):
+    path = str(tmp_path / "app.db")
+    other_process = SQLiteRepository(SQLiteDatabase(path))
+    kept = other_process.insert_question(QUESTION)["id"]
+    deleted = other_process.insert_question(UNRELATED)["id"]
+
+    synced = SyncedDuplicateIndex(SQLiteRepository(SQLiteDatabase(path)), sync_interval=0)
+    assert len(synced.current()) == 2
+    # Timestamps have millisecond precision
+    time.sleep(0.01)
+    other_process.delete_question(deleted)
+    other_process.update_question(kept, UNRELATED)
+
+    index = synced.current()
+    assert set(index.rows) == {kept}
+    assert [row["id"] for row, _ in index.matches(question_text(UNRELATED))] == [kept]
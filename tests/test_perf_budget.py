@@ -0,0 +1,103 @@
+# Cold-start and per-rerun time budgets for app.py.
+#
+#   RUN_PERF_BUDGET=1 python -m pytest tests/test_perf_budget.py
+#
+# Runs the app headless with Streamlit's AppTest against a throwaway SQLite
+# database. The cold start is measured in a fresh interpreter (imports,
+# client creation and the first Home page run). Reruns of the Home and Take
+# Test pages are measured once the caches are warm, with the app's own
+# "rerun" span from metrics.py: AppTest polls for the script to finish, which
+# adds far more wall-clock time than the script itself takes. The Home page must not
+# load the charting/scoring libraries. Timings depend on the machine, so
+# these tests only run when RUN_PERF_BUDGET is set; PERF_COLD_START_MS and
+# PERF_RERUN_MS override the budgets.
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+import pytest
+
+import metrics
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+COLD_START_MS = float(os.environ.get("PERF_COLD_START_MS", 3000))
+RERUN_MS = float(os.environ.get("PERF_RERUN_MS", 250))
+RERUNS = 20
+
+# Libraries that only pages rendering charts, dataframes or scores may load
+HEAVY_MODULES = ["pandas", "altair", "numpy"]
+
+pytestmark = pytest.mark.skipif(not os.environ.get("RUN_PERF_BUDGET"), reason="set RUN_PERF_BUDGET=1 to check the time budgets")
+
+# Runs in a child interpreter so nothing is imported or cached yet
+COLD_START_CHILD = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=60)
+at.secrets["DATA_BACKEND"] = "sqlite"
+at.secrets["SQLITE_PATH"] = sys.argv[2]
+at.session_state["page"] = "Home"
+at.run()
+print(json.dumps({
+    "cold_start_ms": (time.perf_counter() - started) * 1000,
+    "heavy_modules": [name for name in sys.argv[3:] if name in sys.modules],
+    "exception": [e.message for e in at.exception],
+}))
+"""
+
+
+@pytest.fixture(scope="module")
+def database_path(tmp_path_factory):
+    from sqlite_repository import SQLiteDatabase, SQLiteRepository
+    path = str(tmp_path_factory.mktemp("perf") / "app.db")
+    database = SQLiteDatabase(path)
+    SQLiteRepository(database, service=True).insert_questions([
+        {"question": f"Question {i}", "a_answer": "A", "b_answer": "B", "a_function": "Fe", "b_function": "Ti",
+         "question_dimension": "between_functions", "question_type": "self_reported", "status": "approved"}
+        for i in range(40)
+    ])
+    database.close()
+    return path
+
+@pytest.fixture(scope="module")
+def cold_start(database_path):
+    child = subprocess.run([sys.executable, "-c", COLD_START_CHILD, APP_PATH, database_path, *HEAVY_MODULES],
+                           capture_output=True, text=True, check=False)
+    assert child.returncode == 0, child.stderr
+    result = json.loads(child.stdout.strip().splitlines()[-1])
+    assert not result["exception"]
+    return result
+
+def rerun_seconds():
+    return metrics.registry.snapshot().get(("app", "rerun"), {"seconds": 0.0})["seconds"]
+
+def rerun_timings(database_path, page):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    at.secrets["DATA_BACKEND"] = "sqlite"
+    at.secrets["SQLITE_PATH"] = database_path
+    at.session_state["page"] = page
+    at.run()
+    assert not at.exception, f"{page} page raised: {at.exception[0].message}"
+    timings = []
+    for _ in range(RERUNS):
+        before = rerun_seconds()
+        at.run()
+        timings.append((rerun_seconds() - before) * 1000)
+    return timings
+
+
+def test_cold_start(cold_start):
+    assert cold_start["cold_start_ms"] <= COLD_START_MS
+
+def test_home_loads_no_heavy_modules(cold_start):
+    assert cold_start["heavy_modules"] == []
+
+@pytest.mark.parametrize("page", ["Home", "Take Test"])
+def test_rerun_median(database_path, page):
+    p50 = statistics.median(rerun_timings(database_path, page))
+    assert p50 <= RERUN_MS, f"{page} rerun p50 {p50:.0f} ms > {RERUN_MS:.0f} ms"
@@ -0,0 +1,92 @@
+# question_io validation, import batching and export paging.
+
+import io
+import json
+
+import question_io
+
+
+def valid_row(**fields):
+    return {"question": "Do you plan ahead?", "a_answer": "Always", "b_answer": "Rarely",
+            "a_function": "Ni", "b_function": "Se", "question_dimension": "between_functions",
+            "question_type": "self_reported", **fields}
+
+def jsonl(*rows):
+    return io.BytesIO("".join(row if isinstance(row, str) else json.dumps(row) + "\n" for row in rows).encode())
+
+
+def test_validate_row_normalizes_and_fills_defaults():
+    clean, errors = question_io.validate_row(valid_row(id=" 7 ", a_function=" fE ", b_function="TI", question=" Why? "))
+    assert errors == []
+    assert clean["id"] == 7
+    assert (clean["a_function"], clean["b_function"]) == ("Fe", "Ti")
+    assert clean["question"] == "Why?"
+    assert (clean["status"], clean["additional_info"]) == ("draft", "")
+
+def test_validate_row_rejects_bad_values():
+    _, errors = question_io.validate_row(valid_row(
+        id="seven", a_function="Fx", question_dimension="sideways", question_type="quiz", status="live", b_answer=" "))
+    assert errors == [
+        "id 'seven' is not a number",
+        "b_answer is required",
+        f"a_function 'Fx' is not one of {', '.join(question_io.QUESTION_FUNCTIONS)}",
+        f"question_dimension 'sideways' is not one of {', '.join(question_io.QUESTION_DIMENSIONS)}",
+        f"question_type 'quiz' is not one of {', '.join(question_io.QUESTION_TYPES)}",
+        f"status 'live' is not one of {', '.join(question_io.QUESTION_STATUSES)}",
+    ]
+    assert question_io.validate_row(["not", "an", "object"]) == (None, ["expected an object"])
+
+def test_parse_import_reports_every_bad_line():
+    rows, errors = question_io.parse_import(jsonl(
+        valid_row(id=1), "\n", "{not json\n", valid_row(id=1), valid_row(question=""), valid_row()), "jsonl")
+    assert [row.get("id") for row in rows] == [1, None]
+    assert [line for line, _ in errors] == [3, 4, 5]
+    assert errors[0][1].startswith("invalid JSON")
+    assert errors[1][1] == "id 1 already appears on line 1"
+    assert errors[2][1] == "question is required"
+
+def test_parse_import_reads_csv():
+    header = ",".join(valid_row())
+    text = "\ufeff" + header + "\n" + ",".join(valid_row(a_function="ni").values()) + "\n"
+    rows, errors = question_io.parse_import(io.BytesIO(text.encode()), question_io.file_format_for("bank.CSV"))
+    assert errors == []
+    assert rows[0]["a_function"] == "Ni"
+
+
+class RecordingRepository:
+    def __init__(self, question_count=0, server_page_cap=None):
+        self.calls = []
+        self.questions = [{"id": i, **valid_row()} for i in range(1, question_count + 1)]
+        self.server_page_cap = server_page_cap
+
+    def upsert_questions(self, rows):
+        self.calls.append(("upsert", [row["id"] for row in rows]))
+
+    def insert_questions(self, rows):
+        self.calls.append(("insert", [row["question"] for row in rows]))
+        assert all(row.get("submitted_by") == "moderator" for row in rows)
+
+    def questions_after(self, after_id, limit):
+        limit = min(limit, self.server_page_cap or limit)
+        return [row for row in self.questions if after_id is None or row["id"] > after_id][:limit]
+
+def test_import_upserts_ids_then_inserts_new_rows_in_batches():
+    rows = [valid_row(id=i) for i in (1, 2, 3)] + [valid_row(question=f"New {i}") for i in range(4)]
+    rows, _ = question_io.parse_import(jsonl(*rows), "jsonl")
+    repository = RecordingRepository()
+    progress = []
+    written = question_io.import_questions(repository, rows, batch_size=2, submitted_by="moderator",
+                                           on_progress=lambda done, total: progress.append((done, total)))
+    assert written == 7
+    assert repository.calls == [
+        ("upsert", [1, 2]), ("upsert", [3]),
+        ("insert", ["New 0", "New 1"]), ("insert", ["New 2", "New 3"]),
+    ]
+    assert progress == [(2, 7), (3, 7), (5, 7), (7, 7)]
+
+def test_export_pages_past_a_server_cap():
+    # The server returns at most 3 rows however many are asked for
+    repository = RecordingRepository(question_count=8, server_page_cap=3)
+    out = io.StringIO()
+    assert question_io.export_questions(repository, out, "jsonl", page_size=5) == 8
+    assert [json.loads(line)["id"] for line in out.getvalue().splitlines()] == list(range(1, 9))
@@ -0,0 +1,77 @@
+# rescore.py end to end on a small JSONL export, including resuming.
+
+import json
+import random
+
+import pytest
+
+import rescore
+import scoring
+from tests.test_scoring import FUNCTIONS
+
+ANSWERS = ["A", "B", "Both", "Neither"]
+
+
+@pytest.fixture
+def export(tmp_path):
+    rng = random.Random(4)
+    questions = [{"id": 100 + i, "a_function": rng.choice(FUNCTIONS[:12]), "b_function": rng.choice(FUNCTIONS[:12]),
+                  "question_dimension": rng.choice(["within_functions", "between_functions"])} for i in range(12)]
+    responses = [{"id": n, "answers": {str(q["id"]): rng.choice(ANSWERS) for q in questions if rng.random() < 0.9}}
+                 for n in range(57)]
+    (tmp_path / "questions.json").write_text(json.dumps(questions))
+    (tmp_path / "responses.jsonl").write_text("".join(json.dumps(r) + "\n" for r in responses))
+    return tmp_path, questions, responses
+
+def run(tmp_path, *extra):
+    rescore.main(["--questions", str(tmp_path / "questions.json"), "--input", str(tmp_path / "responses.jsonl"),
+                  "--output", str(tmp_path / "out.jsonl"), "--workers", "1", "--batch-size", "10", *extra])
+    return (tmp_path / "out.jsonl").read_text()
+
+def expected_result(questions, response):
+    # The interactive "Finish Test" path on the same answers
+    user_answers = {i: response["answers"][str(q["id"])] for i, q in enumerate(questions)
+                    if str(q["id"]) in response["answers"]}
+    record = scoring.score_test(questions, user_answers)
+    return json.loads(json.dumps({
+        "id": response["id"],
+        "scores": record.scores_dict(),
+        "attitude_scores": record.attitudes_dict(),
+        "mbti_analysis": scoring.calculate_mbti_analysis(record),
+        "cognitive_profile": scoring.calculate_cognitive_profile(record),
+    }))
+
+
+def test_output_matches_scoring(export):
+    tmp_path, questions, responses = export
+    results = [json.loads(line) for line in run(tmp_path).splitlines()]
+    assert results == [expected_result(questions, response) for response in responses]
+
+def test_resume_drops_rows_written_after_the_checkpoint(export):
+    tmp_path, _, _ = export
+    complete = run(tmp_path)
+    lines = complete.splitlines(keepends=True)
+    # Interrupted after 20 checkpointed records, with one more whole row and
+    # half a row written but not checkpointed
+    (tmp_path / "out.jsonl").write_text("".join(lines[:21]) + lines[21][:15])
+    checkpoint = json.loads((tmp_path / "out.jsonl.checkpoint").read_text())
+    checkpoint.update(records_done=20, output_bytes=len("".join(lines[:20]).encode()))
+    (tmp_path / "out.jsonl.checkpoint").write_text(json.dumps(checkpoint))
+
+    assert run(tmp_path, "--resume") == complete
+    assert json.loads((tmp_path / "out.jsonl.checkpoint").read_text())["records_done"] == len(lines)
+
+def test_fresh_run_replaces_existing_output(export):
+    tmp_path, _, _ = export
+    complete = run(tmp_path)
+    (tmp_path / "out.jsonl").write_text(complete + "stale row\n")
+    assert run(tmp_path) == complete
+
+def test_checkpoint_for_other_files_is_refused(export):
+    tmp_path, _, _ = export
+    run(tmp_path)
+    checkpoint = json.loads((tmp_path / "out.jsonl.checkpoint").read_text())
+    checkpoint["input"] = str(tmp_path / "other.jsonl")
+    (tmp_path / "out.jsonl.checkpoint").write_text(json.dumps(checkpoint))
+    with pytest.raises(SystemExit):
+        run(tmp_path, "--resume")
@@ -0,0 +1,47 @@
+# score_sketches.build_sketches against the SQLite backend.
+
+from datetime import timedelta
+
+import score_sketches
+from sqlite_repository import SQLiteDatabase, SQLiteRepository
+
+LONG_AGO = "2000-01-01T00:00:00.000+00:00"
+
+
+class CappedRepository:
+    # Returns at most `cap` results per call, like a server with a row limit
+    def __init__(self, repository, cap):
+        self.repository = repository
+        self.cap = cap
+
+    def results_after(self, after_id, limit):
+        return self.repository.results_after(after_id, min(limit, self.cap))
+
+    def __getattr__(self, name):
+        return getattr(self.repository, name)
+
+def add_results(repository, ne_scores):
+    repository.insert_results([{"answers": {}, "scores": {"Ne": score}, "attitude_scores": {}} for score in ne_scores])
+
+def ne_total(repository):
+    return {row["metric"]: row for row in repository.score_sketches()}["Ne"]["total"]
+
+def test_pages_past_a_server_row_limit():
+    repository = SQLiteRepository(SQLiteDatabase(), service=True)
+    add_results(repository, range(7))
+    assert score_sketches.build_sketches(CappedRepository(repository, 3), page_size=5, lag=timedelta(0)) == 7
+    assert ne_total(repository) == 7
+
+def test_recent_results_wait_for_the_next_run():
+    repository = SQLiteRepository(SQLiteDatabase(), service=True)
+    add_results(repository, [1, 2, 3])
+    # The second result was created just now, as if its transaction had
+    # committed late; the third, with a higher id, is already settled
+    repository.database.execute("update results set created_at = ? where id <> 2", (LONG_AGO,))
+    assert score_sketches.build_sketches(repository) == 1
+    assert {row["last_result_id"] for row in repository.score_sketches()} == {1}
+
+    repository.database.execute("update results set created_at = ?", (LONG_AGO,))
+    assert score_sketches.build_sketches(repository) == 2
+    assert ne_total(repository) == 3
+    assert {row["last_result_id"] for row in repository.score_sketches()} == {3}
@@ -0,0 +1,77 @@
+# The vectorized scoring engine must give the same results as the per-answer
+# loop and analysis functions it replaced (tests/reference_scoring.py).
+
+import random
+
+import pytest
+
+import scoring
+from tests import reference_scoring
+
+# Valid functions plus the malformed values the old loop tolerated
+FUNCTIONS = ["Fe", "Fi", "Ne", "Ni", "Se", "Si", "Te", "Ti", "F", "N", "T", "S", "", None, "Fx", "Te "]
+ANSWERS = ["A: yes", "B: no", "Neither", "Both"]
+
+
+def random_test(rng):
+    questions = [
+        {"id": i, "a_function": rng.choice(FUNCTIONS), "b_function": rng.choice(FUNCTIONS),
+         "question_dimension": rng.choice(["within_functions", "between_functions"])}
+        for i in range(rng.randint(1, 15))
+    ]
+    # Some questions are left unanswered
+    user_answers = {i: rng.choice(ANSWERS) for i in range(len(questions)) if rng.random() < 0.9}
+    return questions, user_answers
+
+def reference_analysis(scores, attitude_scores):
+    try:
+        return (reference_scoring.calculate_mbti_analysis(scores, attitude_scores),
+                reference_scoring.calculate_cognitive_profile(scores))
+    except UnboundLocalError:
+        # The documented J/P crash, covered by test_jp_without_letter_scores_is_neutral
+        return None
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_reference_loop(seed):
+    rng = random.Random(seed)
+    score_dicts, attitude_dicts, expected = [], [], []
+    for _ in range(600):
+        questions, user_answers = random_test(rng)
+        scores, attitude_scores = reference_scoring.score_answers(questions, user_answers)
+        record = scoring.score_test(questions, user_answers)
+        assert record.scores_dict() == scores
+        assert record.attitudes_dict() == attitude_scores
+        assert scoring.ScoreRecord.unpack(record.pack()) == record
+
+        analysis = reference_analysis(scores, attitude_scores)
+        if analysis is None:
+            continue
+        assert scoring.calculate_mbti_analysis(record) == analysis[0]
+        assert scoring.calculate_mbti_analysis(scores, attitude_scores) == analysis[0]
+        assert scoring.calculate_cognitive_profile(scores) == analysis[1]
+        score_dicts.append(scores)
+        attitude_dicts.append(attitude_scores)
+        expected.append(analysis)
+
+    # The batch path shares the vectorized core with the single-test path
+    batch = zip(scoring.calculate_mbti_analysis(score_dicts, attitude_dicts),
+                scoring.calculate_cognitive_profile(score_dicts))
+    assert list(batch) == expected
+
+def test_jp_without_letter_scores_is_neutral():
+    # Only attitude answers: the old J/P block raised UnboundLocalError
+    scores, attitude_scores = {"Fe": 0}, {"i": 3, "e": 1}
+    with pytest.raises(UnboundLocalError):
+        reference_scoring.calculate_mbti_analysis(scores, attitude_scores)
+
+    analysis = scoring.calculate_mbti_analysis(scores, attitude_scores)
+    assert analysis["J/P"]["percentage"] == 0.5
+    assert analysis["J/P"]["strength"] == "0%"
+    assert analysis["J/P"]["strength_label"] == "Weak"
+    # As before, a zero-score tie picks the first function, Te, so J
+    assert analysis["mbti_type"] == "IJ"
+    assert analysis["I/E"] == {
+        "positive": "Introversion", "negative": "Extraversion", "opposite": "E", "percentage": 0.75,
+        "preference": "I", "strength": "50%", "strength_label": "Moderate",
+    }
@@ -0,0 +1,151 @@
+# The SQLite backend's semantics that app.py relies on, as documented on
+# repository.Repository.
+
+import time
+
+import pytest
+
+import sqlite_repository
+from repository import Repository, SupabaseRepository
+from sqlite_repository import SQLiteDatabase, SQLiteRepository
+
+
+@pytest.fixture
+def database():
+    database = SQLiteDatabase()
+    yield database
+    database.close()
+
+@pytest.fixture
+def repository(database):
+    return SQLiteRepository(database)
+
+def add_questions(repository, count, **fields):
+    repository.insert_questions([{"question": f"Question {i}", "a_answer": f"a {i}", "b_answer": f"b {i}", **fields}
+                                 for i in range(count)])
+    return [row["id"] for row in repository.questions_after(None, count + 1000)]
+
+def signed_in(database, email="user@example.com"):
+    repository = SQLiteRepository(database)
+    repository.sign_up(email, "password")
+    return repository
+
+
+def test_backends_implement_the_interface(database):
+    with pytest.raises(TypeError):
+        Repository()
+    SupabaseRepository(None)
+    SQLiteRepository(database)
+
+def test_edit_pages_are_keyset_paged_and_counted_once(repository):
+    ids = add_questions(repository, 25, status="approved")
+    add_questions(repository, 5, status="draft")
+
+    rows, total = repository.edit_questions_page(["approved"], 10)
+    assert total == 25
+    assert [row["id"] for row in rows] == sorted(ids, reverse=True)[:10]
+    rows, total = repository.edit_questions_page(["approved"], 10, before_id=rows[-1]["id"])
+    assert total is None
+    assert [row["id"] for row in rows] == sorted(ids, reverse=True)[10:20]
+
+def test_question_bank_page_cursor_and_comment_counts(repository):
+    ids = add_questions(repository, 7, status="approved")
+    for _ in range(3):
+        repository.add_comment(ids[2], None, "comment")
+
+    seen = []
+    cursor = None
+    while True:
+        rows = repository.question_bank_page(["approved"], "created_at", True, 3, cursor)
+        if not rows:
+            break
+        seen += rows
+        cursor = (rows[-1]["created_at"], rows[-1]["id"])
+    assert sorted(row["id"] for row in seen) == ids
+    assert len({row["id"] for row in seen}) == len(ids)
+    assert {row["id"]: row["comment_count"] for row in seen}[ids[2]] == 3
+
+def test_search_ranks_question_text_first_and_follows_edits(repository):
+    first, second = add_questions(repository, 2, status="approved")
+    repository.update_question(first, {"additional_info": "planning ahead"})
+    repository.update_question(second, {"question": "Do you enjoy planning trips?"})
+
+    assert [row["id"] for row in repository.search_questions("planning", [], 10)] == [second, first]
+    assert repository.search_questions("planning", ["draft"], 10) == []
+    # Words shorter than the trigram tokenizer can match are ignored
+    assert repository.search_questions("do", [], 10) == []
+
+    repository.delete_question(second)
+    assert [row["id"] for row in repository.search_questions("planning", [], 10)] == [first]
+
+def test_votes_count_once_per_user(database):
+    question_id = add_questions(SQLiteRepository(database), 1)[0]
+    with pytest.raises(PermissionError):
+        SQLiteRepository(database).cast_vote(question_id, "up")
+
+    voter = signed_in(database)
+    assert voter.cast_vote(question_id, "up") == {
+        "upvotes": 1, "downvotes": 0, "accepted": True, "existing_vote_type": None}
+    assert voter.cast_vote(question_id, "down") == {
+        "upvotes": 1, "downvotes": 0, "accepted": False, "existing_vote_type": "up"}
+    assert signed_in(database, "other@example.com").cast_vote(question_id, "down")["downvotes"] == 1
+    assert voter.user_votes(voter.user_id, [question_id]) == {question_id: "up"}
+
+def test_changes_and_deletions_are_visible_to_other_connections(tmp_path):
+    path = str(tmp_path / "app.db")
+    writer = SQLiteRepository(SQLiteDatabase(path))
+    reader = SQLiteRepository(SQLiteDatabase(path))
+    kept, deleted = add_questions(writer, 2)
+    changed_since = reader.latest_question_change()
+    deleted_since = reader.latest_question_deletion() or "1970-01-01T00:00:00+00:00"
+    # Timestamps have millisecond precision
+    time.sleep(0.01)
+
+    writer.update_question(kept, {"status": "approved"})
+    writer.delete_question(deleted)
+    assert [row["id"] for row in reader.questions_changed_since(changed_since, 10)] == [kept]
+    assert [row["question_id"] for row in reader.question_deletions_since(deleted_since, 10)] == [deleted]
+
+def test_service_only_writes(database):
+    repository = signed_in(database)
+    with pytest.raises(PermissionError):
+        repository.results_after(None, 10)
+    with pytest.raises(PermissionError):
+        repository.save_question_stats([{"question_id": 1}])
+    with pytest.raises(PermissionError):
+        repository.insert_results([{"user_id": "someone else"}])
+    assert SQLiteRepository(database, service=True).results_after(None, 10) == []
+
+def checkpoint(token, **fields):
+    return {"id": token, "question_set": "0123456789abcdef", "answers": "12..", "question_order": None,
+            "position": 2, "adaptive": False, "finished": False, **fields}
+
+def test_test_sessions_are_keyed_on_a_hidden_token(repository, database):
+    token = "t" * 22
+    repository.save_test_sessions([checkpoint(token)])
+    assert repository.test_session(token)["answers"] == "12.."
+    assert repository.test_session("u" * 22) is None
+    # The token itself is not stored, so the table doesn't reveal it
+    assert token not in {row["id"] for row in database.query("select id from test_sessions")}
+
+    repository.save_test_sessions([checkpoint(token, answers="123.", position=3)])
+    assert repository.test_session(token)["position"] == 3
+    repository.save_test_sessions([checkpoint(token, finished=True)])
+    assert repository.test_session(token) is None
+    assert database.query("select count(*) as n from test_sessions")[0]["n"] == 0
+
+def test_test_sessions_are_bounded_and_expire(repository, database):
+    with pytest.raises(ValueError):
+        repository.save_test_sessions([checkpoint("short")])
+    with pytest.raises(ValueError):
+        repository.save_test_sessions([checkpoint("t" * 22, answers="." * 100_000)])
+    with pytest.raises(ValueError):
+        repository.save_test_sessions([checkpoint(f"{i:022d}") for i in range(101)])
+
+    stale, fresh = "s" * 22, "f" * 22
+    repository.save_test_sessions([checkpoint(stale), checkpoint(fresh)])
+    database.execute("update test_sessions set updated_at = '2000-01-01T00:00:00.000+00:00' where id = ?",
+                     (sqlite_repository.test_session_key(stale),))
+    assert repository.test_session(stale) is None
+    repository.save_test_sessions([checkpoint(fresh, position=1)])
+    assert database.query("select count(*) as n from test_sessions")[0]["n"] == 1
@@ -0,0 +1,59 @@
+# The background writers' batching, bounds and failure handling.
+
+from write_behind import CoalescingWriter, WriteBehindQueue
+
+
+def test_queue_batches_and_flushes():
+    batches = []
+    writer = WriteBehindQueue(batches.append, batch_size=3, flush_interval=0.05)
+    for i in range(7):
+        assert writer.submit(i)
+    assert writer.flush(timeout=5)
+    writer.close()
+    assert sorted(row for batch in batches for row in batch) == list(range(7))
+    assert max(len(batch) for batch in batches) <= 3
+
+def test_coalescing_writer_keeps_the_latest_row_per_key():
+    batches = []
+    # A long interval so only explicit flushes write
+    writer = CoalescingWriter(batches.append, interval=60, batch_size=2)
+    for version in range(3):
+        for key in "abc":
+            writer.submit(key, (key, version))
+    assert writer.pending("a") == ("a", 2)
+    assert writer.flush()
+    assert sorted(row for batch in batches for row in batch) == [("a", 2), ("b", 2), ("c", 2)]
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert writer.coalesced == 6
+    writer.close()
+
+def test_coalescing_writer_is_bounded():
+    writer = CoalescingWriter(lambda rows: None, interval=60, max_pending=2)
+    assert writer.submit("a", 1) and writer.submit("b", 1)
+    assert not writer.submit("c", 1)
+    # Replacing a pending key is always allowed
+    assert writer.submit("a", 2)
+    assert (writer.dropped, writer.pending("a"), writer.pending("c")) == (1, 2, None)
+    writer.close()
+
+def test_coalescing_writer_gives_up_after_max_attempts():
+    def fail(rows):
+        raise ConnectionError("backend down")
+    writer = CoalescingWriter(fail, interval=60, max_attempts=3)
+    writer.submit("a", 1)
+    for _ in range(2):
+        assert not writer.flush()
+        assert writer.pending("a") == 1
+    assert not writer.flush()
+    assert writer.pending("a") is None
+    assert (writer.failed_attempts, writer.failed) == (3, 1)
+    # A row replaced while its write was failing is kept, not put back
+    def replace_and_fail(rows):
+        writer.submit("b", 2)
+        fail(rows)
+    writer.submit("b", 1)
+    writer.write_rows = replace_and_fail
+    assert not writer.flush()
+    assert writer.pending("b") == 2
+    writer.write_rows = lambda rows: None
+    writer.close()
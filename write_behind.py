@@ -0,0 +1,225 @@
+# Background writers for data that must never block a rerun.
+#
+# WriteBehindQueue is for inserts. Rows are handed to `submit`, which returns
+# immediately. A daemon thread collects them into batches (up to
+# `batch_size` rows, or whatever arrived within `flush_interval` seconds),
+# inserts each batch with a single call and retries failed batches with
+# exponential backoff. The queue is bounded, so a backend outage costs at
+# most `max_pending` rows of memory; beyond that new rows are dropped and
+# counted. Pending rows are flushed when the process exits.
+#
+# CoalescingWriter is for rows that are overwritten in place (test
+# checkpoints): only the latest row per key is kept and written. It is bounded
+# and gives up on failing rows the same way.
+
+import atexit
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    def __init__(self, insert_rows, batch_size=50, flush_interval=2.0, max_pending=10000,
+                 max_retries=5, retry_backoff=0.5, name="write-behind"):
+        # insert_rows(list_of_rows) performs one batched insert and raises on failure
+        self.insert_rows = insert_rows
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.name = name
+
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, row):
+        # Never blocks; returns False if the row had to be dropped
+        if self._stopping.is_set():
+            return False
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("%s: queue full, dropped a row (%d dropped so far)", self.name, self.dropped)
+            return False
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def flush(self, timeout=None):
+        # Wait until every submitted row has been written or given up on
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout=10.0):
+        # Flush-on-shutdown: stop accepting rows, drain the queue, then join
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        if self._queue.qsize():
+            logger.error("%s: %d rows still pending at shutdown", self.name, self._queue.qsize())
+
+    def _next_batch(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            # Once stopping, only take what is already queued
+            timeout = 0 if self._stopping.is_set() else deadline - time.monotonic()
+            try:
+                if timeout <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.insert_rows(batch)
+                self.written += len(batch)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.failed += len(batch)
+                    logger.error("%s: giving up on %d rows after %d attempts: %s", self.name, len(batch), attempt + 1, e)
+                    return
+                # Back off less when shutting down so the flush finishes in time
+                delay = self.retry_backoff * (2 ** attempt)
+                delay = min(delay, 0.5) if self._stopping.is_set() else delay
+                logger.warning("%s: insert of %d rows failed, retrying in %.1fs: %s", self.name, len(batch), delay, e)
+                time.sleep(delay)
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+
+class CoalescingWriter:
+    # For state that is overwritten rather than appended, like checkpoints.
+    # `submit` keeps only the latest row per key; every `interval` seconds a
+    # daemon thread writes whatever is pending in batched upserts of up to
+    # `batch_size` rows. A burst of updates to the same key therefore costs at
+    # most one write per interval. Failed rows are put back unless a newer one
+    # has replaced them, and given up on after `max_attempts` failed writes.
+    # At most `max_pending` keys are held; rows for new keys beyond that are
+    # dropped and counted, like WriteBehindQueue.
+    def __init__(self, write_rows, interval=3.0, batch_size=100, max_pending=10000, max_attempts=5,
+                 name="coalescing-writer"):
+        # write_rows(list_of_rows) performs one batched upsert and raises on failure
+        self.write_rows = write_rows
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.name = name
+
+        self.written = 0
+        self.coalesced = 0
+        self.failed_attempts = 0
+        self.failed = 0
+        self.dropped = 0
+
+        self._pending = {}
+        # Failed writes per key since its last successful one
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, key, row):
+        # Never blocks; returns False if the row had to be dropped
+        with self._lock:
+            if key in self._pending:
+                self.coalesced += 1
+            elif len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                logger.warning("%s: %d rows pending, dropped a row (%d dropped so far)",
+                               self.name, len(self._pending), self.dropped)
+                return False
+            self._pending[key] = row
+            return True
+
+    def pending(self, key):
+        # The row waiting to be written for key, if any
+        with self._lock:
+            return self._pending.get(key)
+
+    def flush(self):
+        # Writes everything pending; returns False if any batch failed
+        with self._lock:
+            pending, self._pending = list(self._pending.items()), {}
+        ok = True
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            try:
+                self.write_rows([row for _, row in batch])
+            except Exception as e:
+                ok = False
+                self._retry_later(batch, e)
+                continue
+            self.written += len(batch)
+            with self._lock:
+                for key, _ in batch:
+                    self._attempts.pop(key, None)
+        return ok
+
+    def _retry_later(self, batch, error):
+        self.failed_attempts += 1
+        given_up = 0
+        with self._lock:
+            for key, row in batch:
+                attempts = self._attempts.get(key, 0) + 1
+                if attempts >= self.max_attempts:
+                    self._attempts.pop(key, None)
+                    given_up += 1
+                    continue
+                self._attempts[key] = attempts
+                self._pending.setdefault(key, row)
+        self.failed += given_up
+        if given_up:
+            logger.error("%s: giving up on %d rows after %d attempts: %s", self.name, given_up, self.max_attempts, error)
+        if given_up < len(batch):
+            logger.warning("%s: write of %d rows failed, retrying next interval: %s",
+                           self.name, len(batch) - given_up, error)
+
+    def close(self):
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        self._thread.join(self.interval + 5)
+        self.flush()
+        if self._pending:
+            logger.error("%s: %d rows still pending at shutdown", self.name, len(self._pending))
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self.flush()